@@ -3,30 +3,53 @@ import sys  # 添加这行
 import os
 import re
 import math
+import calendar
 import json
+import hashlib
+import gzip
 import logging
 import shutil
 import sqlite3
 import tempfile
+import threading
 import traceback
 import subprocess
 import datetime
 import weakref
+import time
 from pathlib import Path
 from copy import copy, deepcopy
+from contextlib import contextmanager
+from functools import lru_cache
+from collections import deque
 from datetime import datetime
 # ======================= 第三方库导入 =======================
+import numpy as np
 import pandas as pd
 from openpyxl import Workbook, load_workbook
 from openpyxl.styles import Protection
 from reportlab.pdfbase import pdfmetrics
 from reportlab.pdfbase.ttfonts import TTFont
 from PIL import Image  # 确保导入PIL
+try:
+    import python_calamine  # 可选：Rust 实现的 Excel 解析器，大文件读取比 openpyxl 快一个数量级
+    EXCEL_READ_ENGINE = 'calamine'
+except ImportError:
+    EXCEL_READ_ENGINE = None
+try:
+    import zstandard  # 可选：备份压缩优先使用 zstd，未安装时使用 gzip
+except ImportError:
+    zstandard = None
+try:
+    import fitz  # 可选：PyMuPDF，用于生成 PDF 附件缩略图
+except ImportError:
+    fitz = None
 
 # ======================= PyQt5核心导入 =======================
 from PyQt5.QtCore import (
     Qt, QSize, QRect, QPoint, QUrl, QMimeData,
-    QDate, QSettings, QTimer, pyqtSignal, QByteArray  # 添加QByteArray
+    QDate, QSettings, QTimer, pyqtSignal, QByteArray,  # 添加QByteArray
+    QObject, QThread, QEvent, QFileSystemWatcher
 )
 from PyQt5.QtGui import (
     QIcon, QColor, QPainter, QPen, QPixmap, QFont,
@@ -43,7 +66,8 @@ from PyQt5.QtWidgets import (
     QScrollArea, QGroupBox, QColorDialog, QCheckBox,
     QFontComboBox, QListWidgetItem, QAbstractItemView,
     QRadioButton, QButtonGroup, QToolBar, QSizePolicy, QFontDialog, QProgressDialog,
-    QInputDialog  # 添加QInputDialog
+    QInputDialog,  # 添加QInputDialog
+    QStyle, QProgressBar
 )
 from PyQt5.QtPrintSupport import QPrinter, QPrintDialog
 
@@ -74,6 +98,80 @@ if not check_dependencies():
 # ======================= 环境配置 =======================
 os.environ["QT_LOGGING_RULES"] = "qt.png.warning=false"
 CONFIG_FILE = "print_config.json"
+SCHEMA_REVISION = 12  # 系统表结构修订号，新增系统表/列/触发器时递增
+DEFAULT_FULLTEXT_FIELDS = ('姓名', '身份证号', '一级单位', '二级单位')
+FULLTEXT_MIN_TERM_LENGTH = 3  # trigram 分词器要求检索词至少3个字符
+DEFAULT_PINYIN_FIELDS = ('姓名', '一级单位', '二级单位')
+PAGE_SIZE = 500  # 键集分页每页行数（主表格滚动加载、导出、套打共用）
+IMPORT_BATCH_SIZE = 2000  # 批量导入时每次 executemany 写入的行数
+IMPORT_MODES = {
+    'insert': '仅新增（已存在的人员跳过）',
+    'upsert': '新增并更新已存在的人员（按身份证号匹配）',
+}
+UPSERT_KEY_FIELD = '身份证号'
+DETAIL_TABLE = 'personnel_detail'  # 明细字段（长文本）单独存放的表，与 personnel 按 id 一一对应
+ROW_HASH_COLUMN = '_row_digest'  # 记录内容摘要，覆盖导入时据此跳过未变化的行（算法变化时换列名，旧摘要随迁移删除）
+DELETED_COLUMN = '_deleted_at'  # 删除时间（软删除标记），为 NULL 的记录才是有效记录
+CHANGE_POLL_INTERVAL = 1000  # 变更日志轮询间隔（毫秒）
+CHANGE_RELOAD_THRESHOLD = 500  # 一次检测到的变更超过该行数时整表重新加载
+CHANGE_JOURNAL_RETENTION_DAYS = 7  # 变更日志保留天数
+# SQLite 连接级性能配置：safe 每次提交都落盘；balanced 为日常默认（WAL 下仅检查点时同步，
+# 掉电最多丢失最近的提交而不会损坏库）；bulk 仅在导入导出期间临时使用，结束后恢复。
+# bulk 同样使用 NORMAL：WAL 下 NORMAL 的提交已不等待落盘，OFF 节省有限却可能在掉电时损坏库，
+# 而导入期间界面的其他写入也经由同一连接提交
+PERFORMANCE_PROFILES = {
+    'safe': {
+        'synchronous': 'FULL',
+        'cache_size': -8000,            # 负数单位为 KiB，约 8MB
+        'mmap_size': 0,
+        'temp_store': 'DEFAULT',
+        'wal_autocheckpoint': 1000,
+        'busy_timeout': 30000,
+    },
+    'balanced': {
+        'synchronous': 'NORMAL',
+        'cache_size': -32000,           # 约 32MB
+        'mmap_size': 256 * 1024 * 1024,
+        'temp_store': 'MEMORY',
+        'wal_autocheckpoint': 1000,
+        'busy_timeout': 30000,
+    },
+    'bulk': {
+        'synchronous': 'NORMAL',
+        'cache_size': -256000,          # 约 256MB
+        'mmap_size': 1024 * 1024 * 1024,
+        'temp_store': 'MEMORY',
+        'wal_autocheckpoint': 0,        # 期间不自动检查点，结束后统一执行
+        'busy_timeout': 60000,
+    },
+}
+DEFAULT_PERFORMANCE_PROFILE = 'balanced'
+BACKUP_STEP_PAGES = 256  # 在线备份每步复制的页数（步与步之间写入方不受阻塞）
+BACKUP_RETENTION = {'last': 5, 'hourly': 24, 'daily': 7, 'weekly': 8}  # 最近几个及各时间粒度保留的快照个数
+BACKUP_CHUNK_SIZE = 1024 * 1024  # 压缩/解压时每次读写的字节数
+ATTACHMENT_TABLE = 'personnel_attachments'
+ATTACHMENT_THUMBNAIL_SIZE = (160, 160)
+ATTACHMENT_GRACE_DAYS = 60  # 不再被引用的附件保留天数（覆盖备份保留期，恢复旧备份后附件仍可用）
+SLOW_QUERY_THRESHOLD_MS = 100  # 单条语句（执行+读取）超过该耗时记为慢查询，可由 QSettings 的 slowQueryMs 覆盖
+SLOW_QUERY_LOG_SIZE = 50  # 诊断视图保留的最近慢查询条数
+COLUMN_CACHE_PATCH_LIMIT = 5000  # 列式缓存一次按变更日志修补的最大行数，超过时整体重新加载
+COLUMN_CACHE_DICTIONARY_RATIO = 0.2  # 不同取值数不超过行数的该比例时按字典编码存放（如单位、学历）
+RECYCLE_RETENTION_DAYS = 30  # 回收站中记录的保留天数，过期后由整理任务彻底删除
+COMPACTION_INTERVAL = 5000  # 后台整理任务的检查间隔（毫秒）
+COMPACTION_IDLE_SECONDS = 60  # 用户无操作超过该秒数才执行整理
+COMPACTION_PURGE_BATCH = 200  # 每步彻底删除的过期记录数
+VACUUM_STEP_PAGES = 64  # 每步 incremental_vacuum 回收的页数
+# 日期字段的整数影子列：距 1970-01-01 的天数、年份（虚拟生成列，建索引后排序/分组不再逐行解析）
+DATE_DAYS_EXPR = 'CAST(julianday("{name}") - 2440587.5 AS INTEGER)'
+DATE_YEAR_EXPR = 'CAST(strftime(\'%Y\', "{name}") AS INTEGER)'
+# 按日期字段计算的整周年数 {名称: 日期字段}，存于已建索引的影子列 _n_<日期字段>，写入时计算、每日滚动更新
+DERIVED_FIELDS = {'年龄': '出生日期', '工龄': '参加工作时间', '党龄': '入党日期'}
+FIELD_CONFIG_DEBOUNCE = 300  # fields.json 变化通知合并等待的时间（毫秒），等编辑器写完再读取
+DERIVED_ROLLOVER_INTERVAL = 3600 * 1000  # 检查是否已跨日、需滚动更新周年数的间隔（毫秒）
+DUPLICATE_MAX_BLOCK = 50  # 查重时同一分块键下超过该人数不再两两比较（如同单位的常见姓名），避免平方级增长
+MASS_EDIT_HISTORY = 20  # 保留可撤销的批量修改批次数，更早的批次连同修改前的值一并清理
+MASS_EDIT_OPERATIONS = {'set': '设为', 'replace': '替换文本'}
+DUPLICATE_MIN_SCORE = 60  # 候选人员对得分（0-100）不低于该值才列为合并建议
 
 class PrintDialog(QDialog):
     def __init__(self, parent=None):
@@ -141,6 +239,14 @@ def get_db_path():
     os.makedirs(doc_path, exist_ok=True)
     return os.path.join(doc_path, "archive.db")
 
+def get_backup_dir():
+    """备份目录（与数据库同在用户文档目录下）"""
+    return os.path.join(os.path.expanduser("~/Documents/人事档案系统"), "backups")
+
+def get_attachment_dir():
+    """电子档案附件库目录"""
+    return os.path.join(os.path.expanduser("~/Documents/人事档案系统"), "attachments")
+
 def validate_id_number(id_number):
     """验证中国大陆身份证号格式"""
     if not isinstance(id_number, str) or len(id_number) != 18:
@@ -153,6 +259,267 @@ def validate_id_number(id_number):
         return id_number[-1].upper() == check_codes[total % 11]
     except:
         return False
+ID_CHECKSUM_WEIGHTS = np.array([7, 9, 10, 5, 8, 4, 2, 1, 6, 3, 7, 9, 10, 5, 8, 4, 2], dtype=np.int32)
+ID_CHECK_CODES = np.frombuffer(b'10X98765432', dtype=np.uint8)
+# 身份证号前两位的省级行政区划代码（83 为港澳台居民居住证中的台湾）
+ID_PROVINCE_CODES = {
+    '11': '北京', '12': '天津', '13': '河北', '14': '山西', '15': '内蒙古',
+    '21': '辽宁', '22': '吉林', '23': '黑龙江',
+    '31': '上海', '32': '江苏', '33': '浙江', '34': '安徽', '35': '福建', '36': '江西', '37': '山东',
+    '41': '河南', '42': '湖北', '43': '湖南', '44': '广东', '45': '广西', '46': '海南',
+    '50': '重庆', '51': '四川', '52': '贵州', '53': '云南', '54': '西藏',
+    '61': '陕西', '62': '甘肃', '63': '青海', '64': '宁夏', '65': '新疆',
+    '71': '台湾', '81': '香港', '82': '澳门', '83': '台湾',
+}
+# check_id_numbers 返回的问题编码（0 为通过），一个号码有多个问题时取编码最小的
+ID_PROBLEMS = {
+    1: "身份证号格式错误（需18位数字）",
+    2: "身份证号校验码错误",
+    3: "身份证号地区码无效",
+    4: "身份证号中的出生日期无效",
+    5: "身份证号与出生日期不符",
+}
+MONTH_DAYS = np.array([0, 31, 28, 31, 30, 31, 30, 31, 31, 30, 31, 30, 31], dtype=np.int32)
+
+
+@lru_cache(maxsize=1)
+def load_region_codes():
+    """地区码表，返回 (省级代码布尔表[100], 县级代码有序数组或 None)
+
+    templates/region_codes.json（{"110101": "东城区", ...}，须包含已撤销的历史代码，
+    早年签发的号码仍使用旧代码）存在时按 6 位县级代码校验，否则只校验省级代码。
+    """
+    provinces = np.zeros(100, dtype=bool)
+    provinces[[int(code) for code in ID_PROVINCE_CODES]] = True
+    counties = None
+    path = resource_path('templates/region_codes.json')
+    if os.path.exists(path):
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                counties = np.array(sorted(int(code) for code in json.load(f)), dtype=np.int32)
+        except (OSError, ValueError) as e:
+            logger.warning(f"地区码表读取失败，只校验省级代码: {str(e)}")
+    return provinces, counties
+
+
+def _digit_matrix(values, width):
+    """等长文本按 ASCII 字节排成 (n, width) 的矩阵（长度不符或非文本的行填 '#'），返回 int32 数字矩阵"""
+    filler = '#' * width
+    text = ''.join(value if isinstance(value, str) and len(value) == width else filler for value in values)
+    raw = np.frombuffer(text.encode('ascii', 'replace'), dtype=np.uint8).reshape(-1, width)
+    return raw.astype(np.int32) - ord('0')
+
+
+def _place_values(digits):
+    """数字矩阵按位组成整数（如 [1, 9, 9, 0] -> 1990）"""
+    return digits @ (10 ** np.arange(digits.shape[1] - 1, -1, -1, dtype=np.int32))
+
+
+def _id_checksums(id_numbers):
+    """返回 (数字矩阵, 格式是否正确, 校验码是否正确)；校验位的 X/x 记为 10"""
+    digits = _digit_matrix(id_numbers, 18)
+    body = digits[:, :17]
+    last = digits[:, 17]
+    is_x = (last == ord('X') - ord('0')) | (last == ord('x') - ord('0'))
+    well_formed = ((body >= 0) & (body <= 9)).all(axis=1) & (((last >= 0) & (last <= 9)) | is_x)
+    expected = ID_CHECK_CODES[body @ ID_CHECKSUM_WEIGHTS % 11].astype(np.int32) - ord('0')
+    checksum_ok = well_formed & (expected == np.where(is_x, ord('X') - ord('0'), last))
+    return digits, well_formed, checksum_ok
+
+
+def id_checksum_mask(id_numbers):
+    """批量校验身份证号校验码（结果同 validate_id_number），返回布尔数组"""
+    return _id_checksums(list(id_numbers))[2]
+
+
+def check_id_numbers(id_numbers, birth_dates=None, today=None):
+    """批量校验身份证号，返回每个号码的问题编码数组（int8，0 为通过，含义见 ID_PROBLEMS）
+
+    整列号码排成 (n, 18) 的数字矩阵，校验码、地区码（load_region_codes）与内嵌出生日期
+    （真实存在、不早于 1900 年、不晚于今天）均以 NumPy 整列计算；给出 birth_dates
+    （与号码一一对应、已规范为 YYYY-MM-DD 的出生日期，空值不比对；当月1日视为只填了年月）
+    时核对二者是否一致。
+    """
+    id_numbers = list(id_numbers)
+    digits, well_formed, checksum_ok = _id_checksums(id_numbers)
+    provinces, counties = load_region_codes()
+    region_ok = provinces[np.clip(_place_values(digits[:, :2]), 0, 99)]
+    if counties is not None:
+        region_ok &= np.isin(_place_values(digits[:, :6]), counties)
+
+    year = _place_values(digits[:, 6:10])
+    month = _place_values(digits[:, 10:12])
+    day = _place_values(digits[:, 12:14])
+    leap = (year % 4 == 0) & ((year % 100 != 0) | (year % 400 == 0))
+    days_in_month = MONTH_DAYS[np.clip(month, 0, 12)] + ((month == 2) & leap)
+    embedded = year * 10000 + month * 100 + day
+    today = today or datetime.now().date()
+    birth_ok = (
+        (year >= 1900) & (month >= 1) & (month <= 12) & (day >= 1) & (day <= days_in_month)
+        & (embedded <= today.year * 10000 + today.month * 100 + today.day)
+    )
+
+    problems = np.zeros(len(id_numbers), dtype=np.int8)
+    if birth_dates is not None:
+        dates = _digit_matrix(list(birth_dates), 10)
+        stated_ok = (
+            (dates[:, 4] == ord('-') - ord('0')) & (dates[:, 7] == ord('-') - ord('0'))
+            & ((dates[:, [0, 1, 2, 3, 5, 6, 8, 9]] >= 0) & (dates[:, [0, 1, 2, 3, 5, 6, 8, 9]] <= 9)).all(axis=1)
+        )
+        stated = _place_values(dates[:, [0, 1, 2, 3, 5, 6, 8, 9]])
+        # 只填年月的日期按 normalize_date 规则存为当月1日，此时只比对年月
+        month_only = (stated % 100 == 1) & (stated // 100 == embedded // 100)
+        problems[stated_ok & (stated != embedded) & ~month_only] = 5
+    # 按编码从大到小赋值，同一号码最终保留编码最小（最根本）的问题
+    problems[~birth_ok] = 4
+    problems[~region_ok] = 3
+    problems[~checksum_ok] = 2
+    problems[~well_formed] = 1
+    return problems
+
+
+def id_number_problem(id_number, birth_date=None):
+    """单个身份证号的问题说明（规则同 check_id_numbers），没有问题时返回 None"""
+    birth_dates = None if birth_date in (None, '') else [normalize_date(birth_date)]
+    return ID_PROBLEMS.get(int(check_id_numbers([id_number], birth_dates)[0]))
+
+FILTER_TERM_PATTERN = re.compile(r'^([^<>=~]+?)(>=|<=|>|<|=)(.+)$')
+DATE_TEXT_PATTERN = re.compile(r'^(\d{4})\s*[-/.年]\s*(\d{1,2})\s*(?:[-/.月]\s*(\d{1,2}))?')
+EPOCH = datetime(1970, 1, 1)
+
+
+def normalize_date(value):
+    """将日期文本规范为可排序的 YYYY-MM-DD（只有年月时取当月1日），无法识别时原样返回"""
+    text = str(value or '').strip()
+    if not text:
+        return text
+    match = re.fullmatch(r'(\d{4})(\d{2})(\d{2})', text) or DATE_TEXT_PATTERN.match(text)
+    if not match:
+        return text
+    try:
+        return datetime(
+            int(match.group(1)), int(match.group(2)), int(match.group(3) or 1)
+        ).strftime('%Y-%m-%d')
+    except ValueError:
+        return text
+
+
+def date_to_days(text, upper=False):
+    """日期文本转为距 1970-01-01 的天数
+
+    只写年份或年月时按区间处理：upper=False 取起始日，upper=True 取最后一天。
+    无法识别时返回 None。
+    """
+    text = str(text or '').strip()
+    try:
+        if re.fullmatch(r'\d{4}', text):
+            day = datetime(int(text), 12, 31) if upper else datetime(int(text), 1, 1)
+        elif re.fullmatch(r'\d{4}[-/.]\d{1,2}', text):
+            year, month = (int(part) for part in re.split(r'[-/.]', text))
+            last = calendar.monthrange(year, month)[1] if upper else 1
+            day = datetime(year, month, last)
+        else:
+            normalized = normalize_date(text)
+            if not re.fullmatch(r'\d{4}-\d{2}-\d{2}', normalized):
+                return None
+            day = datetime.strptime(normalized, '%Y-%m-%d')
+    except ValueError:
+        return None
+    return (day - EPOCH).days
+
+
+def years_since(text, today):
+    """YYYY-MM-DD 日期到 today 的整周年数（年龄、工龄、党龄），不是规范日期时返回 None"""
+    match = re.fullmatch(r'(\d{4})-(\d{2})-(\d{2})', text or '')
+    if not match:
+        return None
+    year, month, day = (int(part) for part in match.groups())
+    return today.year - year - ((today.month, today.day) < (month, day))
+
+
+def row_hash(values, fields):
+    """记录内容摘要：按字段名排序，只计非空字段（空值与空字符串视为相同）
+
+    新增字段（已有记录均为空）或调整字段顺序不改变已有记录的摘要，字段配置变化后无需全部重算。
+    """
+    content = '\x1f'.join(f"{name}\x1e{values[name]}" for name in sorted(fields) if values.get(name))
+    return hashlib.sha1(content.encode('utf-8')).hexdigest()
+
+
+# --------------------------- 拼音检索 ---------------------------
+# 多音字姓氏的读音（仅用于姓名首字）
+SURNAME_PINYIN = {
+    '单': 'shan', '曾': 'zeng', '解': 'xie', '仇': 'qiu', '朴': 'piao',
+    '查': 'zha', '区': 'ou', '盖': 'ge', '乐': 'yue', '繁': 'po',
+    '种': 'chong', '覃': 'qin', '缪': 'miao', '翟': 'zhai', '长': 'chang',
+    '重': 'chong', '秘': 'bi', '召': 'shao', '都': 'du', '薄': 'bo',
+}
+
+
+class PinyinIndex:
+    """离线汉字转拼音（数据来自随程序分发的 pinyin_table.txt）
+
+    用于生成拼音影子列：全拼（zhangsan）与首字母（zs），
+    字母和数字原样保留为小写，其他字符忽略。
+    """
+
+    def __init__(self):
+        self._table = None
+
+    def _load(self):
+        table = {}
+        path = resource_path('pinyin_table.txt')
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                for line in f:
+                    if not line.strip() or line.startswith('#'):
+                        continue
+                    syllable, chars = line.rstrip('\n').split(' ', 1)
+                    for char in chars:
+                        table[char] = syllable
+        except OSError as e:
+            logger.error(f"加载拼音对照表失败: {path} {str(e)}")
+        self._table = table
+
+    def syllables(self, text, surname=False):
+        """将文本拆分为拼音音节列表"""
+        if self._table is None:
+            self._load()
+        result = []
+        for pos, char in enumerate(text or ''):
+            if surname and pos == 0 and char in SURNAME_PINYIN:
+                result.append(SURNAME_PINYIN[char])
+            elif char in self._table:
+                result.append(self._table[char])
+            elif char.isascii() and char.isalnum():
+                result.append(char.lower())
+        return result
+
+    def full(self, text, surname=False):
+        return ''.join(self.syllables(text, surname))
+
+    def initials(self, text, surname=False):
+        return ''.join(syllable[0] for syllable in self.syllables(text, surname))
+
+    def shadow_values(self, data, fields=None):
+        """为 data 中出现的拼音字段计算影子列的值（批量调用时可传入预先取得的 fields）"""
+        values = {}
+        for name in fields if fields is not None else field_manager.get_pinyin_fields():
+            if name in data:
+                syllables = self.syllables(data[name], name == '姓名')
+                values[f'_py_{name}'] = ''.join(syllables)
+                values[f'_pyi_{name}'] = ''.join(syllable[0] for syllable in syllables)
+        return values
+
+
+pinyin_index = PinyinIndex()
+
+
+def prefix_range(prefix):
+    """返回前缀匹配对应的区间 [下界, 上界)，用于索引范围扫描"""
+    return prefix, prefix[:-1] + chr(ord(prefix[-1]) + 1)
+
+
 def init_logger():
     """初始化日志系统（增强健壮性）"""
     try:
@@ -208,6 +575,23 @@ class FieldManager:
         self.logger.debug("字段管理器初始化中...")
         self.fields = self.load_fields()
         self.logger.debug(f"字段配置加载完成，共 {len(self.fields)} 个字段")
+
+    @property
+    def fields(self):
+        return self._fields
+
+    @fields.setter
+    def fields(self, fields):
+        """替换字段配置时作废已编译的语句"""
+        self._fields = fields
+        self._statements = None
+
+    @property
+    def statements(self):
+        """当前字段配置的 CompiledStatements（首次使用时生成）"""
+        if self._statements is None:
+            self._statements = CompiledStatements(self)
+        return self._statements
         
     def validate_fields(self, fields):
         """验证字段配置"""
@@ -222,22 +606,181 @@ class FieldManager:
                 raise ValueError("字段缺少'name'属性")
             if not isinstance(field['name'], str) or not field['name'].strip():
                 raise ValueError("字段名必须是非空字符串")
+            if field['name'].startswith('_'):
+                raise ValueError(f"字段名不能以下划线开头（保留给系统列）: {field['name']}")
             if field['name'] in names:
                 raise ValueError(f"重复字段名: {field['name']}")
+            if field.get('detail') and any(field.get(key) for key in ('unique', 'indexed', 'pinyin')):
+                raise ValueError(f"明细字段不支持唯一约束、索引或拼音检索: {field['name']}")
             names.add(field['name'])
     
-    def get_create_table_sql(self):
+    def get_create_table_sql(self, table_name='personnel'):
         """生成建表SQL语句"""
         columns = ['id INTEGER PRIMARY KEY AUTOINCREMENT']
+        for spec in self.get_column_specs():
+            columns.append(self.get_column_definition(spec))
+        return f'CREATE TABLE IF NOT EXISTS {table_name} ({", ".join(columns)})'
+
+    def get_column_definition(self, spec):
+        """单列的DDL定义（建表与 ADD COLUMN 共用）"""
+        col_def = f'"{spec["name"]}" {spec["type"]}'
+        if spec.get('generated'):
+            return col_def + f' GENERATED ALWAYS AS ({spec["generated"]}) VIRTUAL'
+        if spec['unique']:
+            col_def += ' UNIQUE'
+        if spec['notnull']:
+            col_def += ' NOT NULL'
+        return col_def
+
+    def get_column_specs(self):
+        """获取 personnel 表字段及系统影子列的列定义（迁移引擎据此与 PRAGMA table_info 对比）
+
+        明细字段存放在 DETAIL_TABLE 中，不在此列出。
+        """
+        return [
+            {
+                'name': field['name'],
+                'type': 'TEXT',
+                'notnull': bool(field.get('required')),
+                'unique': bool(field.get('unique')),
+            }
+            for field in self.fields if not field.get('detail')
+        ] + self.get_system_columns()
+
+    def get_detail_fields(self):
+        """明细字段（detail 属性）：工作经历等长文本，单独存放，主表格不加载"""
+        return [field['name'] for field in self.fields if field.get('detail')]
+
+    def get_summary_fields(self):
+        """存放在 personnel 表中的字段，即主表格显示、可排序和筛选的字段"""
+        return [field['name'] for field in self.fields if not field.get('detail')]
+
+    def get_detail_join(self):
+        """读取明细字段所需的连接子句（personnel 别名为 p，无明细字段时为空）"""
+        return f"LEFT JOIN {DETAIL_TABLE} d ON d.id = p.id" if self.get_detail_fields() else ""
+
+    def column_ref(self, field_name):
+        """查询中引用字段的表达式：明细字段取自 LEFT JOIN 的 d 表，其余取自 p 表"""
+        return self.statements.column_ref(field_name)
+
+    def get_pinyin_fields(self):
+        """建立拼音检索影子列的字段（pinyin 属性）；未声明时默认姓名和单位字段"""
+        if any('pinyin' in field for field in self.fields):
+            return [field['name'] for field in self.fields if field.get('pinyin')]
+        names = self.get_summary_fields()
+        return [name for name in DEFAULT_PINYIN_FIELDS if name in names]
+
+    def get_date_fields(self):
+        """日期类型字段（明细字段除外，其影子列需建在 personnel 表上）"""
+        return [field['name'] for field in self.fields
+                if field.get('type') == 'date' and not field.get('detail')]
+
+    def get_derived_fields(self):
+        """启用的周年数字段 {名称: 日期字段}：日期字段存在且名称未被用户字段占用"""
+        date_fields = self.get_date_fields()
+        names = set(self.get_field_names())
+        return {
+            label: source for label, source in DERIVED_FIELDS.items()
+            if source in date_fields and label not in names
+        }
+
+    def get_template_field_names(self):
+        """模板可引用的字段：全部用户字段及周年数字段"""
+        return self.get_field_names() + list(self.get_derived_fields())
+
+    def get_sort_column(self, field_name):
+        """排序时使用的列：日期字段使用整数天数列，周年数字段使用其影子列"""
+        if field_name in self.get_date_fields():
+            return f'_d_{field_name}'
+        source = self.get_derived_fields().get(field_name)
+        if source:
+            return f'_n_{source}'
+        return field_name
+
+    def get_system_columns(self):
+        """系统维护的影子列（不写入 fields.json，界面不显示）"""
+        columns = []
+        for name in self.get_pinyin_fields():
+            for prefix in ('_py_', '_pyi_'):
+                columns.append({
+                    'name': f'{prefix}{name}', 'type': 'TEXT', 'notnull': False, 'unique': False
+                })
+        for name in self.get_date_fields():
+            for prefix, expr in (('_d_', DATE_DAYS_EXPR), ('_y_', DATE_YEAR_EXPR)):
+                columns.append({
+                    'name': f'{prefix}{name}', 'type': 'INTEGER', 'notnull': False,
+                    'unique': False, 'generated': expr.format(name=name)
+                })
+        for source in self.get_derived_fields().values():
+            columns.append({'name': f'_n_{source}', 'type': 'INTEGER', 'notnull': False, 'unique': False})
+        columns.append({
+            'name': ROW_HASH_COLUMN, 'type': 'TEXT', 'notnull': False, 'unique': False,
+            'indexed': False
+        })
+        columns.append({'name': DELETED_COLUMN, 'type': 'TEXT', 'notnull': False, 'unique': False})
+        return columns
+
+    def get_system_index_specs(self):
+        """影子列上的索引 {索引名: [列名]}"""
+        return {
+            f"idx_sys{column['name']}": [column['name']]
+            for column in self.get_system_columns()
+            if column.get('indexed', True)
+        }
+
+    def get_index_specs(self):
+        """根据字段的 indexed 属性生成索引定义 {索引名: [列名, ...]}
+
+        indexed 可取：
+          true            为该字段建立单列索引
+          "组名"          同组字段按配置顺序组成复合索引
+          [true, "组名"]  同时参与多个索引
+        """
+        indexes = {}
         for field in self.fields:
-            col_def = f'"{field["name"]}" TEXT'
-            if field.get('unique'):
-                col_def += ' UNIQUE'
-            if field.get('required'):
-                col_def += ' NOT NULL'
-            columns.append(col_def)
-        return f'CREATE TABLE IF NOT EXISTS personnel ({", ".join(columns)})'
-    
+            declared = field.get('indexed')
+            if not declared:
+                continue
+            for entry in declared if isinstance(declared, list) else [declared]:
+                if entry is True:
+                    indexes.setdefault(f"idx_personnel_{field['name']}", []).append(field['name'])
+                elif isinstance(entry, str) and entry.strip():
+                    indexes.setdefault(f"idx_personnel_{entry.strip()}", []).append(field['name'])
+        return indexes
+
+    def get_fulltext_fields(self):
+        """参与全文检索的字段（searchable 属性）；未声明时默认姓名、身份证号、单位及长文本字段"""
+        if any('searchable' in field for field in self.fields):
+            return [field['name'] for field in self.fields if field.get('searchable')]
+        return [
+            field['name'] for field in self.fields
+            if field.get('type') == 'text' or field['name'] in DEFAULT_FULLTEXT_FIELDS
+        ]
+
+    def is_indexed(self, field_name):
+        """字段是否为某个索引的首列（可用于排序、等值过滤和分组）"""
+        return any(columns[0] == field_name for columns in self.get_index_specs().values())
+
+    def get_schema_fingerprint(self):
+        """当前字段配置对应的结构指纹，指纹不变时启动无需迁移"""
+        payload = json.dumps(
+            {
+                'revision': SCHEMA_REVISION,
+                'columns': self.get_column_specs(),
+                'indexes': self.get_index_specs(),
+                'system_indexes': self.get_system_index_specs(),
+                'fulltext': self.get_fulltext_fields(),
+                'detail': self.get_detail_fields(),
+            },
+            ensure_ascii=False, sort_keys=True
+        )
+        return hashlib.sha1(payload.encode('utf-8')).hexdigest()
+
+    def get_mass_editable_fields(self):
+        """可批量修改的字段：摘要字段中的非唯一字段（明细字段另表存放，唯一字段不能设为同一值）"""
+        unique_fields = {field['name'] for field in self.fields if field.get('unique')}
+        return [name for name in self.get_summary_fields() if name not in unique_fields]
+
     def get_field_names(self):
         """获取所有字段名"""
         return [field['name'] for field in self.fields]
@@ -246,29 +789,53 @@ class FieldManager:
         """返回完整的默认字段列表"""
         return [    
             {'name': '档案编号', 'type': 'str', 'required': True, 'unique': True},
-            {'name': '姓名', 'type': 'str', 'required': True},
+            {'name': '姓名', 'type': 'str', 'required': True, 'indexed': True},
             {'name': '身份证号', 'type': 'str', 'required': True, 'unique': True},
             {'name': '身份', 'type': 'str', 'required': False},
             {'name': '籍贯', 'type': 'str', 'required': False},
-            {'name': '一级单位', 'type': 'str', 'required': False},
-            {'name': '二级单位', 'type': 'str', 'required': False},
-            {'name': '出生日期', 'type': 'date', 'required': False},
+            {'name': '一级单位', 'type': 'str', 'required': False, 'indexed': '单位'},
+            {'name': '二级单位', 'type': 'str', 'required': False, 'indexed': ['单位', True]},
+            {'name': '出生日期', 'type': 'date', 'required': False, 'indexed': True},
             {'name': '参加工作时间', 'type': 'date', 'required': False},
             {'name': '入党日期', 'type': 'date', 'required': False},
-            {'name': '工作经历', 'type': 'text', 'required': False},
-            {'name': '学历', 'type': 'str', 'required': False},
-            {'name': '档案流转记录', 'type': 'text', 'required': False},
+            {'name': '工作经历', 'type': 'text', 'required': False, 'detail': True},
+            {'name': '学历', 'type': 'str', 'required': False, 'indexed': True},
+            {'name': '档案流转记录', 'type': 'text', 'required': False, 'detail': True},
             {'name': '电子档案', 'type': 'str', 'required': False},
-            {'name': '备注', 'type': 'text', 'required': False},
-            {'name': '学习经历', 'type': 'text', 'required': False},
+            {'name': '备注', 'type': 'text', 'required': False, 'detail': True},
+            {'name': '学习经历', 'type': 'text', 'required': False, 'detail': True},
         ]
 
+    def config_path(self):
+        """fields.json 的路径"""
+        return os.path.join(resource_path('templates'), 'fields.json')
+
+    def read_config(self):
+        """读取并验证 fields.json，文件不完整或配置无效时抛出异常"""
+        with open(self.config_path(), 'r', encoding='utf-8') as f:
+            data = json.load(f)
+        loaded_fields = data.get('fields', self.get_default_fields())
+        self.validate_fields(loaded_fields)
+        return loaded_fields
+
+    def reload(self):
+        """重新读取 fields.json，配置有变化时替换当前配置并返回 True
+
+        与 load_fields 不同，读取失败时抛出异常并保留当前配置（文件可能正在写入），
+        不会退回默认字段。
+        """
+        fields = self.read_config()
+        if fields == self.fields:
+            return False
+        self.fields = fields
+        return True
+
     def load_fields(self):
         """加载字段配置"""
         try:
             template_dir = resource_path('templates')
             os.makedirs(template_dir, exist_ok=True)
-            path = os.path.join(template_dir, 'fields.json')
+            path = self.config_path()
             
             # 如果配置文件不存在，创建默认配置
             if not os.path.exists(path):
@@ -278,11 +845,7 @@ class FieldManager:
                 return default_fields
                 
             # 加载现有配置
-            with open(path, 'r', encoding='utf-8') as f:
-                data = json.load(f)
-                loaded_fields = data.get('fields', self.get_default_fields())
-                self.validate_fields(loaded_fields)
-                return loaded_fields
+            return self.read_config()
                 
         except Exception as e:
             self.logger.error(f"加载字段配置失败: {str(e)}")
@@ -291,7 +854,100 @@ class FieldManager:
             return self.get_default_fields()
 
 
-        
+
+# --------------------------- SQL 语句构建 ---------------------------
+def quote_identifier(name):
+    """SQL 标识符加双引号（名称中的双引号按 SQL 规则写两次）"""
+    return '"' + name.replace('"', '""') + '"'
+
+class CompiledStatements:
+    """按一份字段配置预先生成的 SQL 语句与列顺序
+
+    由 FieldManager.statements 创建并缓存在字段管理器上：重新加载 fields.json 或替换
+    字段配置后作废，下次使用时重新生成。写入、分页读取与导入等热点路径直接取用，
+    不再每次拼接列清单和占位符；按调用方给出的列组合生成的语句（部分更新、明细写入、
+    查询列清单）按列组合缓存。所有标识符统一经 quote_identifier 加引号。
+    """
+
+    def __init__(self, field_manager):
+        self.field_names = tuple(field_manager.get_field_names())
+        self.summary_fields = tuple(field_manager.get_summary_fields())
+        self.detail_fields = tuple(field_manager.get_detail_fields())
+        self.date_fields = tuple(field_manager.get_date_fields())
+        self.pinyin_fields = tuple(field_manager.get_pinyin_fields())
+        self.required_fields = tuple(f['name'] for f in field_manager.fields if f.get('required'))
+        self.unique_fields = tuple(f['name'] for f in field_manager.fields if f.get('unique'))
+        self.derived_fields = tuple(field_manager.get_derived_fields().items())
+        self.detail_join = field_manager.get_detail_join()
+        self._refs = {
+            name: f"{'d' if name in self.detail_fields else 'p'}.{quote_identifier(name)}"
+            for name in self.field_names
+        }
+        # 周年数字段可像普通字段一样出现在查询列中（导出、套打）
+        self._refs.update(
+            (label, f"p.{quote_identifier('_n_' + source)}") for label, source in self.derived_fields
+        )
+        self._variants = {}
+
+        # personnel 表写入的列：摘要字段及由程序计算的影子列（拼音、内容摘要），生成列与删除标记除外
+        shadow_columns = tuple(
+            column['name'] for column in field_manager.get_system_columns()
+            if not column.get('generated') and column['name'] != DELETED_COLUMN
+        )
+        self.insert_columns = self.summary_fields + shadow_columns
+        quoted = [quote_identifier(name) for name in self.insert_columns]
+        self.insert_sql = (
+            f"INSERT INTO personnel ({', '.join(quoted)}) VALUES ({', '.join(['?'] * len(quoted))})"
+        )
+        # 覆盖导入：按身份证号冲突时更新，摘要未变化的行不更新
+        key = quote_identifier(UPSERT_KEY_FIELD)
+        row_hash_column = quote_identifier(ROW_HASH_COLUMN)
+        assignments = ', '.join(f'{column} = excluded.{column}' for column in quoted if column != key)
+        self.upsert_sql = (
+            f"{self.insert_sql} ON CONFLICT({key}) DO UPDATE SET {assignments} "
+            f"WHERE personnel.{row_hash_column} IS NOT excluded.{row_hash_column}"
+        )
+
+    def column_ref(self, name):
+        return self._refs.get(name) or f"p.{quote_identifier(name)}"
+
+    def insert_params(self, values):
+        """insert_sql 的参数（按 insert_columns 顺序，缺少的列为 NULL）"""
+        return tuple(values.get(name) for name in self.insert_columns)
+
+    def _variant(self, kind, columns, build):
+        key = (kind, tuple(columns))
+        sql = self._variants.get(key)
+        if sql is None:
+            sql = self._variants[key] = build(key[1])
+        return sql
+
+    def select_list(self, columns):
+        """查询列清单（明细字段引用 d 表）"""
+        return self._variant('select', columns, lambda cols: ', '.join(map(self.column_ref, cols)))
+
+    def update_sql(self, columns):
+        """按身份证号更新指定列的语句，参数为 (各列值..., 身份证号)；已删除的记录不更新"""
+        def build(cols):
+            set_clause = ', '.join(f'{quote_identifier(name)} = ?' for name in cols)
+            return (
+                f"UPDATE personnel SET {set_clause} "
+                f"WHERE {quote_identifier(UPSERT_KEY_FIELD)} = ? AND {quote_identifier(DELETED_COLUMN)} IS NULL"
+            )
+        return self._variant('update', columns, build)
+
+    def detail_upsert_sql(self, columns):
+        """写入明细表的语句，参数为 (id, 各明细列...)；已有明细行时覆盖给出的列"""
+        def build(cols):
+            quoted = [quote_identifier(name) for name in cols]
+            assignments = ', '.join(f'{name} = excluded.{name}' for name in quoted)
+            return (
+                f"INSERT INTO {DETAIL_TABLE} (id, {', '.join(quoted)}) "
+                f"VALUES ({', '.join(['?'] * (len(cols) + 1))}) "
+                f"ON CONFLICT(id) DO UPDATE SET {assignments}"
+            )
+        return self._variant('detail', columns, build)
+
 class FieldManagerDialog(QDialog):
     def __init__(self, parent=None):
         super().__init__(parent)
@@ -304,8 +960,8 @@ class FieldManagerDialog(QDialog):
         
         # 字段表格
         self.table = QTableWidget()
-        self.table.setColumnCount(5)
-        self.table.setHorizontalHeaderLabels(["字段名称", "类型", "必填", "唯一", "操作"])
+        self.table.setColumnCount(7)
+        self.table.setHorizontalHeaderLabels(["字段名称", "类型", "必填", "唯一", "索引", "明细", "操作"])
         self.table.horizontalHeader().setStretchLastSection(True)
         
         # 操作按钮
@@ -330,8 +986,9 @@ class FieldManagerDialog(QDialog):
         for idx, field in enumerate(self.field_manager.fields):
             self.table.insertRow(idx)
             
-            # 字段名称
+            # 字段名称（保留原配置，保存时合并未在表格中编辑的属性）
             name_item = QTableWidgetItem(field['name'])
+            name_item.setData(Qt.UserRole, dict(field))
             
             # 类型选择
             type_combo = QComboBox()
@@ -346,15 +1003,25 @@ class FieldManagerDialog(QDialog):
             unique_check = QCheckBox()
             unique_check.setChecked(field.get('unique', False))
             
+            # 索引
+            indexed_check = QCheckBox()
+            indexed_check.setChecked(bool(field.get('indexed')))
+
+            # 明细（长文本单独存放，主表格不显示）
+            detail_check = QCheckBox()
+            detail_check.setChecked(bool(field.get('detail')))
+            
             # 删除按钮
             del_btn = QPushButton("删除")
-            del_btn.clicked.connect(lambda _, row=idx: self.delete_field(row))
+            del_btn.clicked.connect(lambda _, button=del_btn: self.delete_field(button))
             
             self.table.setItem(idx, 0, name_item)
             self.table.setCellWidget(idx, 1, type_combo)
             self.table.setCellWidget(idx, 2, required_check)
             self.table.setCellWidget(idx, 3, unique_check)
-            self.table.setCellWidget(idx, 4, del_btn)
+            self.table.setCellWidget(idx, 4, indexed_check)
+            self.table.setCellWidget(idx, 5, detail_check)
+            self.table.setCellWidget(idx, 6, del_btn)
 
     def add_field(self):
         row = self.table.rowCount()
@@ -368,21 +1035,17 @@ class FieldManagerDialog(QDialog):
         self.table.setCellWidget(row, 1, type_combo)
         self.table.setCellWidget(row, 2, QCheckBox())
         self.table.setCellWidget(row, 3, QCheckBox())
-        self.table.setCellWidget(row, 4, QPushButton("删除"))
-
-    def delete_field(self, row):
-        """删除字段"""
-        if row < 0 or row >= len(self.field_manager.fields):
-            return
-            
-        # 从字段列表中删除
-        self.field_manager.fields.pop(row)
-        
-        # 从表格中删除行
-        self.table.removeRow(row)
-        
-        # 立即更新UI
-        self.load_fields()
+        self.table.setCellWidget(row, 4, QCheckBox())
+        self.table.setCellWidget(row, 5, QCheckBox())
+        del_btn = QPushButton("删除")
+        del_btn.clicked.connect(lambda _, button=del_btn: self.delete_field(button))
+        self.table.setCellWidget(row, 6, del_btn)
+
+    def delete_field(self, button):
+        """删除按钮所在行的字段（只改表格，保存配置后才生效）"""
+        row = self.table.indexAt(button.pos()).row()
+        if row >= 0:
+            self.table.removeRow(row)
 
     def save_config(self):
         try:
@@ -404,118 +1067,3078 @@ class FieldManagerDialog(QDialog):
                 type_combo = self.table.cellWidget(row, 1)
                 required_check = self.table.cellWidget(row, 2)
                 unique_check = self.table.cellWidget(row, 3)
+                indexed_check = self.table.cellWidget(row, 4)
+                detail_check = self.table.cellWidget(row, 5)
                 
-                fields.append({
+                field = dict(name_item.data(Qt.UserRole) or {})
+                field.update({
                     'name': field_name,
                     'type': type_combo.currentText(),
                     'required': required_check.isChecked(),
                     'unique': unique_check.isChecked()
                 })
+                # 保留原有的复合索引分组声明
+                if indexed_check.isChecked():
+                    field['indexed'] = field.get('indexed') or True
+                else:
+                    field.pop('indexed', None)
+                if detail_check.isChecked():
+                    field['detail'] = True
+                else:
+                    field.pop('detail', None)
+                fields.append(field)
+            self.field_manager.validate_fields(fields)
             
-            # 保存到文件
+            # 保存到文件（由主窗口重新读取并就地迁移表结构，见 ArchiveManager.apply_field_config）
             template_dir = resource_path('templates')
             os.makedirs(template_dir, exist_ok=True)
-            save_path = os.path.join(template_dir, 'fields.json')
+            save_path = self.field_manager.config_path()
             
             with open(save_path, 'w', encoding='utf-8') as f:
                 json.dump({'fields': fields}, f, ensure_ascii=False, indent=2)
-            
-            # 更新配置并提示重启
-            self.field_manager.fields = fields
-            QMessageBox.information(
-                self, "成功", 
-                "字段配置已保存！\n请重启程序应用数据库变更。"
-            )
             self.accept()
         except Exception as e:
             QMessageBox.critical(self, "错误", f"保存失败: {str(e)}")
+# --------------------------- SQL 执行统计 ---------------------------
+SQL_STRING_PATTERN = re.compile(r"'(?:[^']|'')*'")
+SQL_NUMBER_PATTERN = re.compile(r'(?<![\w."])\d+(?:\.\d+)?(?![\w"])')
+SQL_IN_LIST_PATTERN = re.compile(r'\(\s*\?(?:\s*,\s*\?)+\s*\)')
+SQL_VALUES_PATTERN = re.compile(r'(\([?,. ]+\))(?:, \1)+')
+FULL_SCAN_PATTERN = re.compile(r'^SCAN (?:TABLE )?[^\s(]\S*(?: AS \S+)?$')
+
+class QueryProfiler:
+    """SQL 执行统计（全局实例 query_profiler）
+
+    DBManager 建立的连接均为 InstrumentedConnection，每条语句的执行与读取耗时、
+    返回/影响行数按语句形态（字面量与 IN 列表归一为 ?）汇总。每种形态第一次出现时
+    记录一次 EXPLAIN QUERY PLAN，计划中含全表扫描（SCAN 表 且未使用索引）时标记；
+    单次耗时超过阈值的语句连同执行计划写入日志，并保留最近 SLOW_QUERY_LOG_SIZE 条。
+    """
+    PLAN_PREFIXES = ('SELECT', 'WITH', 'UPDATE', 'DELETE', 'INSERT', 'REPLACE')
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        settings = QSettings("MyCompany", "ArchiveManager")
+        self.enabled = settings.value("queryProfiling", True, type=bool)
+        self.set_threshold(settings.value("slowQueryMs", SLOW_QUERY_THRESHOLD_MS, type=int))
+        self.reset()
+
+    def set_threshold(self, milliseconds):
+        """设置慢查询阈值（毫秒）"""
+        self.threshold_ms = milliseconds
+        self.threshold = milliseconds / 1000
+
+    def reset(self):
+        """清空已收集的统计"""
+        with self._lock:
+            self.shapes = {}
+            self.slow = deque(maxlen=SLOW_QUERY_LOG_SIZE)
+
+    @staticmethod
+    @lru_cache(maxsize=2048)
+    def shape(sql):
+        """语句形态：去掉字面量、折叠 IN 列表与多行 VALUES、规范空白"""
+        text = SQL_STRING_PATTERN.sub('?', sql)
+        text = SQL_NUMBER_PATTERN.sub('?', text)
+        text = ' '.join(text.split())
+        text = SQL_IN_LIST_PATTERN.sub('(?, ...)', text)
+        return SQL_VALUES_PATTERN.sub(r'\1, ...', text)
+
+    @classmethod
+    def explain(cls, conn, sql, parameters):
+        """返回 (缩进的执行计划文本, 是否含全表扫描)；不适用或失败时返回 (None, False)"""
+        if parameters is None or not sql.lstrip().upper().startswith(cls.PLAN_PREFIXES):
+            return None, False
+        try:
+            # 使用普通游标执行，计划查询本身不计入统计
+            rows = sqlite3.Cursor(conn).execute(f"EXPLAIN QUERY PLAN {sql}", parameters).fetchall()
+        except sqlite3.Error as e:
+            logger.debug(f"执行计划获取失败: {str(e)}")
+            return None, False
+        depth = {0: -1}
+        lines = []
+        full_scan = False
+        for node, parent, _, detail in rows:
+            depth[node] = depth.get(parent, -1) + 1
+            lines.append("  " * depth[node] + detail)
+            full_scan = full_scan or bool(FULL_SCAN_PATTERN.match(detail))
+        return "\n".join(lines), full_scan
+
+    def stats_for(self, conn, sql, parameters):
+        """取得语句形态的统计项，首次出现时记录执行计划"""
+        shape = self.shape(sql)
+        with self._lock:
+            stats = self.shapes.get(shape)
+            if stats is not None:
+                return stats
+            stats = self.shapes[shape] = {
+                'sql': shape, 'count': 0, 'total': 0.0, 'max': 0.0, 'rows': 0,
+                'slow': 0, 'plan': None, 'full_scan': False,
+            }
+        stats['plan'], stats['full_scan'] = self.explain(conn, sql, parameters)
+        return stats
+
+    def charge(self, stats, elapsed, rows, executions, execution_elapsed):
+        with self._lock:
+            stats['count'] += executions
+            stats['total'] += elapsed
+            stats['rows'] += rows
+            if execution_elapsed > stats['max']:
+                stats['max'] = execution_elapsed
+
+    def report_slow(self, stats, elapsed):
+        """记录一次慢查询，返回慢查询条目（后续读取耗时继续累计到该条目）"""
+        entry = {
+            'time': datetime.now().isoformat(timespec='seconds'),
+            'sql': stats['sql'],
+            'ms': round(elapsed * 1000, 1),
+            'plan': stats['plan'],
+        }
+        with self._lock:
+            stats['slow'] += 1
+            self.slow.append(entry)
+        logger.warning(
+            f"慢查询（{entry['ms']}ms，阈值 {self.threshold_ms}ms）: {stats['sql']}\n"
+            f"执行计划:\n{stats['plan'] or '（无）'}"
+        )
+        return entry
+
+    def summary(self):
+        """按总耗时降序的各形态统计（耗时单位毫秒）"""
+        with self._lock:
+            shapes = [dict(stats) for stats in self.shapes.values()]
+            slow = [dict(entry) for entry in self.slow]
+        for stats in shapes:
+            stats['total'] = round(stats['total'] * 1000, 2)
+            stats['max'] = round(stats['max'] * 1000, 2)
+            stats['avg'] = round(stats['total'] / stats['count'], 3) if stats['count'] else 0
+        shapes.sort(key=lambda stats: stats['total'], reverse=True)
+        return shapes, slow
+
+    def dump(self, path):
+        """将统计写入 JSON 文件"""
+        shapes, slow = self.summary()
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump({
+                'generated': datetime.now().isoformat(timespec='seconds'),
+                'threshold_ms': self.threshold_ms,
+                'queries': shapes,
+                'slow_queries': slow,
+            }, f, ensure_ascii=False, indent=2)
+        return path
+
+class InstrumentedCursor(sqlite3.Cursor):
+    """计时游标：execute 以及随后各次读取的耗时与行数计入 query_profiler"""
+    _stats = None
+
+    def execute(self, sql, parameters=()):
+        start = time.perf_counter()
+        super().execute(sql, parameters)
+        self._begin(sql, parameters, time.perf_counter() - start)
+        return self
+
+    def executemany(self, sql, seq_of_parameters):
+        start = time.perf_counter()
+        super().executemany(sql, seq_of_parameters)
+        self._begin(sql, None, time.perf_counter() - start)
+        return self
+
+    def _begin(self, sql, parameters, elapsed):
+        self._stats = query_profiler.stats_for(self.connection, sql, parameters)
+        self._elapsed = 0.0
+        self._slow_entry = None
+        rows = self.rowcount if self.description is None and self.rowcount > 0 else 0
+        self._charge(elapsed, rows, executions=1)
+
+    def _charge(self, elapsed, rows, executions=0):
+        if self._stats is None:
+            return
+        self._elapsed += elapsed
+        query_profiler.charge(self._stats, elapsed, rows, executions, self._elapsed)
+        if self._slow_entry is not None:
+            self._slow_entry['ms'] = round(self._elapsed * 1000, 1)
+        elif self._elapsed >= query_profiler.threshold:
+            self._slow_entry = query_profiler.report_slow(self._stats, self._elapsed)
+
+    def fetchone(self):
+        start = time.perf_counter()
+        row = super().fetchone()
+        self._charge(time.perf_counter() - start, int(row is not None))
+        return row
+
+    def fetchmany(self, size=None):
+        start = time.perf_counter()
+        rows = super().fetchmany(self.arraysize if size is None else size)
+        self._charge(time.perf_counter() - start, len(rows))
+        return rows
+
+    def fetchall(self):
+        start = time.perf_counter()
+        rows = super().fetchall()
+        self._charge(time.perf_counter() - start, len(rows))
+        return rows
+
+    def __next__(self):
+        start = time.perf_counter()
+        row = super().__next__()
+        self._charge(time.perf_counter() - start, 1)
+        return row
+
+class InstrumentedConnection(sqlite3.Connection):
+    """默认使用 InstrumentedCursor 的连接"""
+
+    def cursor(self, factory=InstrumentedCursor):
+        return super().cursor(factory)
+
+    def execute(self, sql, parameters=()):
+        return self.cursor().execute(sql, parameters)
+
+    def executemany(self, sql, seq_of_parameters):
+        return self.cursor().executemany(sql, seq_of_parameters)
+
+query_profiler = QueryProfiler()
+
 # --------------------------- 数据库操作 ---------------------------
 class DBManager:
-    _instance = None
-    
-    def __new__(cls):
-        if not cls._instance:
-            cls._instance = super().__new__(cls)
-            cls._instance.fields = cls._instance.load_fields()
-            cls._instance._init_db()
-        return cls._instance
-    
-    def _init_db(self):
-        """初始化数据库连接"""
+    """数据库连接管理（按数据库路径单例）
+
+    每个线程复用一条连接，连接参数与 PRAGMA 只在建立连接时设置一次；
+    线程退出后其连接在下次取连接时回收，连接总数保持在较小范围。
+    所有连接（含 open_connection 建立的独立连接）都应用当前性能配置，
+    配置名保存在 QSettings 的 dbProfile 项，缺省为 DEFAULT_PERFORMANCE_PROFILE。
+    """
+    _instances = {}
+    _lock = threading.Lock()
+    MAX_CONNECTIONS = 4
+    STATEMENT_CACHE_SIZE = 256  # 每条连接缓存的预编译语句数
+
+    def __new__(cls, db_path=None):
+        db_path = db_path or get_db_path()
+        with cls._lock:
+            instance = cls._instances.get(db_path)
+            if instance is None:
+                instance = super().__new__(cls)
+                instance._init_db(db_path)
+                cls._instances[db_path] = instance
+        return instance
+
+    def _init_db(self, db_path):
+        """初始化连接池"""
+        self.db_path = db_path
+        self._connections = {}  # 线程ID -> 连接
+        self._pool_lock = threading.Lock()
+        self.profile = self._saved_profile()
+        logger.info(f"数据库连接池已创建: {db_path}（性能配置 {self.profile}）")
+
+    @staticmethod
+    def _saved_profile():
+        """读取用户选择的性能配置，无效时回退到默认配置"""
+        name = QSettings("MyCompany", "ArchiveManager").value("dbProfile", DEFAULT_PERFORMANCE_PROFILE)
+        if name not in PERFORMANCE_PROFILES:
+            logger.warning(f"未知的性能配置 {name}，使用 {DEFAULT_PERFORMANCE_PROFILE}")
+            name = DEFAULT_PERFORMANCE_PROFILE
+        return name
+
+    @staticmethod
+    def apply_profile(conn, name):
+        """在连接上应用指定的性能配置（PRAGMA 均为连接级，不影响其他连接）"""
+        for pragma, value in PERFORMANCE_PROFILES[name].items():
+            conn.execute(f"PRAGMA {pragma}={value}")
+
+    def _connect(self):
+        """建立新连接并应用连接级设置"""
         try:
-            db_path = get_db_path()
-            self.conn = sqlite3.connect(
-                db_path,
+            conn = sqlite3.connect(
+                self.db_path,
                 check_same_thread=False,
-                timeout=30
+                timeout=30,
+                cached_statements=self.STATEMENT_CACHE_SIZE,
+                factory=InstrumentedConnection if query_profiler.enabled else sqlite3.Connection
             )
-            self.conn.execute("PRAGMA journal_mode=WAL")
-            self.conn.execute("PRAGMA foreign_keys=ON")
-            logger.info(f"数据库连接已建立: {db_path}")
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA foreign_keys=ON")
+            self.apply_profile(conn, self.profile)
+            logger.debug(f"数据库连接已建立: {self.db_path}（线程 {threading.get_ident()}）")
+            return conn
         except Exception as e:
             logger.critical(f"数据库连接失败: {str(e)}")
             raise
-    
+
+    def open_connection(self):
+        """建立一条不入池的独立连接（由调用方负责关闭）"""
+        return self._connect()
+
+    @contextmanager
+    def read_snapshot(self, profile='bulk'):
+        """只读快照连接：独立连接上开启读事务并保持到退出，期间读到的是同一时刻的数据
+
+        WAL 模式下快照读既不阻塞其他连接的写入，也不被写入阻塞，适合导出、统计等
+        长时间的只读任务。连接设置 query_only 防止误写；读事务期间检查点无法越过
+        该快照，任务结束后 WAL 才能被完整回收，因此不宜长期持有。
+        """
+        conn = self._connect()
+        try:
+            self.apply_profile(conn, profile)
+            conn.execute("PRAGMA query_only=ON")
+            conn.execute("BEGIN")
+            conn.execute("SELECT COUNT(*) FROM sqlite_master").fetchone()  # 取得读快照
+            yield conn
+        finally:
+            conn.rollback()
+            conn.close()
+
     def get_connection(self):
-        """获取数据库连接"""
-        if not hasattr(self, 'conn') or not self.conn:
-            self._init_db()
+        """获取当前线程的数据库连接"""
+        ident = threading.get_ident()
+        with self._pool_lock:
+            conn = self._connections.get(ident)
+            if conn is None:
+                if len(self._connections) >= self.MAX_CONNECTIONS:
+                    self._release_dead_threads()
+                conn = self._connect()
+                self._connections[ident] = conn
+        return conn
+
+    def set_profile(self, name, persist=False):
+        """切换默认性能配置并应用到池中所有连接；persist=True 时写入用户设置"""
+        if name not in PERFORMANCE_PROFILES:
+            raise ValueError(f"未知的性能配置: {name}")
+        with self._pool_lock:
+            self.profile = name
+            for conn in self._connections.values():
+                self.apply_profile(conn, name)
+        if persist:
+            QSettings("MyCompany", "ArchiveManager").setValue("dbProfile", name)
+        logger.info(f"数据库性能配置切换为 {name}")
+
+    @contextmanager
+    def profile_scope(self, name, conn=None):
+        """临时以指定配置使用连接（默认当前线程的连接），退出时恢复该连接原有的设置
+
+        仅影响该连接本身，其他线程的读写仍按原配置进行。bulk 配置关闭了自动检查点，
+        退出时补做一次被动检查点，避免 WAL 文件持续增长。
+        """
+        conn = conn or self.get_connection()
+        previous = {pragma: conn.execute(f"PRAGMA {pragma}").fetchone()[0] for pragma in PERFORMANCE_PROFILES[name]}
+        self.apply_profile(conn, name)
+        try:
+            yield conn
+        finally:
+            for pragma, value in previous.items():
+                conn.execute(f"PRAGMA {pragma}={value}")
+            if not PERFORMANCE_PROFILES[name]['wal_autocheckpoint']:
+                try:
+                    conn.execute("PRAGMA wal_checkpoint(PASSIVE)")
+                except sqlite3.Error as e:
+                    logger.warning(f"WAL 检查点失败: {str(e)}")
+
+    def _release_dead_threads(self):
+        """关闭已退出线程遗留的连接"""
+        alive = {thread.ident for thread in threading.enumerate()}
+        for ident in list(self._connections):
+            if ident not in alive:
+                self._connections.pop(ident).close()
+
+    def close(self):
+        """关闭所有数据库连接"""
+        with self._pool_lock:
+            for conn in self._connections.values():
+                conn.close()
+            self._connections.clear()
+
+# --------------------------- 在线备份 ---------------------------
+class BackupCancelled(Exception):
+    """备份被用户取消"""
+
+def online_backup(db_path, dest_path, step_pages=-1, progress=None):
+    """使用 SQLite 备份 API 将数据库复制到 dest_path
+
+    源连接先开启读事务并在整个备份期间保持，复制的是开始时刻的一致快照
+    （包含仍在 -wal 文件中的已提交页）；WAL 模式下读事务不阻塞其他连接写入，
+    快照也不会因其他连接的写入而重新开始复制。
+    step_pages>0 时分步复制，每步后回调 progress(已复制页数, 总页数)，
+    回调抛出 BackupCancelled 即中止。先写入临时文件，完成后再替换目标文件。
+    """
+    partial_path = f"{dest_path}.part"
+    source = DBManager(db_path).open_connection()
+    target = sqlite3.connect(partial_path)
+    completed = False
+    try:
+        source.execute("BEGIN")
+        source.execute("SELECT COUNT(*) FROM sqlite_master").fetchone()  # 取得读快照
+
+        def on_step(status, remaining, total):
+            if progress:
+                progress(total - remaining, total)
+
+        source.backup(target, pages=step_pages, progress=on_step)
+        completed = True
+    finally:
+        target.close()
+        source.rollback()
+        source.close()
+        if not completed and os.path.exists(partial_path):
+            os.remove(partial_path)
+    os.replace(partial_path, dest_path)
+    logger.info(f"已创建数据库备份: {dest_path}")
+    return dest_path
+
+class BackupStore:
+    """压缩快照备份库
+
+    每个快照是一次 online_backup 的结果，流式压缩（zstd，未安装时 gzip）后保存在
+    备份目录中，manifest.json 记录文件名、时间、内容 SHA-256 与变更标记。
+    变更标记为变更日志序号与结构版本：与最新快照相同时直接跳过，不做任何复制；
+    复制后内容摘要与最新快照相同时也不保存。保存后按 BACKUP_RETENTION
+    保留最近几个以及每小时/每天/每周最新的快照，其余删除。
+    """
+    MANIFEST = "manifest.json"
+
+    def __init__(self, backup_dir=None, retention=None):
+        self.backup_dir = backup_dir or get_backup_dir()
+        self.retention = retention or BACKUP_RETENTION
+        os.makedirs(self.backup_dir, exist_ok=True)
+        self.manifest_path = os.path.join(self.backup_dir, self.MANIFEST)
+
+    # ---------- 清单 ----------
+    def snapshots(self):
+        """全部快照记录，最新的在前"""
+        try:
+            with open(self.manifest_path, encoding='utf-8') as f:
+                entries = json.load(f).get('snapshots', [])
+        except FileNotFoundError:
+            return []
+        except (OSError, ValueError) as e:
+            logger.error(f"备份清单读取失败: {str(e)}")
+            return []
+        return sorted(entries, key=lambda entry: entry['created'], reverse=True)
+
+    def _save_manifest(self, entries):
+        temp_path = f"{self.manifest_path}.tmp"
+        with open(temp_path, 'w', encoding='utf-8') as f:
+            json.dump({'snapshots': entries}, f, ensure_ascii=False, indent=2)
+        os.replace(temp_path, self.manifest_path)
+
+    @staticmethod
+    def change_marker(conn):
+        """数据库的变更标记：变更日志最新序号（AUTOINCREMENT，清理日志后也不回退）与结构版本"""
+        try:
+            seq = conn.execute(
+                "SELECT seq FROM sqlite_sequence WHERE name = 'personnel_changes'"
+            ).fetchone()
+            version = conn.execute("SELECT version FROM schema_version").fetchone()
+        except sqlite3.OperationalError:  # 尚未完成迁移
+            seq = version = None
+        return f"{seq[0] if seq else 0}:{version[0] if version else 0}"
+
+    # ---------- 备份 ----------
+    def snapshot(self, db_path, reason='manual', progress=None, step_pages=-1, force=False):
+        """创建快照，返回快照文件路径；内容未变化而跳过时返回 None"""
+        entries = self.snapshots()
+        latest = entries[0] if entries else None
+        if latest and not force:
+            conn = DBManager(db_path).open_connection()
+            try:
+                unchanged = self.change_marker(conn) == latest.get('marker')
+            finally:
+                conn.close()
+            if unchanged:
+                logger.info(f"数据库自上次备份后未变化，跳过备份（{latest['file']}）")
+                return None
+
+        created = datetime.now()
+        codec = 'zstd' if zstandard else 'gzip'
+        base_name = f"archive_{created.strftime('%Y%m%d_%H%M%S')}"
+        file_name = f"{base_name}.db.{'zst' if codec == 'zstd' else 'gz'}"
+        suffix = 1
+        while os.path.exists(os.path.join(self.backup_dir, file_name)):
+            file_name = f"{base_name}_{suffix}.db.{'zst' if codec == 'zstd' else 'gz'}"
+            suffix += 1
+        raw_path = os.path.join(self.backup_dir, f".{base_name}.raw")
+        target_path = os.path.join(self.backup_dir, file_name)
+        try:
+            online_backup(db_path, raw_path, step_pages, progress)
+            check = sqlite3.connect(raw_path)
+            try:
+                marker = self.change_marker(check)
+            finally:
+                check.close()
+            digest = self._compress(raw_path, target_path, codec)
+            if latest and not force and digest == latest.get('sha256'):
+                os.remove(target_path)
+                latest['marker'] = marker  # 内容相同，记录新标记以便下次直接跳过
+                self._save_manifest(entries)
+                logger.info("数据库内容与上次备份相同，未保存新快照")
+                return None
+            entries.insert(0, {
+                'file': file_name,
+                'created': created.isoformat(timespec='seconds'),
+                'reason': reason,
+                'codec': codec,
+                'sha256': digest,
+                'size': os.path.getsize(raw_path),
+                'stored_size': os.path.getsize(target_path),
+                'marker': marker,
+            })
+        except BaseException:
+            if os.path.exists(target_path):
+                os.remove(target_path)
+            raise
+        finally:
+            if os.path.exists(raw_path):
+                os.remove(raw_path)
+        self._save_manifest(self._apply_retention(entries))
+        logger.info(f"已创建压缩备份: {target_path}")
+        return target_path
+
+    @staticmethod
+    def _compress(source_path, target_path, codec):
+        """流式压缩，返回原始内容的 SHA-256"""
+        digest = hashlib.sha256()
+        with open(source_path, 'rb') as source, open(target_path, 'wb') as raw_target:
+            if codec == 'zstd':
+                target = zstandard.ZstdCompressor(level=3).stream_writer(raw_target, closefd=False)
+            else:
+                target = gzip.GzipFile(fileobj=raw_target, mode='wb', compresslevel=6)
+            with target:
+                for chunk in iter(lambda: source.read(BACKUP_CHUNK_SIZE), b''):
+                    digest.update(chunk)
+                    target.write(chunk)
+        return digest.hexdigest()
+
+    def _apply_retention(self, entries):
+        """保留最近几个快照及每个小时/天/周中最新的快照，删除其余文件，返回保留的记录"""
+        bucket_keys = {
+            'last': lambda moment: moment.isoformat(),
+            'hourly': lambda moment: moment.strftime('%Y%m%d%H'),
+            'daily': lambda moment: moment.strftime('%Y%m%d'),
+            'weekly': lambda moment: '%d-%02d' % moment.isocalendar()[:2],
+        }
+        keep = {entries[0]['file']} if entries else set()
+        for bucket, limit in self.retention.items():
+            seen = set()
+            for entry in entries:  # 最新的在前，每个时间段保留第一个
+                key = bucket_keys[bucket](datetime.fromisoformat(entry['created']))
+                if key in seen:
+                    continue
+                if len(seen) >= limit:
+                    break
+                seen.add(key)
+                keep.add(entry['file'])
+        retained = []
+        for entry in entries:
+            path = os.path.join(self.backup_dir, entry['file'])
+            if entry['file'] in keep:
+                retained.append(entry)
+            elif os.path.exists(path):
+                os.remove(path)
+                logger.info(f"按保留策略删除备份: {entry['file']}")
+        return retained
+
+    # ---------- 恢复 ----------
+    def restore(self, file_name, db_path):
+        """将快照恢复到数据库
+
+        先解压到数据库所在目录的临时文件并校验摘要与完整性，再通过备份 API
+        按页写回正在使用的数据库（无需关闭程序或替换文件）。
+        """
+        entry = next((e for e in self.snapshots() if e['file'] == file_name), None)
+        if entry is None:
+            raise ValueError(f"备份不存在: {file_name}")
+        if entry['codec'] == 'zstd' and zstandard is None:
+            raise RuntimeError("该备份使用 zstd 压缩，请先安装 zstandard")
+
+        temp_path = os.path.join(os.path.dirname(db_path), f".restore_{os.getpid()}.db")
+        try:
+            digest = hashlib.sha256()
+            with open(os.path.join(self.backup_dir, file_name), 'rb') as raw_source, \
+                    open(temp_path, 'wb') as target:
+                if entry['codec'] == 'zstd':
+                    source = zstandard.ZstdDecompressor().stream_reader(raw_source, closefd=False)
+                else:
+                    source = gzip.GzipFile(fileobj=raw_source, mode='rb')
+                with source:
+                    for chunk in iter(lambda: source.read(BACKUP_CHUNK_SIZE), b''):
+                        digest.update(chunk)
+                        target.write(chunk)
+            if digest.hexdigest() != entry['sha256']:
+                raise ValueError(f"备份文件已损坏（摘要不符）: {file_name}")
+
+            source_conn = sqlite3.connect(temp_path)
+            try:
+                if source_conn.execute("PRAGMA quick_check").fetchone()[0] != 'ok':
+                    raise ValueError(f"备份文件完整性校验失败: {file_name}")
+                target_conn = DBManager(db_path).open_connection()
+                try:
+                    source_conn.backup(target_conn)
+                finally:
+                    target_conn.close()
+            finally:
+                source_conn.close()
+        finally:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+        logger.info(f"已从备份恢复数据库: {file_name}")
+
+class BackupWorker(QThread):
+    """在工作线程中分步创建快照（BackupStore），期间界面与写入操作不受影响"""
+    progress = pyqtSignal(int, int)      # 已复制页数, 总页数
+    succeeded = pyqtSignal(str)          # 快照文件路径，内容未变化而跳过时为空串
+    failed = pyqtSignal(str)             # 错误信息
+    cancelled = pyqtSignal()
+
+    def __init__(self, db_path, store=None, step_pages=BACKUP_STEP_PAGES, parent=None):
+        super().__init__(parent)
+        self.db_path = db_path
+        self.store = store or BackupStore()
+        self.step_pages = step_pages
+        self._cancel_requested = threading.Event()
+
+    def cancel(self):
+        """请求取消，在当前步完成后生效"""
+        self._cancel_requested.set()
+
+    def _on_progress(self, copied, total):
+        if self._cancel_requested.is_set():
+            raise BackupCancelled()
+        self.progress.emit(copied, total)
+
+    def run(self):
+        try:
+            path = self.store.snapshot(
+                self.db_path, progress=self._on_progress, step_pages=self.step_pages
+            )
+            self.succeeded.emit(path or '')
+        except BackupCancelled:
+            logger.info("备份已取消")
+            self.cancelled.emit()
+        except Exception as e:
+            logger.error(f"备份失败: {str(e)}")
+            self.failed.emit(str(e))
+
+# --------------------------- 快照读任务 ---------------------------
+class SnapshotCancelled(Exception):
+    """快照读任务被用户取消"""
+
+class SnapshotWorker(QThread):
+    """在工作线程中基于只读快照执行报表/导出任务
+
+    job(repo, report) 在 DBManager.read_snapshot 上运行，repo 为绑定快照连接的
+    PersonnelRepository，任务内的多次查询看到的是同一时刻的数据；report(已完成, 总数)
+    汇报进度，取消后下一次汇报时抛出 SnapshotCancelled 中止任务。
+    """
+    progress = pyqtSignal(int, int)      # 已完成, 总数
+    succeeded = pyqtSignal(object)       # job 的返回值
+    failed = pyqtSignal(str)             # 错误信息
+    cancelled = pyqtSignal()
+
+    def __init__(self, db_path, job, parent=None):
+        super().__init__(parent)
+        self.db_path = db_path
+        self.job = job
+        self._cancel_requested = threading.Event()
+
+    def cancel(self):
+        """请求取消，在下一次汇报进度时生效"""
+        self._cancel_requested.set()
+
+    def _report(self, done, total):
+        if self._cancel_requested.is_set():
+            raise SnapshotCancelled()
+        self.progress.emit(done, total)
+
+    def run(self):
+        try:
+            with DBManager(self.db_path).read_snapshot() as conn:
+                result = self.job(PersonnelRepository(self.db_path, conn=conn), self._report)
+            self.succeeded.emit(result)
+        except SnapshotCancelled:
+            logger.info("快照任务已取消")
+            self.cancelled.emit()
+        except Exception as e:
+            logger.error(f"快照任务失败: {traceback.format_exc()}")
+            self.failed.emit(str(e))
+
+# --------------------------- 电子档案附件 ---------------------------
+class AttachmentStore:
+    """按内容寻址的电子档案附件库
+
+    文件按 SHA-256 存放在 blobs/ab/cd/<摘要> 下，内容相同的扫描件只保存一份；
+    写入与导出均按块流式进行，不把整个文件读入内存。人员与附件的对应关系记录在
+    ATTACHMENT_TABLE 中。缩略图在首次查看时生成并缓存到 thumbs/ 下。
+    不再被引用的文件先移入 trash/，超过 ATTACHMENT_GRACE_DAYS 后才删除，
+    期间若恢复了引用它的旧备份，读取时自动移回。
+    """
+
+    def __init__(self, db_path=None, root=None):
+        self.db_path = db_path or get_db_path()
+        self.root = root or get_attachment_dir()
+        for name in ('blobs', 'thumbs', 'trash', 'tmp'):
+            os.makedirs(os.path.join(self.root, name), exist_ok=True)
+
+    @property
+    def conn(self):
+        return DBManager(self.db_path).get_connection()
+
+    # ---------- 文件 ----------
+    def blob_path(self, digest):
+        return os.path.join(self.root, 'blobs', digest[:2], digest[2:4], digest)
+
+    def thumbnail_path(self, digest):
+        return os.path.join(self.root, 'thumbs', digest[:2], f"{digest}.png")
+
+    def _trash_path(self, digest):
+        return os.path.join(self.root, 'trash', digest)
+
+    def locate(self, digest):
+        """返回附件文件路径（必要时从 trash/ 移回），不存在时抛出 FileNotFoundError"""
+        path = self.blob_path(digest)
+        if not os.path.exists(path):
+            trashed = self._trash_path(digest)
+            if not os.path.exists(trashed):
+                raise FileNotFoundError(f"附件文件缺失: {digest}")
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            os.replace(trashed, path)
+        return path
+
+    def put(self, file_path):
+        """流式写入文件，返回 (摘要, 字节数)；内容已存在时不重复保存"""
+        digest = hashlib.sha256()
+        size = 0
+        fd, temp_path = tempfile.mkstemp(dir=os.path.join(self.root, 'tmp'))
+        try:
+            with open(file_path, 'rb') as source, os.fdopen(fd, 'wb') as target:
+                for chunk in iter(lambda: source.read(BACKUP_CHUNK_SIZE), b''):
+                    digest.update(chunk)
+                    target.write(chunk)
+                    size += len(chunk)
+            key = digest.hexdigest()
+            try:
+                self.locate(key)  # 已有相同内容
+            except FileNotFoundError:
+                path = self.blob_path(key)
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                os.replace(temp_path, path)
+            return key, size
+        finally:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+
+    def export(self, digest, dest_path, verify=True):
+        """流式复制附件到 dest_path，verify 时校验内容摘要"""
+        checksum = hashlib.sha256()
+        with open(self.locate(digest), 'rb') as source, open(dest_path, 'wb') as target:
+            for chunk in iter(lambda: source.read(BACKUP_CHUNK_SIZE), b''):
+                checksum.update(chunk)
+                target.write(chunk)
+        if verify and checksum.hexdigest() != digest:
+            raise ValueError(f"附件内容校验失败（文件可能已损坏）: {digest}")
+        return dest_path
+
+    # ---------- 人员附件 ----------
+    def add(self, person_id, file_path):
+        """为人员添加附件，返回附件记录 id；同一人员重复添加同一文件时返回已有记录"""
+        digest, size = self.put(file_path)
+        with self.conn as conn:
+            conn.execute(
+                f"INSERT INTO {ATTACHMENT_TABLE} (person_id, sha256, file_name, size) VALUES (?, ?, ?, ?) "
+                f"ON CONFLICT(person_id, sha256) DO NOTHING",
+                (person_id, digest, os.path.basename(file_path), size)
+            )
+            row = conn.execute(
+                f"SELECT id FROM {ATTACHMENT_TABLE} WHERE person_id = ? AND sha256 = ?", (person_id, digest)
+            ).fetchone()
+        logger.info(f"已添加附件: {os.path.basename(file_path)}（{digest[:12]}）")
+        return row[0]
+
+    def attachments(self, person_id):
+        """人员的附件列表 [{id, sha256, file_name, size, added_at}]"""
+        rows = self.conn.execute(
+            f"SELECT id, sha256, file_name, size, added_at FROM {ATTACHMENT_TABLE} "
+            f"WHERE person_id = ? ORDER BY added_at, id", (person_id,)
+        ).fetchall()
+        return [dict(zip(('id', 'sha256', 'file_name', 'size', 'added_at'), row)) for row in rows]
+
+    def remove(self, attachment_id):
+        """删除附件记录；文件不再被任何人员引用时移入 trash/"""
+        with self.conn as conn:
+            row = conn.execute(
+                f"SELECT sha256 FROM {ATTACHMENT_TABLE} WHERE id = ?", (attachment_id,)
+            ).fetchone()
+            if row is None:
+                return
+            conn.execute(f"DELETE FROM {ATTACHMENT_TABLE} WHERE id = ?", (attachment_id,))
+            referenced = conn.execute(
+                f"SELECT 1 FROM {ATTACHMENT_TABLE} WHERE sha256 = ? LIMIT 1", (row[0],)
+            ).fetchone()
+        if not referenced:
+            self._discard(row[0])
+
+    def _discard(self, digest):
+        path = self.blob_path(digest)
+        if os.path.exists(path):
+            os.replace(path, self._trash_path(digest))
+            os.utime(self._trash_path(digest))  # 以移入时间计算保留期
+        thumbnail = self.thumbnail_path(digest)
+        if os.path.exists(thumbnail):
+            os.remove(thumbnail)
+
+    def collect_garbage(self, grace_days=ATTACHMENT_GRACE_DAYS):
+        """一次完成全部垃圾回收（维护或测试时使用）"""
+        for _ in self.garbage_steps(grace_days):
+            pass
+
+    def garbage_steps(self, grace_days=ATTACHMENT_GRACE_DAYS):
+        """分步垃圾回收（生成器，由 Compactor 在空闲时逐步推进）
+
+        每步处理 blobs/ 下的一个分组目录（摘要前两位），只按索引读取该分组被引用的摘要，
+        未被引用的文件移入 trash/；最后一步删除在 trash/ 中超过保留期且仍未被引用的文件。
+        """
+        blobs_dir = os.path.join(self.root, 'blobs')
+        for prefix in sorted(os.listdir(blobs_dir)):
+            referenced = {row[0] for row in self.conn.execute(
+                f"SELECT DISTINCT sha256 FROM {ATTACHMENT_TABLE} WHERE sha256 >= ? AND sha256 < ?",
+                prefix_range(prefix)
+            )}
+            for directory, _, names in os.walk(os.path.join(blobs_dir, prefix)):
+                for name in names:
+                    if name not in referenced:
+                        self._discard(name)
+            yield prefix
+        expire_before = time.time() - grace_days * 86400
+        trash_dir = os.path.join(self.root, 'trash')
+        for name in os.listdir(trash_dir):
+            path = os.path.join(trash_dir, name)
+            if os.path.getmtime(path) >= expire_before:
+                continue
+            if not self.conn.execute(
+                f"SELECT 1 FROM {ATTACHMENT_TABLE} WHERE sha256 = ? LIMIT 1", (name,)
+            ).fetchone():
+                os.remove(path)
+                logger.info(f"已删除过期附件: {name}")
+        yield 'trash'
+
+    # ---------- 缩略图 ----------
+    def thumbnail(self, digest):
+        """返回缓存的缩略图路径，首次调用时生成；无法生成缩略图的文件类型返回 None"""
+        path = self.thumbnail_path(digest)
+        if os.path.exists(path):
+            return path
+        source = self.locate(digest)
+        with open(source, 'rb') as f:
+            is_pdf = f.read(5) == b'%PDF-'
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        temp_path = f"{path}.{threading.get_ident()}.tmp"
+        try:
+            if is_pdf:
+                if fitz is None:
+                    return None
+                with fitz.open(source) as document:
+                    page = document[0]
+                    zoom = min(ATTACHMENT_THUMBNAIL_SIZE[0] / page.rect.width,
+                               ATTACHMENT_THUMBNAIL_SIZE[1] / page.rect.height)
+                    page.get_pixmap(matrix=fitz.Matrix(zoom, zoom)).save(temp_path, output='png')
+            else:
+                try:
+                    with Image.open(source) as image:
+                        image.draft('RGB', ATTACHMENT_THUMBNAIL_SIZE)  # JPEG 按缩小比例解码，大幅减少解码量
+                        image.thumbnail(ATTACHMENT_THUMBNAIL_SIZE)
+                        image.convert('RGB').save(temp_path, 'PNG')
+                except (OSError, SyntaxError, Image.DecompressionBombError):
+                    return None  # 非图片文件
+            os.replace(temp_path, path)
+            return path
+        finally:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+
+class ThumbnailWorker(QThread):
+    """在工作线程中依次生成缩略图（只写缓存文件，图标由界面线程加载）"""
+    ready = pyqtSignal(str, str)  # 摘要, 缩略图路径（无法生成时为空串）
+
+    def __init__(self, store, digests, parent=None):
+        super().__init__(parent)
+        self.store = store
+        self.digests = list(digests)
+        self._stop = threading.Event()
+
+    def stop(self):
+        self._stop.set()
+
+    def run(self):
+        for digest in self.digests:
+            if self._stop.is_set():
+                break
+            try:
+                path = self.store.thumbnail(digest)
+            except Exception as e:
+                logger.warning(f"缩略图生成失败（{digest[:12]}）: {str(e)}")
+                path = None
+            self.ready.emit(digest, path or '')
+
+# --------------------------- 结构迁移引擎 ---------------------------
+def fulltext_supported(conn):
+    """检测 SQLite 是否支持 FTS5 trigram 分词器（需 3.34+）"""
+    try:
+        conn.execute("CREATE VIRTUAL TABLE temp.fts_probe USING fts5(x, tokenize='trigram')")
+        conn.execute("DROP TABLE temp.fts_probe")
+        return True
+    except sqlite3.OperationalError:
+        logger.warning(f"当前 SQLite {sqlite3.sqlite_version} 不支持 FTS5 trigram，检索将使用 LIKE")
+        return False
+
+class SchemaMigrator:
+    """按 fields.json 增量迁移 personnel 表结构
+
+    结构指纹与 schema_version 表中记录一致时直接返回；否则对比
+    PRAGMA table_info，新增列使用 ADD COLUMN（必填列默认空串），删除字段使用
+    DROP COLUMN，均不重建表；新增唯一字段、删除唯一字段或字段类型/约束变化时
+    在单个事务内重建表并保留原有数据。
+    """
+
+    TABLE = 'personnel'
+
+    def __init__(self, conn, field_manager, db_path=None):
+        self.conn = conn
+        self.field_manager = field_manager
+        self.db_path = db_path
+
+    def read_version(self):
+        """读取已记录的结构版本，返回 (版本号, 指纹)"""
+        try:
+            row = self.conn.execute(
+                "SELECT version, fingerprint FROM schema_version WHERE id = 1"
+            ).fetchone()
+        except sqlite3.OperationalError:
+            return 0, None
+        return (row[0], row[1]) if row else (0, None)
+
+    def migrate(self):
+        """执行迁移，返回是否实际修改了数据库结构"""
+        fingerprint = self.field_manager.get_schema_fingerprint()
+        version, stored_fingerprint = self.read_version()
+        if stored_fingerprint == fingerprint:
+            logger.debug(f"数据库结构无变化（版本 {version}）")
+            return False
+
+        if not self.conn.execute("SELECT 1 FROM sqlite_master").fetchone():
+            # 新库在建表前设置即可生效，已有的库在迁移结束后转换
+            self.conn.execute("PRAGMA auto_vacuum=INCREMENTAL")
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS schema_version ("
+            "id INTEGER PRIMARY KEY CHECK (id = 1), "
+            "version INTEGER NOT NULL, "
+            "fingerprint TEXT NOT NULL, "
+            "updated_at TEXT NOT NULL)"
+        )
+
+        try:
+            changed = False
+            existing = self._existing_columns()
+            # 明细字段的数据须在 personnel 表删除对应列之前移入明细表
+            changed = self._sync_detail_table(existing)
+            if not existing:
+                create_sql = self.field_manager.get_create_table_sql(self.TABLE)
+                logger.info(f"创建数据表: {create_sql}")
+                self.conn.execute(create_sql)
+                changed = True
+            else:
+                added, removed, needs_rebuild = self._plan(existing)
+                if needs_rebuild:
+                    self._backup_before_rebuild()
+                    self._rebuild_table(existing)
+                    changed = True
+                else:
+                    if removed:
+                        self._backup_before_rebuild()
+                        self._drop_columns(existing, removed)
+                        changed = True
+                    for spec in added:
+                        logger.info(f"新增字段: {spec['name']}")
+                        column_def = self.field_manager.get_column_definition(spec)
+                        if spec['notnull']:
+                            # 已有行的必填列取空串，与重建表时的补值规则相同
+                            column_def += " DEFAULT ''"
+                        self.conn.execute(f'ALTER TABLE {self.TABLE} ADD COLUMN {column_def}')
+                        changed = True
+            changed = self._release_detail_columns(existing) or changed
+
+            # 先补齐影子列再建索引，避免逐行维护索引
+            self._normalize_dates()
+            self._backfill_pinyin()
+            self._backfill_row_hash()
+            self._backfill_derived()
+            changed = self._sync_indexes() or changed
+            changed = self._sync_fulltext() or changed
+            self._sync_journal()
+            self._sync_attachments()
+            self._sync_duplicates()
+            self._sync_mass_edits()
+            self._write_version(version + 1 if changed or version == 0 else version, fingerprint)
+            self.conn.commit()
+        except Exception:
+            # 未完成的结构修改一并撤销，共享连接上不留下打开的事务；下次按 fields.json 重新迁移
+            self.conn.rollback()
+            raise
+        self._enable_incremental_vacuum()
+        if changed:
+            # 更新查询规划器统计信息，使新索引立即生效
+            self.conn.execute("PRAGMA optimize")
+        return changed
+
+    def _enable_incremental_vacuum(self):
+        """将数据库切换为 auto_vacuum=INCREMENTAL（已有的库需 VACUUM 一次才能生效）
+
+        之后空闲页由 Compactor 分步 incremental_vacuum 归还给文件系统，不再需要整库 VACUUM。
+        """
+        if self.conn.execute("PRAGMA auto_vacuum").fetchone()[0] == 2:
+            return
+        logger.info("启用增量空间回收（auto_vacuum=INCREMENTAL），整理数据库文件")
+        self.conn.execute("PRAGMA auto_vacuum=INCREMENTAL")
+        self.conn.execute("VACUUM")
+
+    def _detail_columns(self):
+        """明细表现有的字段列（不含 id）；明细表不存在时返回 None"""
+        if not self.conn.execute(
+            "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?", (DETAIL_TABLE,)
+        ).fetchone():
+            return None
+        return [row[1] for row in self.conn.execute(f"PRAGMA table_info({DETAIL_TABLE})") if row[1] != 'id']
+
+    def _sync_detail_table(self, existing):
+        """维护明细表：补齐明细字段列，并将仍在 personnel 表中的明细字段数据移入"""
+        fields = self.field_manager.get_detail_fields()
+        current = self._detail_columns()
+        if not fields:
+            return False
+        if current is None:
+            column_list = ', '.join(f'"{name}" TEXT' for name in fields)
+            logger.info(f"创建明细表: {column_list}")
+            self.conn.execute(
+                f"CREATE TABLE {DETAIL_TABLE} ("
+                f"id INTEGER PRIMARY KEY REFERENCES {self.TABLE}(id) ON DELETE CASCADE, {column_list})"
+            )
+            current = list(fields)
+        changed = False
+        for name in fields:
+            if name not in current:
+                logger.info(f"明细表新增字段: {name}")
+                self.conn.execute(f'ALTER TABLE {DETAIL_TABLE} ADD COLUMN "{name}" TEXT')
+                changed = True
+            if name in existing:
+                logger.info(f"字段移入明细表: {name}")
+                self.conn.execute(
+                    f'INSERT INTO {DETAIL_TABLE} (id, "{name}") '
+                    f'SELECT id, "{name}" FROM {self.TABLE} WHERE COALESCE("{name}", \'\') != \'\' '
+                    f'ON CONFLICT(id) DO UPDATE SET "{name}" = excluded."{name}"'
+                )
+                changed = True
+        return changed
+
+    def _release_detail_columns(self, existing):
+        """不再声明为明细的字段：数据移回 personnel 表（列已由迁移补齐）后从明细表删除
+
+        existing 为迁移前 personnel 表的列：只有本次新建的列才从明细表取回数据，
+        personnel 表已有该列时以其内容为准，明细表中残留的列直接删除。
+        复制与删除列在同一保存点内完成，删除失败时整个迁移失败，不会留下会被再次复制的旧列。
+        """
+        current = self._detail_columns()
+        if current is None:
+            return False
+        fields = self.field_manager.get_detail_fields()
+        summary_fields = self.field_manager.get_summary_fields()
+        stale = [name for name in current if name not in fields]
+        if not stale:
+            return False
+        restored = [name for name in stale if name in summary_fields and name not in existing]
+        self._backup_before_rebuild()
+        # 明细字段参与全文索引时触发器引用明细表的列，删除列前须先删除（由 _sync_fulltext 重新创建）
+        self._drop_fulltext_triggers()
+        self.conn.execute("SAVEPOINT release_detail")
+        try:
+            self._invalidate_row_hash(DETAIL_TABLE, [name for name in stale if name not in summary_fields])
+            for name in restored:
+                logger.info(f"字段移出明细表: {name}")
+                self.conn.execute(
+                    f'UPDATE {self.TABLE} SET "{name}" = '
+                    f'(SELECT d."{name}" FROM {DETAIL_TABLE} d WHERE d.id = {self.TABLE}.id) '
+                    f'WHERE id IN (SELECT id FROM {DETAIL_TABLE} WHERE "{name}" IS NOT NULL)'
+                )
+            if fields:
+                for name in stale:
+                    logger.info(f"明细表删除字段: {name}")
+                    self.conn.execute(f'ALTER TABLE {DETAIL_TABLE} DROP COLUMN "{name}"')
+            else:
+                logger.info("已无明细字段，删除明细表")
+                self.conn.execute(f"DROP TABLE {DETAIL_TABLE}")
+        except sqlite3.OperationalError:
+            self.conn.execute("ROLLBACK TO release_detail")
+            self.conn.execute("RELEASE release_detail")
+            raise
+        self.conn.execute("RELEASE release_detail")
+        return True
+
+    def _invalidate_row_hash(self, table, columns):
+        """将给出的字段中有内容的记录摘要置空（系统影子列均以下划线开头，不计入摘要）"""
+        fields = [name for name in columns if not name.startswith('_')]
+        if not fields or ROW_HASH_COLUMN not in self._existing_columns():
+            return  # 摘要列尚未创建（将整列补算）
+        condition = ' OR '.join(f"COALESCE({quote_identifier(name)}, '') <> ''" for name in fields)
+        self.conn.execute(
+            f'UPDATE {self.TABLE} SET "{ROW_HASH_COLUMN}" = NULL '
+            f'WHERE id IN (SELECT id FROM {table} WHERE {condition})'
+        )
+
+    def _sync_indexes(self):
+        """按字段配置创建索引，并删除不再声明的索引（仅处理 idx_personnel_/idx_sys_ 前缀）"""
+        declared = dict(self.field_manager.get_index_specs())
+        declared.update(self.field_manager.get_system_index_specs())
+        existing = {}
+        for (name,) in self.conn.execute(
+            "SELECT name FROM sqlite_master WHERE type = 'index' AND tbl_name = ? "
+            "AND (name GLOB 'idx_personnel_*' OR name GLOB 'idx_sys_*')", (self.TABLE,)
+        ).fetchall():
+            existing[name] = [row[2] for row in self.conn.execute(f'PRAGMA index_info("{name}")')]
+
+        changed = False
+        for name, columns in existing.items():
+            if declared.get(name) != columns:
+                logger.info(f"删除索引: {name}")
+                self.conn.execute(f'DROP INDEX IF EXISTS "{name}"')
+                changed = True
+        for name, columns in declared.items():
+            if existing.get(name) != columns:
+                column_list = ', '.join(f'"{col}"' for col in columns)
+                logger.info(f"创建索引: {name} ({column_list})")
+                self.conn.execute(
+                    f'CREATE INDEX IF NOT EXISTS "{name}" ON {self.TABLE} ({column_list})'
+                )
+                changed = True
+        return changed
+
+    def _existing_columns(self):
+        """读取现有列定义 {列名: spec}（不含 id 列）"""
+        # table_xinfo 才会列出生成列（hidden 为 2/3）
+        rows = self.conn.execute(f"PRAGMA table_xinfo({self.TABLE})").fetchall()
+        unique_columns = set()
+        for index in self.conn.execute(f"PRAGMA index_list({self.TABLE})").fetchall():
+            # index_list: seq, name, unique, origin, partial
+            if index[2] and index[3] == 'u':
+                info = self.conn.execute(f'PRAGMA index_info("{index[1]}")').fetchall()
+                if len(info) == 1:
+                    unique_columns.add(info[0][2])
+        return {
+            row[1]: {
+                'name': row[1],
+                'type': (row[2] or '').upper(),
+                'notnull': bool(row[3]),
+                'unique': row[1] in unique_columns,
+                'generated': row[6] in (2, 3),
+            }
+            for row in rows if row[1] != 'id'
+        }
+
+    @staticmethod
+    def _signature(spec):
+        return (spec['type'], spec['notnull'], spec['unique'], bool(spec.get('generated')))
+
+    def _plan(self, existing):
+        """对比字段配置与现有列，返回 (可直接新增的列, 可直接删除的列, 是否需要重建)"""
+        expected = self.field_manager.get_column_specs()
+        expected_names = {spec['name'] for spec in expected}
+        added = []
+        needs_rebuild = False
+
+        removed = set(existing) - expected_names
+        if removed:
+            # DROP COLUMN 需要 SQLite 3.35+，且不能删除带 UNIQUE 约束的列
+            if sqlite3.sqlite_version_info < (3, 35, 0) or any(existing[name]['unique'] for name in removed):
+                logger.warning(f"字段已从配置中移除，将重建数据表: {removed}")
+                needs_rebuild = True
+            else:
+                logger.info(f"字段已从配置中移除，将删除列: {removed}")
+
+        for spec in expected:
+            current = existing.get(spec['name'])
+            if current is None:
+                # ADD COLUMN 不支持 UNIQUE
+                if spec['unique']:
+                    needs_rebuild = True
+                added.append(spec)
+            elif self._signature(current) != self._signature(spec):
+                logger.warning(f"字段定义变化，将重建数据表: {current} -> {spec}")
+                needs_rebuild = True
+        return added, removed, needs_rebuild
+
+    def _drop_columns(self, existing, removed):
+        """用 DROP COLUMN 删除已从配置中移除的列，不重建表
+
+        被删除字段有内容的记录摘要随之失效，先置空（由 _backfill_row_hash 补算）；
+        引用这些列的索引与全文索引同步触发器须先删除（随后由 _sync_indexes、_sync_fulltext
+        按新配置重建）；日期影子列等生成列先于其来源列删除。
+        """
+        self._invalidate_row_hash(self.TABLE, removed)
+        self._drop_fulltext_triggers()
+        for (name,) in self.conn.execute(
+            "SELECT name FROM sqlite_master WHERE type = 'index' AND tbl_name = ? AND sql IS NOT NULL",
+            (self.TABLE,)
+        ).fetchall():
+            if any(row[2] in removed for row in self.conn.execute(f'PRAGMA index_info("{name}")')):
+                logger.info(f"删除索引: {name}")
+                self.conn.execute(f'DROP INDEX "{name}"')
+        for name in sorted(removed, key=lambda column: not existing[column]['generated']):
+            logger.info(f"删除字段: {name}")
+            self.conn.execute(f'ALTER TABLE {self.TABLE} DROP COLUMN {quote_identifier(name)}')
+
+    def _normalize_dates(self):
+        """将日期字段中可识别但格式不规范的文本统一为 YYYY-MM-DD"""
+        for name in self.field_manager.get_date_fields():
+            rows = self.conn.execute(
+                f'SELECT id, "{name}" FROM {self.TABLE} '
+                f'WHERE "_d_{name}" IS NULL AND COALESCE("{name}", \'\') <> \'\''
+            ).fetchall()
+            updates = [
+                (normalize_date(value), row_id) for row_id, value in rows
+                if normalize_date(value) != value
+            ]
+            if updates:
+                self.conn.executemany(
+                    f'UPDATE {self.TABLE} SET "{name}" = ?, "{ROW_HASH_COLUMN}" = NULL WHERE id = ?', updates
+                )
+                logger.info(f"已规范 {len(updates)} 条记录的日期格式: {name}")
+
+    def _backfill_pinyin(self):
+        """为尚未计算拼音影子列的记录补齐拼音"""
+        for name in self.field_manager.get_pinyin_fields():
+            rows = self.conn.execute(
+                f'SELECT id, "{name}" FROM {self.TABLE} '
+                f'WHERE "_py_{name}" IS NULL AND "{name}" IS NOT NULL'
+            ).fetchall()
+            if not rows:
+                continue
+            surname = name == '姓名'
+            self.conn.executemany(
+                f'UPDATE {self.TABLE} SET "_py_{name}" = ?, "_pyi_{name}" = ? WHERE id = ?',
+                [
+                    (pinyin_index.full(value, surname), pinyin_index.initials(value, surname), row_id)
+                    for row_id, value in rows
+                ]
+            )
+            logger.info(f"已补齐 {len(rows)} 条记录的拼音索引: {name}")
+
+    def _backfill_row_hash(self):
+        """补齐记录内容摘要（新增的摘要列，以及删除字段、规范日期时置空的摘要）"""
+        fields = self.field_manager.get_field_names()
+        column_list = ', '.join(self.field_manager.column_ref(name) for name in fields)
+        rows = self.conn.execute(
+            f'SELECT p.id, {column_list} FROM {self.TABLE} p {self.field_manager.get_detail_join()} '
+            f'WHERE p."{ROW_HASH_COLUMN}" IS NULL'
+        ).fetchall()
+        if not rows:
+            return
+        self.conn.executemany(
+            f'UPDATE {self.TABLE} SET "{ROW_HASH_COLUMN}" = ? WHERE id = ?',
+            [(row_hash(dict(zip(fields, row[1:])), fields), row[0]) for row in rows]
+        )
+        logger.info(f"已计算 {len(rows)} 条记录的内容摘要")
+
+    def _backfill_derived(self):
+        """创建周年数滚动更新的状态表，并为尚未计算的记录补齐年龄、工龄、党龄"""
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS derived_rollover ("
+            "id INTEGER PRIMARY KEY CHECK (id = 1), "
+            "rolled_on TEXT NOT NULL)"
+        )
+        today = datetime.now().date()
+        for source in self.field_manager.get_derived_fields().values():
+            rows = self.conn.execute(
+                f'SELECT id, "{source}" FROM {self.TABLE} '
+                f'WHERE "_n_{source}" IS NULL AND "{source}" IS NOT NULL'
+            ).fetchall()
+            updates = [(years_since(value, today), row_id) for row_id, value in rows]
+            updates = [update for update in updates if update[0] is not None]
+            if not updates:
+                continue
+            self.conn.executemany(f'UPDATE {self.TABLE} SET "_n_{source}" = ? WHERE id = ?', updates)
+            logger.info(f"已计算 {len(updates)} 条记录的周年数: {source}")
+
+    def _sync_fulltext(self):
+        """维护 personnel_fts 全文索引表（trigram 分词，支持中文子串检索）
+
+        表结构与配置不一致时重建并回填；同步触发器每次迁移都重新创建，
+        因为重建 personnel 表会一并删除其上的触发器。
+        """
+        columns = self.field_manager.get_fulltext_fields()
+        current = [row[1] for row in self.conn.execute("PRAGMA table_info(personnel_fts)")]
+        self._drop_fulltext_triggers()
+
+        if not columns or not fulltext_supported(self.conn):
+            if current:
+                logger.info("全文检索已停用，删除 personnel_fts")
+                self.conn.execute("DROP TABLE personnel_fts")
+            return bool(current)
+
+        changed = False
+        column_list = ', '.join(f'"{col}"' for col in columns)
+        # 明细字段的内容取自明细表，索引行由两表连接得到
+        fill_sql = (
+            f"INSERT INTO personnel_fts (rowid, {column_list}) "
+            f"SELECT p.id, {', '.join(self.field_manager.column_ref(col) for col in columns)} "
+            f"FROM {self.TABLE} p {self.field_manager.get_detail_join()}"
+        )
+        if current != columns:
+            logger.info(f"重建全文索引: {column_list}")
+            self.conn.execute("DROP TABLE IF EXISTS personnel_fts")
+            self.conn.execute(
+                f"CREATE VIRTUAL TABLE personnel_fts USING fts5({column_list}, tokenize='trigram')"
+            )
+            self.conn.execute(fill_sql)
+            changed = True
+
+        detail_fields = self.field_manager.get_detail_fields()
+        if any(col in detail_fields for col in columns):
+            self._create_joined_fulltext_triggers(columns, fill_sql)
+            return changed
+
+        new_values = ', '.join(f'new."{col}"' for col in columns)
+        self.conn.execute(
+            f"CREATE TRIGGER personnel_fts_ai AFTER INSERT ON {self.TABLE} BEGIN "
+            f"INSERT INTO personnel_fts (rowid, {column_list}) VALUES (new.id, {new_values}); END"
+        )
+        self.conn.execute(
+            f"CREATE TRIGGER personnel_fts_ad AFTER DELETE ON {self.TABLE} BEGIN "
+            f"DELETE FROM personnel_fts WHERE rowid = old.id; END"
+        )
+        self.conn.execute(
+            f"CREATE TRIGGER personnel_fts_au AFTER UPDATE OF {column_list} ON {self.TABLE} BEGIN "
+            f"DELETE FROM personnel_fts WHERE rowid = old.id; "
+            f"INSERT INTO personnel_fts (rowid, {column_list}) VALUES (new.id, {new_values}); END"
+        )
+        return changed
+
+    def _drop_fulltext_triggers(self):
+        for suffix in ('ai', 'ad', 'au'):
+            self.conn.execute(f"DROP TRIGGER IF EXISTS personnel_fts_{suffix}")
+        for suffix in ('ai', 'au'):
+            self.conn.execute(f"DROP TRIGGER IF EXISTS {DETAIL_TABLE}_fts_{suffix}")
+
+    def _create_joined_fulltext_triggers(self, columns, fill_sql):
+        """全文索引包含明细字段时的同步触发器：任一表变化都按连接结果重写该人员的索引行"""
+        summary_columns = [col for col in columns if col not in self.field_manager.get_detail_fields()]
+        refresh = (
+            "DELETE FROM personnel_fts WHERE rowid = new.id; "
+            f"{fill_sql} WHERE p.id = new.id; END"
+        )
+        self.conn.execute(
+            f"CREATE TRIGGER personnel_fts_ai AFTER INSERT ON {self.TABLE} BEGIN "
+            f"{fill_sql} WHERE p.id = new.id; END"
+        )
+        self.conn.execute(
+            f"CREATE TRIGGER personnel_fts_ad AFTER DELETE ON {self.TABLE} BEGIN "
+            f"DELETE FROM personnel_fts WHERE rowid = old.id; END"
+        )
+        if summary_columns:
+            summary_list = ', '.join(f'"{col}"' for col in summary_columns)
+            self.conn.execute(
+                f"CREATE TRIGGER personnel_fts_au AFTER UPDATE OF {summary_list} ON {self.TABLE} "
+                f"BEGIN {refresh}"
+            )
+        self.conn.execute(f"CREATE TRIGGER {DETAIL_TABLE}_fts_ai AFTER INSERT ON {DETAIL_TABLE} BEGIN {refresh}")
+        self.conn.execute(f"CREATE TRIGGER {DETAIL_TABLE}_fts_au AFTER UPDATE ON {DETAIL_TABLE} BEGIN {refresh}")
+
+    def _sync_journal(self):
+        """维护 personnel_changes 变更日志及其触发器（记录变化的行 id 与操作类型，供界面增量刷新）
+
+        与全文索引触发器相同，每次迁移都重新创建，因为重建表会删除原表上的触发器。
+        """
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS personnel_changes ("
+            "seq INTEGER PRIMARY KEY AUTOINCREMENT, "
+            "table_name TEXT NOT NULL, "
+            "row_id INTEGER NOT NULL, "
+            "op TEXT NOT NULL, "
+            "changed_at TEXT NOT NULL DEFAULT (strftime('%Y-%m-%d %H:%M:%f', 'now', 'localtime')))"
+        )
+        for suffix, event, ref, op in (
+            ('ai', 'INSERT', 'new', 'I'), ('au', 'UPDATE', 'new', 'U'), ('ad', 'DELETE', 'old', 'D')
+        ):
+            self.conn.execute(f"DROP TRIGGER IF EXISTS personnel_journal_{suffix}")
+            self.conn.execute(
+                f"CREATE TRIGGER personnel_journal_{suffix} AFTER {event} ON {self.TABLE} BEGIN "
+                f"INSERT INTO personnel_changes (table_name, row_id, op) "
+                f"VALUES ('{self.TABLE}', {ref}.id, '{op}'); END"
+            )
+
+    def _sync_attachments(self):
+        """电子档案附件表：人员与附件库中文件（SHA-256）的对应关系，同一人员同一文件只记录一次"""
+        self.conn.execute(
+            f"CREATE TABLE IF NOT EXISTS {ATTACHMENT_TABLE} ("
+            "id INTEGER PRIMARY KEY, "
+            f"person_id INTEGER NOT NULL REFERENCES {self.TABLE}(id) ON DELETE CASCADE, "
+            "sha256 TEXT NOT NULL, "
+            "file_name TEXT NOT NULL, "
+            "size INTEGER NOT NULL, "
+            "added_at TEXT NOT NULL DEFAULT (strftime('%Y-%m-%d %H:%M:%S', 'now', 'localtime')), "
+            "UNIQUE (person_id, sha256))"
+        )
+        self.conn.execute(
+            f"CREATE INDEX IF NOT EXISTS idx_attachments_sha256 ON {ATTACHMENT_TABLE} (sha256)"
+        )
+
+    def _sync_duplicates(self):
+        """查重时用户确认“不是重复”的人员对（按记录 id，较小者在前），再次查重时不再列出"""
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS duplicate_dismissed ("
+            "id_a INTEGER NOT NULL, "
+            "id_b INTEGER NOT NULL, "
+            "dismissed_at TEXT NOT NULL DEFAULT (strftime('%Y-%m-%d %H:%M:%S', 'now', 'localtime')), "
+            "PRIMARY KEY (id_a, id_b))"
+        )
+
+    def _sync_mass_edits(self):
+        """批量修改日志：每批一行（修改的字段、日志中保存的列），每条记录保存修改前后的值供撤销"""
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS mass_edits ("
+            "id INTEGER PRIMARY KEY, "
+            "created_at TEXT NOT NULL DEFAULT (strftime('%Y-%m-%d %H:%M:%S', 'now', 'localtime')), "
+            "description TEXT NOT NULL, "
+            "fields TEXT NOT NULL, "
+            "columns TEXT NOT NULL, "
+            "row_count INTEGER NOT NULL, "
+            "undone_at TEXT)"
+        )
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS mass_edit_rows ("
+            "edit_id INTEGER NOT NULL REFERENCES mass_edits(id) ON DELETE CASCADE, "
+            "row_id INTEGER NOT NULL, "
+            "old_values TEXT NOT NULL, "
+            "new_values TEXT, "
+            "PRIMARY KEY (edit_id, row_id)) WITHOUT ROWID"
+        )
+
+    def _rebuild_table(self, existing):
+        """在单个事务内按新定义重建表，保留 id 与共有字段的数据"""
+        temp_table = f"{self.TABLE}_migrating"
+        copy_columns = ['id']
+        select_exprs = ['id']
+        for spec in self.field_manager.get_column_specs():
+            if spec.get('generated'):
+                continue
+            if spec['name'] not in existing:
+                if spec['notnull'] and spec['unique']:
+                    raise ValueError(f"无法为已有数据新增必填且唯一的字段: {spec['name']}")
+                if spec['notnull']:
+                    copy_columns.append(f'"{spec["name"]}"')
+                    select_exprs.append("''")
+                continue
+            copy_columns.append(f'"{spec["name"]}"')
+            if spec['notnull']:
+                select_exprs.append(f"""COALESCE("{spec['name']}", '')""")
+            else:
+                select_exprs.append(f'"{spec["name"]}"')
+
+        self.conn.commit()
+        self.conn.execute("PRAGMA foreign_keys=OFF")
+        try:
+            self.conn.execute("BEGIN IMMEDIATE")
+            try:
+                # 明细表上的全文索引触发器引用 personnel，须先删除，否则改名时重新解析触发器失败；
+                # 迁移末尾由 _sync_fulltext 重新创建
+                self._drop_fulltext_triggers()
+                self.conn.execute(f"DROP TABLE IF EXISTS {temp_table}")
+                self.conn.execute(self.field_manager.get_create_table_sql(temp_table))
+                self.conn.execute(
+                    f"INSERT INTO {temp_table} ({', '.join(copy_columns)}) "
+                    f"SELECT {', '.join(select_exprs)} FROM {self.TABLE}"
+                )
+                self.conn.execute(f"DROP TABLE {self.TABLE}")
+                self.conn.execute(f"ALTER TABLE {temp_table} RENAME TO {self.TABLE}")
+                self.conn.commit()
+            except Exception:
+                self.conn.rollback()
+                raise
+        finally:
+            self.conn.execute("PRAGMA foreign_keys=ON")
+        logger.info("数据表重建完成")
+
+    def _backup_before_rebuild(self):
+        """重建表前创建快照（自上次备份后未变化时跳过）"""
+        if not self.db_path or not os.path.exists(self.db_path):
+            return
+        BackupStore().snapshot(self.db_path, reason='rebuild')
+
+    def _write_version(self, version, fingerprint):
+        self.conn.execute(
+            "INSERT INTO schema_version (id, version, fingerprint, updated_at) "
+            "VALUES (1, ?, ?, ?) "
+            "ON CONFLICT(id) DO UPDATE SET version = excluded.version, "
+            "fingerprint = excluded.fingerprint, updated_at = excluded.updated_at",
+            (version, fingerprint, datetime.now().strftime('%Y-%m-%d %H:%M:%S'))
+        )
+        logger.info(f"数据库结构版本: {version}")
+
+
+# --------------------------- 数据访问层 ---------------------------
+class PersonnelRepository:
+    """人员数据访问层
+
+    personnel 表的读写统一经由此类执行，复用 DBManager 的线程连接，
+    不再在每次调用时重新建立连接和设置 PRAGMA。传入 conn 时固定使用该连接
+    （如 DBManager.read_snapshot 的快照连接）。
+    """
+
+    def __init__(self, db_path=None, conn=None):
+        self.db = DBManager(db_path)
+        self._conn = conn
+
+    @property
+    def conn(self):
+        return self._conn or self.db.get_connection()
+
+    def query(self, sql, params=()):
+        """执行查询，返回元组列表"""
+        return self.conn.execute(sql, params).fetchall()
+
+    def query_dicts(self, sql, params=()):
+        """执行查询，返回字典列表"""
+        cursor = self.conn.cursor()
+        cursor.row_factory = sqlite3.Row
+        cursor.execute(sql, params)
+        return [dict(row) for row in cursor.fetchall()]
+
+    @staticmethod
+    def prepare_values(data, date_fields=None, pinyin_fields=None, hash_fields=None):
+        """写入前的统一处理：规范日期格式，计算周年数、拼音影子列与内容摘要
+
+        批量导入时由调用方传入预先取得的字段列表，避免逐行查询字段配置。
+        只更新部分字段时无法得到完整摘要，置为 NULL（下次迁移时补算）。
+        """
+        statements = field_manager.statements
+        values = dict(data)
+        for name in date_fields if date_fields is not None else statements.date_fields:
+            if name in values:
+                values[name] = normalize_date(values[name])
+        if statements.derived_fields:
+            today = datetime.now().date()
+            for _, source in statements.derived_fields:
+                if source in values:
+                    values[f'_n_{source}'] = years_since(values[source], today)
+        values.update(pinyin_index.shadow_values(values, pinyin_fields))
+        hash_fields = hash_fields if hash_fields is not None else statements.field_names
+        if all(name in values for name in hash_fields):
+            values[ROW_HASH_COLUMN] = row_hash(values, hash_fields)
+        else:
+            values[ROW_HASH_COLUMN] = None
+        return values
+
+    @staticmethod
+    def split_detail(values, detail_fields=None):
+        """将写入值拆分为 (personnel 表的列, 明细表的列)"""
+        detail_fields = detail_fields if detail_fields is not None else field_manager.statements.detail_fields
+        values = dict(values)
+        detail = {name: values.pop(name) for name in detail_fields if name in values}
+        return values, detail
+
+    @staticmethod
+    def detail_upsert_sql(columns):
+        """写入明细表的语句，参数为 (id, 各明细列...)；已有明细行时覆盖给出的列"""
+        return field_manager.statements.detail_upsert_sql(columns)
+
+    def _write_detail(self, conn, row_id, detail, skip_empty=False):
+        """写入一条记录的明细字段（空值存为 NULL）；skip_empty 时全部为空则不建明细行"""
+        values = [value if value not in (None, '') else None for value in detail.values()]
+        if not detail or (skip_empty and not any(values)):
+            return
+        conn.execute(self.detail_upsert_sql(list(detail)), [row_id] + values)
+
+    @staticmethod
+    def _purge_conflicting(conn, values):
+        """彻底删除与待写入的唯一字段值相同的已删除记录（重新录入同一人员时取代回收站中的旧记录）"""
+        for name in field_manager.statements.unique_fields:
+            if values.get(name) not in (None, ''):
+                conn.execute(
+                    f'DELETE FROM personnel WHERE "{DELETED_COLUMN}" IS NOT NULL AND {quote_identifier(name)} = ?',
+                    (values[name],)
+                )
+
+    def insert(self, data):
+        """新增一条记录，返回新记录的 id"""
+        statements = field_manager.statements
+        values, detail = self.split_detail(
+            self.prepare_values({field: data.get(field, '') for field in statements.field_names})
+        )
+        with self.conn as conn:
+            self._purge_conflicting(conn, values)
+            row_id = conn.execute(statements.insert_sql, statements.insert_params(values)).lastrowid
+            self._write_detail(conn, row_id, detail, skip_empty=True)
+        return row_id
+
+    def update(self, original_id, data):
+        """按原身份证号更新记录，返回受影响行数"""
+        data, detail = self.split_detail(self.prepare_values(data))
+        with self.conn as conn:
+            self._purge_conflicting(conn, data)
+            target = conn.execute(
+                f'SELECT id FROM personnel WHERE 身份证号 = ? AND "{DELETED_COLUMN}" IS NULL', (original_id,)
+            ).fetchone() if detail else None
+            cursor = conn.execute(
+                field_manager.statements.update_sql(data), list(data.values()) + [original_id]
+            )
+            if target:
+                self._write_detail(conn, target[0], detail)
+        return cursor.rowcount
+
+    def delete(self, ids):
+        """按身份证号批量删除（移入回收站，只写删除时间），返回受影响行数"""
+        placeholders = ','.join(['?'] * len(ids))
+        with self.conn as conn:
+            cursor = conn.execute(
+                f"UPDATE personnel SET \"{DELETED_COLUMN}\" = strftime('%Y-%m-%d %H:%M:%S', 'now', 'localtime') "
+                f"WHERE 身份证号 IN ({placeholders}) AND \"{DELETED_COLUMN}\" IS NULL",
+                list(ids)
+            )
+        return cursor.rowcount
+
+    def restore(self, row_ids):
+        """从回收站恢复记录（按记录 id），返回恢复的行数"""
+        placeholders = ','.join(['?'] * len(row_ids))
+        with self.conn as conn:
+            cursor = conn.execute(
+                f'UPDATE personnel SET "{DELETED_COLUMN}" = NULL '
+                f'WHERE id IN ({placeholders}) AND "{DELETED_COLUMN}" IS NOT NULL',
+                list(row_ids)
+            )
+        return cursor.rowcount
+
+    def purge(self, row_ids=None):
+        """彻底删除回收站中的记录（row_ids 为 None 时清空回收站），明细与附件关联随之级联删除"""
+        query = f'DELETE FROM personnel WHERE "{DELETED_COLUMN}" IS NOT NULL'
+        params = []
+        if row_ids is not None:
+            query += f" AND id IN ({','.join(['?'] * len(row_ids))})"
+            params = list(row_ids)
+        with self.conn as conn:
+            cursor = conn.execute(query, params)
+        return cursor.rowcount
+
+    def merge(self, keep_id, drop_id):
+        """合并重复人员（按记录 id），返回补齐的字段名
+
+        保留记录中为空的字段用另一条记录的值补齐（唯一字段除外），电子档案附件关联转到
+        保留记录，另一条记录移入回收站，误合并时可从回收站恢复。
+        """
+        statements = field_manager.statements
+        keep = self.fetch_record(keep_id)
+        drop = self.fetch_record(drop_id)
+        if keep is None or drop is None:
+            raise ValueError("要合并的记录不存在或已删除")
+        filled = {
+            name: drop[name] for name in statements.field_names
+            if name not in statements.unique_fields
+            and keep.get(name) in (None, '') and drop.get(name) not in (None, '')
+        }
+        data, detail = self.split_detail(self.prepare_values(filled))
+        with self.conn as conn:
+            if data:
+                conn.execute(statements.update_sql(data), list(data.values()) + [keep[UPSERT_KEY_FIELD]])
+            self._write_detail(conn, keep_id, detail)
+            conn.execute(
+                f"UPDATE OR IGNORE {ATTACHMENT_TABLE} SET person_id = ? WHERE person_id = ?", (keep_id, drop_id)
+            )
+            conn.execute(
+                f"UPDATE personnel SET \"{DELETED_COLUMN}\" = strftime('%Y-%m-%d %H:%M:%S', 'now', 'localtime') "
+                f"WHERE id = ? AND \"{DELETED_COLUMN}\" IS NULL",
+                (drop_id,)
+            )
+        return list(filled)
+
+    def dismiss_duplicate(self, id_a, id_b):
+        """记录一对人员不是重复，之后查重不再列出"""
+        with self.conn as conn:
+            conn.execute(
+                "INSERT OR IGNORE INTO duplicate_dismissed (id_a, id_b) VALUES (?, ?)",
+                (min(id_a, id_b), max(id_a, id_b))
+            )
+
+    # ---------- 批量修改 ----------
+    @staticmethod
+    def _json_object_sql(columns, prefix=''):
+        """按列生成 json_object(...) 表达式（键为列名），用于保存与比对一组列的值"""
+        return 'json_object(' + ', '.join(
+            "'" + name.replace("'", "''") + "', " + prefix + quote_identifier(name) for name in columns
+        ) + ')'
+
+    @staticmethod
+    def _mass_edit_plan(changes):
+        """解析批量修改，返回 [(字段, 新值表达式, 参数, [(影子列, 表达式, 参数), ...]), ...]
+
+        changes 为 [(字段, 'set', 新值) | (字段, 'replace', 查找文本, 替换为)]，表达式中的 {col}
+        代表该字段的列引用。设为同一值时拼音、周年数影子列在此算好一次；替换文本时各行结果不同，
+        拼音影子列由注册到连接上的 pinyin_full/pinyin_initials 在 UPDATE 中逐行计算。
+        """
+        statements = field_manager.statements
+        editable = field_manager.get_mass_editable_fields()
+        derived_sources = {source for _, source in statements.derived_fields}
+        today = datetime.now().date()
+        plan = []
+        for field, op, *args in changes:
+            if field not in editable:
+                raise ValueError(f"字段不能批量修改: {field}")
+            if any(item[0] == field for item in plan):
+                raise ValueError(f"字段重复: {field}")
+            if op == 'set':
+                value = args[0]
+                if field in statements.date_fields:
+                    value = normalize_date(value)
+                if not value and field in statements.required_fields:
+                    raise ValueError(f"必填字段不能设为空: {field}")
+                shadows = [
+                    (name, '?', [shadow]) for name, shadow in
+                    pinyin_index.shadow_values({field: value}, statements.pinyin_fields).items()
+                ]
+                if field in derived_sources:
+                    shadows.append((f'_n_{field}', '?', [years_since(value, today)]))
+                plan.append((field, '?', [value], shadows))
+            elif op == 'replace':
+                find, replacement = args
+                if field in statements.date_fields:
+                    raise ValueError(f"日期字段只能整体设为新值: {field}")
+                if not find:
+                    raise ValueError(f"请填写要替换的文本: {field}")
+                expr, params = 'REPLACE({col}, ?, ?)', [find, replacement]
+                shadows = []
+                if field in statements.pinyin_fields:
+                    full_column, initials_column = pinyin_index.shadow_values({field: ''}, [field])
+                    surname = int(field == '姓名')
+                    shadows = [
+                        (full_column, f'pinyin_full({expr}, {surname})', params),
+                        (initials_column, f'pinyin_initials({expr}, {surname})', params),
+                    ]
+                plan.append((field, expr, params, shadows))
+            else:
+                raise ValueError(f"未知的批量修改操作: {op}")
+        if not plan:
+            raise ValueError("请至少填写一项修改")
+        return plan
+
+    def _mass_edit_targets(self, plan, keyword=None, ids=None):
+        """确有变化的目标记录查询 (SQL, 参数)；ids 为选中的身份证号，否则按检索关键字"""
+        source, conditions, params, _ = self._build_filter(keyword, ids)
+        changed = []
+        for field, expr, expr_params, _ in plan:
+            column = f'p.{quote_identifier(field)}'
+            changed.append(f"COALESCE({expr.replace('{col}', column)}, '') <> COALESCE({column}, '')")
+            params.extend(expr_params)
+        query = f"SELECT p.id FROM {source} WHERE {' AND '.join(conditions)} AND ({' OR '.join(changed)})"
+        return query, params
+
+    def count_mass_update(self, changes, keyword=None, ids=None):
+        """批量修改将实际改变的记录数（预览）"""
+        query, params = self._mass_edit_targets(self._mass_edit_plan(changes), keyword, ids)
+        return self.query(f"SELECT COUNT(*) FROM ({query})", params)[0][0]
+
+    def mass_update(self, changes, description, keyword=None, ids=None):
+        """批量修改：在一个事务内以一条基于集合的 UPDATE 修改全部目标记录，并记入可撤销的日志
+
+        目标记录 id 只解析一次，以 JSON 数组作为单个参数经 json_each 展开（不受参数个数限制）。
+        返回 (批次号, 修改的记录 id 列表, 变更日志序号范围)；没有需要修改的记录时返回 None。
+        """
+        plan = self._mass_edit_plan(changes)
+        query, params = self._mass_edit_targets(plan, keyword, ids)
+        fields = [field for field, *_ in plan]
+        assignments, assign_params, columns = [], [], list(fields)
+        for field, expr, expr_params, shadows in plan:
+            column = quote_identifier(field)
+            for name, value_expr, value_params in [(field, expr, expr_params)] + shadows:
+                assignments.append(f"{quote_identifier(name)} = {value_expr.replace('{col}', column)}")
+                assign_params.extend(value_params)
+            columns.extend(name for name, *_ in shadows)
+        # 内容摘要置为 NULL（与部分更新相同），覆盖导入时按有变化处理并重新写入
+        assignments.append(f'{quote_identifier(ROW_HASH_COLUMN)} = NULL')
+        targets = "id IN (SELECT value FROM json_each(?))"
+        conn = self.conn
+        conn.create_function('pinyin_full', 2, lambda text, surname: pinyin_index.full(text, bool(surname)),
+                             deterministic=True)
+        conn.create_function('pinyin_initials', 2, lambda text, surname: pinyin_index.initials(text, bool(surname)),
+                             deterministic=True)
+        with conn:
+            row_ids = [row[0] for row in conn.execute(query, params).fetchall()]
+            if not row_ids:
+                return None
+            target_ids = json.dumps(row_ids)
+            edit_id = conn.execute(
+                "INSERT INTO mass_edits (description, fields, columns, row_count) VALUES (?, ?, ?, ?)",
+                (description, json.dumps(fields, ensure_ascii=False), json.dumps(columns, ensure_ascii=False),
+                 len(row_ids))
+            ).lastrowid
+            conn.execute(
+                f"INSERT INTO mass_edit_rows (edit_id, row_id, old_values) "
+                f"SELECT ?, id, {self._json_object_sql(columns)} FROM personnel WHERE {targets}",
+                (edit_id, target_ids)
+            )
+            first_seq = conn.execute("SELECT COALESCE(MAX(seq), 0) FROM personnel_changes").fetchone()[0] + 1
+            conn.execute(
+                f"UPDATE personnel SET {', '.join(assignments)} WHERE {targets}",
+                assign_params + [target_ids]
+            )
+            last_seq = conn.execute("SELECT COALESCE(MAX(seq), 0) FROM personnel_changes").fetchone()[0]
+            conn.execute(
+                f"UPDATE mass_edit_rows SET new_values = (SELECT {self._json_object_sql(fields)} "
+                f"FROM personnel WHERE personnel.id = mass_edit_rows.row_id) WHERE edit_id = ?",
+                (edit_id,)
+            )
+            conn.execute(
+                "DELETE FROM mass_edits WHERE id <= (SELECT id FROM mass_edits ORDER BY id DESC LIMIT 1 OFFSET ?)",
+                (MASS_EDIT_HISTORY,)
+            )
+        logger.info(f"批量修改 {len(row_ids)} 条记录: {description}")
+        return edit_id, row_ids, (first_seq, last_seq)
+
+    def mass_edit_history(self):
+        """最近的批量修改 [(批次号, 时间, 说明, 记录数, 撤销时间)]，最近的在前"""
+        return self.query(
+            "SELECT id, created_at, description, row_count, undone_at FROM mass_edits ORDER BY id DESC"
+        )
+
+    def undo_mass_edit(self, edit_id):
+        """撤销一批批量修改：恢复修改前的值（含影子列），内容摘要置为 NULL
+
+        之后又被修改过的记录（修改的字段与该批写入的值不再相同）不恢复。
+        返回 (恢复的记录 id 列表, 未恢复的记录数, 变更日志序号范围)。
+        """
+        conn = self.conn
+        with conn:
+            edit = conn.execute(
+                "SELECT fields, columns, row_count, undone_at FROM mass_edits WHERE id = ?", (edit_id,)
+            ).fetchone()
+            if edit is None:
+                raise ValueError("批量修改记录不存在")
+            if edit[3]:
+                raise ValueError(f"该批修改已于 {edit[3]} 撤销")
+            fields, columns = json.loads(edit[0]), json.loads(edit[1])
+            # 记录的其他字段可能在批量修改后变化过，修改前的摘要已不可信（早期批次的日志含摘要列）
+            columns = [name for name in columns if name != ROW_HASH_COLUMN]
+            existing = {row[1] for row in conn.execute("PRAGMA table_info(personnel)")}
+            if not set(columns) <= existing:
+                raise ValueError("字段配置已变化，无法撤销该批修改")
+            row_ids = [row[0] for row in conn.execute(
+                f"SELECT r.row_id FROM mass_edit_rows r JOIN personnel p ON p.id = r.row_id "
+                f"WHERE r.edit_id = ? AND r.new_values = {self._json_object_sql(fields, 'p.')}",
+                (edit_id,)
+            ).fetchall()]
+            first_seq = conn.execute("SELECT COALESCE(MAX(seq), 0) FROM personnel_changes").fetchone()[0] + 1
+            if row_ids:
+                extracts = ', '.join(
+                    "json_extract(r.old_values, '$.\"" + name.replace("'", "''") + "\"')" for name in columns
+                )
+                conn.execute(
+                    f"UPDATE personnel SET {quote_identifier(ROW_HASH_COLUMN)} = NULL, "
+                    f"({', '.join(map(quote_identifier, columns))}) = "
+                    f"(SELECT {extracts} FROM mass_edit_rows r WHERE r.edit_id = ? AND r.row_id = personnel.id) "
+                    f"WHERE id IN (SELECT value FROM json_each(?))",
+                    (edit_id, json.dumps(row_ids))
+                )
+            last_seq = conn.execute("SELECT COALESCE(MAX(seq), 0) FROM personnel_changes").fetchone()[0]
+            conn.execute(
+                "UPDATE mass_edits SET undone_at = strftime('%Y-%m-%d %H:%M:%S', 'now', 'localtime') WHERE id = ?",
+                (edit_id,)
+            )
+        logger.info(f"撤销批量修改 {edit_id}: 恢复 {len(row_ids)} 条，未恢复 {edit[2] - len(row_ids)} 条")
+        return row_ids, edit[2] - len(row_ids), (first_seq, last_seq)
+
+    def fetch_deleted(self, columns):
+        """回收站中的记录 [(id, 删除时间, 各列...)]，最近删除的在前"""
+        column_list = ', '.join(quote_identifier(name) for name in columns)
+        return self.query(
+            f'SELECT id, "{DELETED_COLUMN}", {column_list} FROM personnel '
+            f'WHERE "{DELETED_COLUMN}" IS NOT NULL ORDER BY "{DELETED_COLUMN}" DESC, id DESC'
+        )
+
+    def fetch_rows(self, columns=None, order_by=None):
+        """按列顺序获取全部记录
+
+        order_by 为 [(字段名, 'ASC'|'DESC'), ...]
+        """
+        columns = columns or field_manager.get_field_names()
+        return [row for page in self.iter_pages(columns, order_by=order_by) for row in page]
+
+    def fetch_record(self, row_id):
+        """按记录 id 读取一条完整记录（含明细字段），不存在时返回 None"""
+        fields = field_manager.get_field_names()
+        rows, _ = self.fetch_page(fields, row_ids=[row_id], limit=1)
+        return dict(zip(fields, rows[0])) if rows else None
+
+    def fetch_by_ids(self, ids, order_by=None):
+        """根据身份证号列表获取人员数据（按需分页读取的字典记录集）"""
+        if not ids:
+            return []
+        return PersonnelRecords(self, ids=ids, order_by=[(order_by, 'ASC')] if order_by else None)
+
+    def fetch_page(self, columns, keyword=None, order_by=None, after=None, limit=PAGE_SIZE, ids=None,
+                   row_ids=None, until=None):
+        """键集分页读取一页，返回 (rows, cursor)
+
+        按 (排序键..., id) 排序，after 为上一页返回的 cursor，
+        翻页条件直接落在索引上，不使用 OFFSET；cursor 为 None 表示已无后续数据。
+        keyword 与 search 的检索语法相同，ids 为身份证号过滤，row_ids 为记录 id 过滤。
+        until 只保留不晚于该 cursor 的行（即已加载页范围内的行），用于增量刷新。
+        """
+        source, conditions, params, ranked = self._build_filter(keyword, ids, row_ids)
+        keys = [(f'p.{quote_identifier(field_manager.get_sort_column(col))}', direction)
+                for col, direction in (order_by or [])]
+        if not keys and ranked:
+            keys = [("personnel_fts.rank", 'ASC')]
+        # id 作为最后一个排序键保证顺序唯一，方向随前一个键以便使用行值比较
+        keys.append(("p.id", keys[-1][1] if keys else 'ASC'))
+
+        if after is not None:
+            condition, cursor_params = self._keyset_condition(keys, after)
+            conditions.append(condition)
+            params.extend(cursor_params)
+        if until is not None:
+            # 比较结果为 NULL（排序键为空）的行在升序中位于游标之前
+            condition, cursor_params = self._keyset_condition(keys, until)
+            conditions.append(f"NOT COALESCE({condition}, 0)")
+            params.extend(cursor_params)
+
+        # 明细字段只在调用方需要时才连接明细表读取（主表格只取摘要列）
+        statements = field_manager.statements
+        if any(col in statements.detail_fields for col in columns):
+            source += " " + statements.detail_join
+        column_list = ', '.join([statements.select_list(columns)] + [expr for expr, _ in keys])
+        query = f"SELECT {column_list} FROM {source}"
+        if conditions:
+            query += " WHERE " + " AND ".join(conditions)
+        query += " ORDER BY " + ", ".join(f"{expr} {direction}" for expr, direction in keys)
+        query += " LIMIT ?"
+        logger.debug(f"分页查询: {query}")
+        rows = self.query(query, params + [limit])
+
+        width = len(columns)
+        cursor = tuple(rows[-1][width:]) if len(rows) == limit else None
+        return [row[:width] for row in rows], cursor
+
+    def iter_pages(self, columns, keyword=None, order_by=None, ids=None, page_size=PAGE_SIZE):
+        """逐页读取全部匹配记录，内存占用与总行数无关"""
+        cursor = None
+        while True:
+            rows, cursor = self.fetch_page(columns, keyword, order_by, cursor, page_size, ids)
+            if rows:
+                yield rows
+            if cursor is None:
+                break
+
+    def iter_records(self, keyword=None, order_by=None, ids=None, page_size=PAGE_SIZE):
+        """逐条产出字典记录（含 id、全部用户字段与周年数字段，供套打填充）"""
+        columns = ['id'] + field_manager.get_template_field_names()
+        for rows in self.iter_pages(columns, keyword, order_by, ids, page_size):
+            for row in rows:
+                yield dict(zip(columns, row))
+
+    def count(self, keyword=None, ids=None):
+        """匹配记录数"""
+        source, conditions, params, _ = self._build_filter(keyword, ids)
+        query = f"SELECT COUNT(*) FROM {source}"
+        if conditions:
+            query += " WHERE " + " AND ".join(conditions)
+        return self.query(query, params)[0][0]
+
+    @staticmethod
+    def _keyset_condition(keys, cursor):
+        """位于 cursor 之后的行的条件
+
+        SQLite 中 NULL 排在升序最前、降序最后。游标不含 NULL 时，全升序使用行值比较
+        (a, b, id) > (?, ?, ?)；单键降序使用 (a, id) < (?, ?) 并补上排在末尾的 NULL，
+        均可直接走索引区间。其余情况展开为逐键的 OR 形式。
+        """
+        directions = [direction for _, direction in keys]
+        exprs = ', '.join(expr for expr, _ in keys)
+        placeholders = ', '.join(['?'] * len(keys))
+        if None not in cursor and set(directions) == {'ASC'}:
+            return f"({exprs}) > ({placeholders})", list(cursor)
+        if None not in cursor and len(keys) == 2 and set(directions) == {'DESC'}:
+            return f"(({exprs}) < ({placeholders}) OR {keys[0][0]} IS NULL)", list(cursor)
+
+        alternatives = []
+        params = []
+        for i, (expr, direction) in enumerate(keys):
+            parts = [f"{prev} IS ?" for prev, _ in keys[:i]]
+            part_params = list(cursor[:i])
+            value = cursor[i]
+            if direction == 'ASC':
+                if value is None:
+                    parts.append(f"{expr} IS NOT NULL")
+                else:
+                    parts.append(f"{expr} > ?")
+                    part_params.append(value)
+            else:
+                if value is None:
+                    continue  # 降序时 NULL 已在末尾，该键上不存在更靠后的值
+                parts.append(f"({expr} < ? OR {expr} IS NULL)")
+                part_params.append(value)
+            alternatives.append("(" + " AND ".join(parts) + ")")
+            params.extend(part_params)
+        return "(" + (" OR ".join(alternatives) or "0") + ")", params
+
+    def date_range_condition(self, field, start=None, end=None, alias='p'):
+        """日期区间条件（闭区间，使用整数天数列上的索引）
+
+        start/end 可只写年份或年月，如 date_range_condition('出生日期', '1970', '1979')。
+        """
+        if field not in field_manager.get_date_fields():
+            raise ValueError(f"{field} 不是日期字段")
+        column = f'{alias}."_d_{field}"'
+        conditions = []
+        params = []
+        for bound, upper, op in ((start, False, '>='), (end, True, '<=')):
+            if bound in (None, ''):
+                continue
+            days = date_to_days(bound, upper=upper)
+            if days is None:
+                raise ValueError(f"无法识别的日期: {bound}")
+            conditions.append(f"{column} {op} ?")
+            params.append(days)
+        return " AND ".join(conditions) or "1", params
+
+    def has_fulltext(self):
+        """全文索引表是否存在"""
+        return bool(self.query(
+            "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'personnel_fts'"
+        ))
+
+    def search(self, keyword, columns):
+        """关键字检索（空格分隔，多个关键字取交集）
+
+        "字段=值" 形式的关键字按等值条件过滤，可使用该字段上的索引；
+        日期字段支持区间与比较（出生日期=1970~1979、参加工作时间<1990）；
+        周年数字段同样支持（年龄>=50、工龄=30~、党龄=10~20）；
+        纯字母关键字按拼音全拼/首字母前缀在影子列索引上范围扫描；
+        不少于3个字符的关键字走 FTS5 全文索引并按相关度排序，
+        更短的关键字回退为姓名/单位/身份证号上的 LIKE 匹配。
+        """
+        return [row for page in self.iter_pages(columns, keyword) for row in page]
+
+    def _build_filter(self, keyword=None, ids=None, row_ids=None):
+        """解析检索关键字，返回 (FROM 子句, 条件列表, 参数, 是否按相关度排序)
+
+        回收站中的记录（删除时间不为 NULL）不参与检索。
+        """
+        conditions = [f'p."{DELETED_COLUMN}" IS NULL']
+        params = []
+        match_terms = []
+        statements = field_manager.statements
+        field_names = statements.field_names
+        detail_fields = statements.detail_fields
+        use_fulltext = self.has_fulltext() if keyword else False
+        date_fields = statements.date_fields
+        derived_fields = dict(statements.derived_fields)
+        for term in (keyword or '').split():
+            match = FILTER_TERM_PATTERN.match(term)
+            field, op, value = match.groups() if match else (None, None, None)
+            if field in date_fields:
+                condition, term_params = self._date_condition(field, op, value)
+                conditions.append(condition)
+                params.extend(term_params)
+            elif field in derived_fields:
+                condition, term_params = self._derived_condition(field, op, value)
+                conditions.append(condition)
+                params.extend(term_params)
+            elif op == '=' and field in detail_fields:
+                conditions.append(f'p.id IN (SELECT id FROM {DETAIL_TABLE} WHERE "{field}" = ?)')
+                params.append(value)
+            elif op == '=' and field in field_names:
+                conditions.append(f'p."{field}" = ?')
+                params.append(value)
+            elif term.isascii() and term.isalpha() and field_manager.get_pinyin_fields():
+                condition, term_params = self._pinyin_condition(term.lower(), use_fulltext)
+                conditions.append(condition)
+                params.extend(term_params)
+            elif use_fulltext and len(term) >= FULLTEXT_MIN_TERM_LENGTH:
+                # 双引号包裹为短语，避免关键字被解析为 FTS5 语法
+                match_terms.append('"' + term.replace('"', '""') + '"')
+            # 检查是否是身份证号部分（数字）
+            elif term.isdigit():
+                conditions.append("p.身份证号 LIKE ?")
+                params.append(f"%{term}%")
+            else:
+                # 可能是姓名或单位
+                conditions.append("(p.姓名 LIKE ? OR p.一级单位 LIKE ? OR p.二级单位 LIKE ?)")
+                params.extend([f"%{term}%"] * 3)
+
+        # 选中的记录以 JSON 数组作为单个参数经 json_each 展开，不受 SQLite 参数个数上限限制
+        if ids:
+            conditions.append("p.身份证号 IN (SELECT value FROM json_each(?))")
+            params.append(json.dumps(list(ids), ensure_ascii=False))
+        if row_ids:
+            conditions.append("p.id IN (SELECT value FROM json_each(?))")
+            params.append(json.dumps(list(row_ids)))
+
+        if match_terms:
+            source = "personnel_fts JOIN personnel p ON p.id = personnel_fts.rowid"
+            conditions.insert(0, "personnel_fts MATCH ?")
+            params.insert(0, ' AND '.join(match_terms))
+            return source, conditions, params, True
+        return "personnel p", conditions, params, False
+
+    def _date_condition(self, field, op, value):
+        """日期比较关键字：出生日期=1970~1979、参加工作时间<1990、入党日期>=2000-07"""
+        if op == '=':
+            start, sep, end = value.partition('~')
+            return self.date_range_condition(field, start, end if sep else start)
+        upper = op in ('>', '<=')
+        days = date_to_days(value, upper=upper)
+        if days is None:
+            raise ValueError(f"无法识别的日期: {value}")
+        return f'p."_d_{field}" {op} ?', [days]
+
+    def _derived_condition(self, field, op, value):
+        """周年数比较关键字：年龄>50、工龄>=30、党龄=10~20（区间两端可省略其一）"""
+        column = f'p."_n_{field_manager.get_derived_fields()[field]}"'
+        try:
+            if op != '=':
+                return f"{column} {op} ?", [int(value)]
+            start, sep, end = (part.strip() for part in value.partition('~'))
+            if not sep:
+                return f"{column} = ?", [int(start)]
+            bounds = [(compare, int(bound)) for compare, bound in (('>=', start), ('<=', end)) if bound]
+        except ValueError:
+            raise ValueError(f"无法识别的{field}: {value}")
+        return (
+            " AND ".join(f"{column} {compare} ?" for compare, _ in bounds) or "1",
+            [bound for _, bound in bounds]
+        )
+
+    def _pinyin_condition(self, term, use_fulltext):
+        """拼音前缀条件：各拼音字段的全拼/首字母区间（OR），可用多索引 OR 优化"""
+        low, high = prefix_range(term)
+        parts = []
+        params = []
+        for name in field_manager.get_pinyin_fields():
+            for prefix in ('_py_', '_pyi_'):
+                parts.append(f'(p."{prefix}{name}" >= ? AND p."{prefix}{name}" < ?)')
+                params.extend([low, high])
+        # 字母关键字同样可能出现在文本内容中（如 Java、CAD）
+        if use_fulltext and len(term) >= FULLTEXT_MIN_TERM_LENGTH:
+            parts.append("p.id IN (SELECT rowid FROM personnel_fts WHERE personnel_fts MATCH ?)")
+            params.append('"' + term + '"')
+        return "(" + " OR ".join(parts) + ")", params
+
+
+class PersonnelRecords:
+    """按需分页读取的人员记录集
+
+    可多次迭代，每次迭代按键集分页重新读取；len()/布尔判断走 COUNT 查询，
+    套打、导出等批量处理无需一次性把全部记录载入内存。
+    """
+
+    def __init__(self, repo, keyword=None, order_by=None, ids=None):
+        self.repo = repo
+        self.keyword = keyword
+        self.order_by = order_by
+        self.ids = list(ids) if ids else None
+        self._count = None
+
+    def __iter__(self):
+        return self.repo.iter_records(self.keyword, self.order_by, self.ids)
+
+    def __len__(self):
+        if self._count is None:
+            self._count = self.repo.count(self.keyword, self.ids)
+        return self._count
+
+    def __bool__(self):
+        return len(self) > 0
+
+    def invalidate(self):
+        """数据变化后丢弃缓存的记录数"""
+        self._count = None
+
+    def __getitem__(self, index):
+        if index < 0:
+            index += len(self)
+        for i, record in enumerate(self):
+            if i == index:
+                return record
+        raise IndexError(index)
+
+
+def prune_change_journal(conn, days=CHANGE_JOURNAL_RETENTION_DAYS):
+    """清理过期的变更日志"""
+    with conn:
+        cursor = conn.execute(
+            "DELETE FROM personnel_changes WHERE changed_at < datetime('now', 'localtime', ?)",
+            (f'-{days} days',)
+        )
+    if cursor.rowcount:
+        logger.info(f"已清理 {cursor.rowcount} 条过期变更日志")
+
+
+def anniversary_days(last, today, first_year):
+    """(last, today] 期间满周年的日期（距 1970-01-01 的天数）
+
+    即期间每一天在 first_year 以来各年份的同月同日；平年的 3 月 1 日同时包含各闰年的 2 月 29 日
+    （2 月 29 日出生者在平年 3 月 1 日满周岁）。
+    """
+    days = set()
+    ordinal = last.toordinal() + 1
+    while ordinal <= today.toordinal():
+        day = datetime.fromordinal(ordinal)
+        dates = [(day.month, day.day)]
+        if (day.month, day.day) == (3, 1) and not calendar.isleap(day.year):
+            dates.append((2, 29))
+        for year in range(first_year, day.year + 1):
+            for month, dom in dates:
+                try:
+                    days.add((datetime(year, month, dom) - EPOCH).days)
+                except ValueError:
+                    continue
+        ordinal += 1
+    return sorted(days)
+
+
+def refresh_derived_columns(conn, today=None, full=False):
+    """跨日后滚动更新年龄、工龄、党龄，返回更新的行数
+
+    derived_rollover 表记录上次更新的日期。只有期间满周年的人员需要更新，这些人员的日期
+    在 anniversary_days 给出的有限集合中，按日期字段的整数天数列 _d_<字段> 上的索引精确查找，
+    每天只涉及约三百六十五分之一的记录；从未更新、超过一年未更新或 full=True 时逐行核对。
+    更新经变更日志同步到界面和列式缓存。
+    """
+    derived = field_manager.statements.derived_fields
+    today = today or datetime.now().date()
+    row = conn.execute("SELECT rolled_on FROM derived_rollover WHERE id = 1").fetchone()
+    last = datetime.strptime(row[0], '%Y-%m-%d').date() if row else None
+    if not derived or (last == today and not full):
+        return 0
+    full = full or last is None or not 0 < (today - last).days <= 366
+
+    updated = 0
+    with conn:
+        for _, source in derived:
+            column = f'_n_{source}'
+            if full:
+                rows = conn.execute(
+                    f'SELECT id, "{source}", "{column}" FROM personnel '
+                    f'WHERE "{source}" IS NOT NULL OR "{column}" IS NOT NULL'
+                ).fetchall()
+            else:
+                first_day = conn.execute(f'SELECT MIN("_d_{source}") FROM personnel').fetchone()[0]
+                if first_day is None:
+                    continue
+                first_year = datetime.fromordinal(EPOCH.toordinal() + first_day).year
+                days = anniversary_days(last, today, first_year)
+                rows = []
+                for start in range(0, len(days), PAGE_SIZE):
+                    chunk = days[start:start + PAGE_SIZE]
+                    rows += conn.execute(
+                        f'SELECT id, "{source}", "{column}" FROM personnel '
+                        f'WHERE "_d_{source}" IN ({",".join(["?"] * len(chunk))})',
+                        chunk
+                    ).fetchall()
+            changes = []
+            for row_id, value, current in rows:
+                years = years_since(value, today)
+                if years != current:
+                    changes.append((years, row_id))
+            conn.executemany(f'UPDATE personnel SET "{column}" = ? WHERE id = ?', changes)
+            updated += len(changes)
+        conn.execute(
+            "INSERT INTO derived_rollover (id, rolled_on) VALUES (1, ?) "
+            "ON CONFLICT(id) DO UPDATE SET rolled_on = excluded.rolled_on",
+            (today.strftime('%Y-%m-%d'),)
+        )
+    if updated:
+        logger.info(f"已滚动更新 {updated} 条记录的周年数（{today}）")
+    return updated
+
+
+# --------------------------- 重复人员检测 ---------------------------
+def within_one_edit(a, b):
+    """两个字符串是否至多相差一处（替换、增删一个字符或相邻两字符对调）"""
+    if a == b:
+        return True
+    if abs(len(a) - len(b)) > 1:
+        return False
+    if len(a) == len(b):
+        diff = [i for i in range(len(a)) if a[i] != b[i]]
+        return len(diff) == 1 or (
+            len(diff) == 2 and diff[1] == diff[0] + 1
+            and a[diff[0]] == b[diff[1]] and a[diff[1]] == b[diff[0]]
+        )
+    if len(a) > len(b):
+        a, b = b, a
+    i = 0
+    while i < len(a) and a[i] == b[i]:
+        i += 1
+    return a[i:] == b[i + 1:]
+
+
+def id_number_variants(id_number):
+    """与身份证号相差一位（任一位替换或相邻两位对调）的全部号码"""
+    variants = set()
+    for i in range(len(id_number)):
+        for char in '0123456789X' if i == len(id_number) - 1 else '0123456789':
+            variants.add(id_number[:i] + char + id_number[i + 1:])
+        if i + 1 < len(id_number):
+            variants.add(id_number[:i] + id_number[i + 1] + id_number[i] + id_number[i + 2:])
+    variants.discard(id_number)
+    return variants
+
+
+class DuplicateDetector:
+    """疑似重复人员检测（在 SnapshotWorker 中运行，不阻塞界面与写入）
+
+    不做两两比较，而是按分块键把记录分组，只比较同组内的记录，候选对数量与记录数近似线性：
+      姓名 + 出生日期（未填出生日期时取身份证号中的出生日期）
+      姓名 + 一级单位 + 二级单位
+      身份证号相差一位：校验码（ISO 7064 MOD 11-2）能检出任意一位错误和相邻两位对调，
+      因此只需为校验不通过的号码枚举相差一位的号码，在全部号码中查找
+    超过 DUPLICATE_MAX_BLOCK 人的分组（常见姓名）跳过，由其他分块键覆盖。
+    候选对按字段一致程度打分，不低于 DUPLICATE_MIN_SCORE 的作为合并建议，得分高的在前。
+    """
+    FIELDS = ('档案编号', '姓名', '身份证号', '出生日期', '一级单位', '二级单位', '籍贯', '参加工作时间')
+
+    def __init__(self, min_score=DUPLICATE_MIN_SCORE, max_block=DUPLICATE_MAX_BLOCK):
+        self.min_score = min_score
+        self.max_block = max_block
+        self.fields = [name for name in self.FIELDS if name in field_manager.get_summary_fields()]
+        # 记录以元组存放（50 万条时字典的内存开销过大）：(id, 各比对字段..., 出生日期)
+        self.columns = ['id'] + self.fields + ['_birth']
+        self.skipped_blocks = 0
+
+    def run(self, repo, report):
+        """返回 [(得分, [依据...], 记录A, 记录B)]，记录为含 id 的字典"""
+        records = self.load(repo, report)
+        pairs = self.candidate_pairs(records)
+        dismissed = set(repo.query("SELECT id_a, id_b FROM duplicate_dismissed"))
+        pairs = [(a, b) for a, b in pairs if (records[a][0], records[b][0]) not in dismissed]
+        total = len(records) + len(pairs)
+        results = []
+        for done, (a, b) in enumerate(pairs, 1):
+            first, second = self.as_dict(records[a]), self.as_dict(records[b])
+            score, reasons = self.score(first, second)
+            if score >= self.min_score:
+                results.append((score, reasons, first, second))
+            if done % PAGE_SIZE == 0:
+                report(len(records) + done, total)
+        results.sort(key=lambda result: (-result[0], result[2]['id'], result[3]['id']))
+        logger.info(
+            f"查重完成: {len(records)} 条记录, {len(pairs)} 个候选对, {len(results)} 条合并建议, "
+            f"跳过 {self.skipped_blocks} 个过大的分组"
+        )
+        return results
+
+    def as_dict(self, record):
+        return dict(zip(self.columns, record))
+
+    def load(self, repo, report):
+        """按 id 顺序读取全部有效记录的比对字段（去除首尾空白，身份证号转为大写）"""
+        total = repo.count()
+        id_position = self.columns.index('身份证号') if '身份证号' in self.fields else None
+        birth_position = self.columns.index('出生日期') if '出生日期' in self.fields else None
+        cursor = repo.conn.execute(
+            f"SELECT id, {', '.join(quote_identifier(name) for name in self.fields)} FROM personnel "
+            f'WHERE "{DELETED_COLUMN}" IS NULL ORDER BY id'
+        )
+        records = []
+        while True:
+            rows = cursor.fetchmany(PAGE_SIZE * 4)
+            if not rows:
+                break
+            for row in rows:
+                record = [row[0]] + [(value or '').strip() for value in row[1:]]
+                if id_position is not None:
+                    record[id_position] = record[id_position].upper()
+                birth = record[birth_position] if birth_position is not None else ''
+                if not birth and id_position is not None:
+                    birth = self.birth_from_id(record[id_position])
+                record.append(birth)
+                records.append(tuple(record))
+            report(len(records), total * 2)
+        return records
+
+    @staticmethod
+    def birth_from_id(id_number):
+        """身份证号中的出生日期（YYYY-MM-DD），无法识别时为空"""
+        if len(id_number) != 18:
+            return ''
+        birth = normalize_date(id_number[6:14])
+        return birth if re.fullmatch(r'\d{4}-\d{2}-\d{2}', birth) else ''
+
+    def candidate_pairs(self, records):
+        """按分块键生成候选对 [(下标A, 下标B)]"""
+        position = {name: i for i, name in enumerate(self.columns)}
+        name_at = position.get('姓名')
+        unit_at = position.get('一级单位')
+        subunit_at = position.get('二级单位')
+        id_at = position.get('身份证号')
+        birth_at = position['_birth']
+        blocks = {}
+        ids = {}
+        for index, record in enumerate(records):
+            name = record[name_at] if name_at is not None else ''
+            if name:
+                if record[birth_at]:
+                    blocks.setdefault(('birth', name, record[birth_at]), []).append(index)
+                if unit_at is not None and record[unit_at]:
+                    subunit = record[subunit_at] if subunit_at is not None else ''
+                    blocks.setdefault(('unit', name, record[unit_at], subunit), []).append(index)
+            if id_at is not None and record[id_at]:
+                ids[record[id_at]] = index
+
+        pairs = set()
+        for members in blocks.values():
+            if len(members) > self.max_block:
+                self.skipped_blocks += 1
+                continue
+            for i, a in enumerate(members):
+                for b in members[i + 1:]:
+                    pairs.add((a, b))
+        valid = id_checksum_mask(ids)
+        for (id_number, index), checked in zip(ids.items(), valid):
+            if checked:
+                continue
+            for variant in id_number_variants(id_number):
+                other = ids.get(variant)
+                if other is not None:
+                    pairs.add((min(index, other), max(index, other)))
+        return sorted(pairs)
+
+    @staticmethod
+    def score(a, b):
+        """候选对得分（0-100）与依据"""
+        score = 0
+        reasons = []
+
+        def same(name):
+            return bool(a.get(name)) and a.get(name) == b.get(name)
+
+        def close(name):
+            return bool(a.get(name)) and bool(b.get(name)) and within_one_edit(a[name], b[name])
+
+        if close('身份证号'):
+            score += 40 if same('身份证号') else 35
+            reasons.append("身份证号相同" if same('身份证号') else "身份证号仅差一位")
+        if same('姓名'):
+            score += 25
+            reasons.append("姓名相同")
+        elif close('姓名'):
+            score += 12
+            reasons.append("姓名相近")
+        # 姓名、出生日期、单位（含二级单位）均相同恰好达到 DUPLICATE_MIN_SCORE
+        if same('_birth'):
+            score += 20
+            reasons.append("出生日期相同")
+        if same('一级单位'):
+            score += 15 if same('二级单位') else 5
+            reasons.append("单位相同" if same('二级单位') else "一级单位相同")
+        if same('参加工作时间'):
+            score += 10
+            reasons.append("参加工作时间相同")
+        if same('籍贯'):
+            score += 5
+            reasons.append("籍贯相同")
+        return min(score, 100), reasons
+
+
+class FieldConfigWatcher(QObject):
+    """监视 fields.json，文件内容变化时发出 changed
+
+    QFileSystemWatcher（inotify 等系统通知）同时监视文件及其所在目录：编辑器常以“写临时文件
+    再改名”的方式保存，原文件的监视随之失效，目录通知到达时重新加入。通知合并后等待
+    FIELD_CONFIG_DEBOUNCE 毫秒，再比较文件的修改时间与大小，未变化时不发出信号。
+    """
+    changed = pyqtSignal()
+
+    def __init__(self, path, parent=None):
+        super().__init__(parent)
+        self.path = path
+        self.stamp = self._stamp()
+        self.timer = QTimer(self)
+        self.timer.setSingleShot(True)
+        self.timer.setInterval(FIELD_CONFIG_DEBOUNCE)
+        self.timer.timeout.connect(self.check)
+        self.watcher = QFileSystemWatcher(self)
+        self.watcher.addPath(os.path.dirname(path))
+        self._watch_file()
+        self.watcher.fileChanged.connect(self.timer.start)
+        self.watcher.directoryChanged.connect(self.timer.start)
+
+    def _stamp(self):
+        try:
+            stat = os.stat(self.path)
+        except OSError:
+            return None
+        return stat.st_mtime_ns, stat.st_size
+
+    def _watch_file(self):
+        if self.path not in self.watcher.files() and os.path.exists(self.path):
+            self.watcher.addPath(self.path)
+
+    def check(self):
+        self._watch_file()
+        stamp = self._stamp()
+        if stamp is None or stamp == self.stamp:
+            return
+        self.stamp = stamp
+        self.changed.emit()
+
+# --------------------------- 数据质量检查 ---------------------------
+def audit_id_numbers(repo, report):
+    """校验全部有效记录的身份证号（在 SnapshotWorker 中运行）
+
+    按页读取 id、姓名、身份证号、出生日期，整列交给 check_id_numbers 一次校验，
+    返回 (记录总数, [(问题编码, id, 姓名, 身份证号, 出生日期), ...])。
+    """
+    summary_fields = field_manager.get_summary_fields()
+    columns = [name for name in ('姓名', '身份证号', '出生日期') if name in summary_fields]
+    if '身份证号' not in columns:
+        return 0, []
+    total = repo.count()
+    cursor = repo.conn.execute(
+        f"SELECT id, {', '.join(quote_identifier(name) for name in columns)} FROM personnel "
+        f'WHERE "{DELETED_COLUMN}" IS NULL ORDER BY id'
+    )
+    rows = []
+    while True:
+        page = cursor.fetchmany(PAGE_SIZE * 4)
+        if not page:
+            break
+        rows.extend(page)
+        report(len(rows), total)
+    if not rows:
+        return 0, []
+    records = list(zip(*rows))
+    values = dict(zip(['id'] + columns, records))
+    problems = check_id_numbers(
+        [(value or '').strip().upper() for value in values['身份证号']],
+        values.get('出生日期')
+    )
+    empty = tuple([''] * len(rows))
+    return len(rows), [
+        (int(problems[i]), values['id'][i], values.get('姓名', empty)[i] or '',
+         values['身份证号'][i] or '', values.get('出生日期', empty)[i] or '')
+        for i in np.flatnonzero(problems)
+    ]
+
+
+class ChangeMonitor(QObject):
+    """监听 personnel 表的数据变化（包括同一数据库上其他程序实例的写入）
+
+    使用一条独立连接定时读取 PRAGMA data_version：该值只在其他连接提交写入后变化，
+    因此本进程其他连接和其他实例的提交都能感知，空闲时每次轮询只执行一条 PRAGMA。
+    检测到变化后读取 personnel_changes 中的新日志，按行合并为 {行id: 'I'|'U'|'D'} 发出；
+    日志已被清理出现断档、变更过多或数据库被整体替换时发出 reload_required，由界面整表重新加载。
+    """
+    rows_changed = pyqtSignal(dict)
+    reload_required = pyqtSignal()
+
+    def __init__(self, db_path=None, parent=None, interval=CHANGE_POLL_INTERVAL):
+        super().__init__(parent)
+        self.conn = DBManager(db_path).open_connection()
+        self.data_version = self._data_version()
+        self.last_seq = self.conn.execute(
+            "SELECT COALESCE(MAX(seq), 0) FROM personnel_changes"
+        ).fetchone()[0]
+        self.skipped = []  # [(起始序号, 结束序号)]
+        self.timer = QTimer(self)
+        self.timer.timeout.connect(self.poll)
+        self.timer.start(interval)
+
+    def _data_version(self):
+        return self.conn.execute("PRAGMA data_version").fetchone()[0]
+
+    def skip(self, first_seq, last_seq):
+        """跳过一段已由本进程自行刷新界面的日志（如批量修改），不因变更过多而整表重新加载"""
+        if last_seq >= first_seq:
+            self.skipped.append((first_seq, last_seq))
+
+    def check_now(self):
+        """本进程写入后立即检查，不必等待下一次轮询"""
+        QTimer.singleShot(0, self.poll)
+
+    def poll(self):
+        try:
+            version = self._data_version()
+            if version == self.data_version:
+                return
+            self.data_version = version
+
+            first_seq = self.conn.execute(
+                "SELECT MIN(seq) FROM personnel_changes WHERE seq > ?", (self.last_seq,)
+            ).fetchone()[0]
+            if first_seq is None:
+                # 日志序号回退说明数据库已被整体替换（如从备份恢复），整表重新加载
+                latest_seq = self.conn.execute(
+                    "SELECT COALESCE(MAX(seq), 0) FROM personnel_changes"
+                ).fetchone()[0]
+                if latest_seq < self.last_seq:
+                    self.last_seq = latest_seq
+                    self.reload_required.emit()
+                return
+            skipped = ''.join(" AND seq NOT BETWEEN ? AND ?" for _ in self.skipped)
+            rows = self.conn.execute(
+                "SELECT seq, row_id, op FROM personnel_changes "
+                f"WHERE seq > ? AND table_name = 'personnel'{skipped} ORDER BY seq LIMIT ?",
+                (self.last_seq, *[seq for span in self.skipped for seq in span], CHANGE_RELOAD_THRESHOLD + 1)
+            ).fetchall()
+            if first_seq > self.last_seq + 1 or len(rows) > CHANGE_RELOAD_THRESHOLD:
+                self.last_seq = self.conn.execute(
+                    "SELECT MAX(seq) FROM personnel_changes"
+                ).fetchone()[0]
+                self.skipped = []
+                self.reload_required.emit()
+                return
+
+            changes = {}
+            for seq, row_id, op in rows:
+                previous = changes.get(row_id)
+                if previous == 'I' and op == 'D':
+                    del changes[row_id]  # 新增后又删除，界面无需处理
+                elif previous != 'I':
+                    changes[row_id] = op  # 新增后的修改仍按新增处理
+                self.last_seq = seq
+            self.skipped = [span for span in self.skipped if span[1] > self.last_seq]
+            if changes:
+                self.rows_changed.emit(changes)
+        except sqlite3.Error as e:
+            logger.warning(f"读取变更日志失败: {str(e)}")
+
+    def close(self):
+        self.timer.stop()
+        self.conn.close()
+
+
+class Compactor(QObject):
+    """空闲时分步整理数据库：彻底删除回收站中的过期记录、回收附件库，并归还空闲页
+
+    每 COMPACTION_INTERVAL 检查一次，用户连续 COMPACTION_IDLE_SECONDS 无键盘鼠标操作时
+    执行一小步：先删除至多 COMPACTION_PURGE_BATCH 条超过保留期的记录；之后每次启动执行
+    一轮附件垃圾回收，每步处理附件库的一个分组目录（AttachmentStore.garbage_steps）；
+    最后每步以 PRAGMA incremental_vacuum 回收 VACUUM_STEP_PAGES 页，直到空闲页清零。
+    使用独立连接且不等待锁，其他连接正在写入时直接跳过本次。
+    """
+
+    def __init__(self, db_path=None, parent=None, retention_days=RECYCLE_RETENTION_DAYS,
+                 interval=COMPACTION_INTERVAL, idle_seconds=COMPACTION_IDLE_SECONDS):
+        super().__init__(parent)
+        self.conn = DBManager(db_path).open_connection()
+        self.conn.execute("PRAGMA busy_timeout=0")
+        self.attachment_steps = AttachmentStore(db_path).garbage_steps()
+        self.retention_days = retention_days
+        self.idle_seconds = idle_seconds
+        self.last_activity = time.monotonic()
+        app = QApplication.instance()
+        if app is not None:
+            app.installEventFilter(self)
+        self.timer = QTimer(self)
+        self.timer.timeout.connect(self.tick)
+        self.timer.start(interval)
+
+    def eventFilter(self, obj, event):
+        if event.type() in (QEvent.KeyPress, QEvent.MouseButtonPress, QEvent.Wheel):
+            self.last_activity = time.monotonic()
+        return False
+
+    def tick(self):
+        if time.monotonic() - self.last_activity < self.idle_seconds:
+            return
+        try:
+            self.step()
+        except sqlite3.OperationalError as e:
+            logger.debug(f"数据库整理跳过: {str(e)}")
+
+    def step(self):
+        """执行一步整理，返回是否还有剩余工作"""
+        with self.conn:
+            purged = self.conn.execute(
+                f'DELETE FROM personnel WHERE id IN (SELECT id FROM personnel '
+                f'WHERE "{DELETED_COLUMN}" < strftime(\'%Y-%m-%d %H:%M:%S\', \'now\', \'localtime\', ?) LIMIT ?)',
+                (f'-{self.retention_days} days', COMPACTION_PURGE_BATCH)
+            ).rowcount
+        if purged:
+            logger.info(f"已彻底删除 {purged} 条过期的回收站记录")
+            return True
+        if self.attachment_steps is not None:
+            try:
+                if next(self.attachment_steps, None) is not None:
+                    return True
+            except OSError as e:
+                logger.warning(f"附件垃圾回收失败: {str(e)}")
+            self.attachment_steps = None
+        free_pages = self.conn.execute("PRAGMA freelist_count").fetchone()[0]
+        if not free_pages:
+            return False
+        # 该 PRAGMA 不返回结果行，execute 只执行一步（回收一页），executescript 才会执行完整
+        self.conn.executescript(f"PRAGMA incremental_vacuum({VACUUM_STEP_PAGES})")
+        logger.debug(f"增量回收空闲页: {min(free_pages, VACUUM_STEP_PAGES)}/{free_pages}")
+        return free_pages > VACUUM_STEP_PAGES
+
+    def run_until_done(self):
+        """连续执行整理直到没有剩余工作（维护或测试时使用）"""
+        while self.step():
+            pass
+
+    def close(self):
+        self.timer.stop()
+        app = QApplication.instance()
+        if app is not None:
+            app.removeEventFilter(self)
+        self.conn.close()
+
+# --------------------------- 列式缓存 ---------------------------
+def sqlite_sort_key(value):
+    """与 SQLite 默认排序一致的比较键：NULL < 数值 < 文本（按码点，即 UTF-8 字节序）"""
+    if value is None:
+        return (0, 0)
+    if isinstance(value, (int, float)):
+        return (1, value)
+    return (2, value)
+
+class DictionaryColumn:
+    """字典编码列：每行只存 int32 编码，每个不同的取值在取值表中只存一份（编码 0 为 NULL）"""
+
+    def __init__(self, values, capacity):
+        self.values = [None]
+        self.lookup = {None: 0}
+        self._ranks = None
+        self.codes = np.zeros(capacity, dtype=np.int32)
+        self.codes[:len(values)] = [self.encode(value) for value in values]
+
+    def encode(self, value):
+        code = self.lookup.get(value)
+        if code is None:
+            code = self.lookup[value] = len(self.values)
+            self.values.append(value)
+            self._ranks = None
+        return code
+
+    def grow(self, capacity):
+        codes = np.zeros(capacity, dtype=np.int32)
+        codes[:len(self.codes)] = self.codes
+        self.codes = codes
+
+    def set(self, pos, value):
+        self.codes[pos] = self.encode(value)
+
+    def get(self, pos):
+        return self.values[self.codes[pos]]
+
+    def equals(self, value, size):
+        code = self.lookup.get(value)
+        if code is None:
+            return np.zeros(size, dtype=bool)
+        return self.codes[:size] == code
+
+    def ranks(self):
+        """编码 -> 排序名次（取值表按追加顺序编码，名次在取值表变化后重新计算）"""
+        if self._ranks is None:
+            order = sorted(range(len(self.values)), key=lambda code: sqlite_sort_key(self.values[code]))
+            self._ranks = np.empty(len(order), dtype=np.int32)
+            self._ranks[order] = np.arange(len(order), dtype=np.int32)
+        return self._ranks
+
+    def sort(self, positions, descending):
+        keys = self.ranks()[self.codes[positions]]
+        return positions[np.argsort(-keys if descending else keys, kind='stable')]
+
+    def counts(self, positions):
+        """{取值: 行数}"""
+        counts = np.bincount(self.codes[positions], minlength=len(self.values))
+        return {self.values[code]: int(counts[code]) for code in np.flatnonzero(counts)}
+
+    def nbytes(self):
+        return self.codes.nbytes + sys.getsizeof(self.values) + sys.getsizeof(self.lookup) + sum(
+            sys.getsizeof(value) for value in self.values
+        )
+
+class PlainColumn:
+    """普通列：取值几乎各不相同（如身份证号、姓名），按对象数组存放"""
+
+    def __init__(self, values, capacity):
+        self.data = np.empty(capacity, dtype=object)
+        self.data[:len(values)] = values
+
+    def grow(self, capacity):
+        data = np.empty(capacity, dtype=object)
+        data[:len(self.data)] = self.data
+        self.data = data
+
+    def set(self, pos, value):
+        self.data[pos] = value
+
+    def get(self, pos):
+        return self.data[pos]
+
+    def equals(self, value, size):
+        return np.fromiter((item == value for item in self.data[:size]), dtype=bool, count=size)
+
+    def sort(self, positions, descending):
+        # Python 的 sorted 在 reverse 时同样保持相等元素的原有次序
+        data = self.data
+        return np.array(
+            sorted(positions.tolist(), key=lambda pos: sqlite_sort_key(data[pos]), reverse=descending),
+            dtype=np.int64
+        )
+
+    def counts(self, positions):
+        counts = {}
+        for value in self.data[positions]:
+            counts[value] = counts.get(value, 0) + 1
+        return counts
+
+    def nbytes(self):
+        return self.data.nbytes + sum(sys.getsizeof(value) for value in self.data if value is not None)
+
+class ColumnarCache:
+    """personnel 表摘要字段的进程内列式缓存
+
+    每个字段一列：不同取值较少的列（单位、学历等）字典编码，其余为对象数组；
+    记录 id 存于 int64 数组，删除的行只做标记，累计过多时压缩。数据与变更日志序号在同一
+    读事务中载入，之后每次使用前用独立连接检查 PRAGMA data_version，有变化时按
+    personnel_changes 中的新日志逐行修补；日志断档、变更过多、字段配置改变或数据库被
+    整体替换时重新载入。排序、等值过滤、计数与分组计数均在进程内完成，不再访问 SQLite。
+    """
+
+    def __init__(self, db_path=None):
+        self.db = DBManager(db_path)
+        self.conn = None
+        self.columns = None
+        self.fields = ()
+
+    # ---------- 载入与修补 ----------
+    def _connection(self):
+        if self.conn is None:
+            self.conn = self.db.open_connection()
         return self.conn
-    
+
+    def invalidate(self):
+        """丢弃缓存，下次使用时重新载入"""
+        self.columns = None
+
+    def load(self):
+        """在一个读事务中载入全部摘要字段与当前变更日志序号"""
+        started = time.perf_counter()
+        conn = self._connection()
+        fields = field_manager.statements.summary_fields
+        column_list = field_manager.statements.select_list(fields)
+        conn.execute("BEGIN")
+        try:
+            self.data_version = conn.execute("PRAGMA data_version").fetchone()[0]
+            self.last_seq = conn.execute(
+                "SELECT COALESCE(MAX(seq), 0) FROM personnel_changes"
+            ).fetchone()[0]
+            cursor = conn.execute(
+                f'SELECT p.id, {column_list} FROM personnel p WHERE p."{DELETED_COLUMN}" IS NULL ORDER BY p.id'
+            )
+            ids = []
+            values = [[] for _ in fields]
+            while True:
+                rows = cursor.fetchmany(PAGE_SIZE * 4)
+                if not rows:
+                    break
+                for column, column_values in zip([ids] + values, zip(*rows)):
+                    column.extend(column_values)
+        finally:
+            conn.rollback()
+
+        size = len(ids)
+        capacity = max(64, size + size // 4)
+        self.ids = np.zeros(capacity, dtype=np.int64)
+        self.ids[:size] = ids
+        self.alive = np.zeros(capacity, dtype=bool)
+        self.alive[:size] = True
+        self.size = size
+        self.deleted = 0
+        self.index = dict(zip(ids, range(size)))
+        self.fields = fields
+        self.columns = {}
+        for name, column_values in zip(fields, values):
+            low_cardinality = len(set(column_values)) <= max(64, size * COLUMN_CACHE_DICTIONARY_RATIO)
+            column_type = DictionaryColumn if low_cardinality else PlainColumn
+            self.columns[name] = column_type(column_values, capacity)
+        logger.info(f"列式缓存已载入 {size} 行（{(time.perf_counter() - started) * 1000:.0f}ms）")
+
+    def sync(self):
+        """确保缓存与数据库一致（未载入或无法修补时整体载入）"""
+        if self.columns is None or self.fields != tuple(field_manager.get_summary_fields()):
+            self.load()
+            return
+        conn = self._connection()
+        version = conn.execute("PRAGMA data_version").fetchone()[0]
+        if version == self.data_version:
+            return
+        self.data_version = version
+        rows = conn.execute(
+            "SELECT seq, row_id, table_name FROM personnel_changes WHERE seq > ? ORDER BY seq LIMIT ?",
+            (self.last_seq, COLUMN_CACHE_PATCH_LIMIT + 1)
+        ).fetchall()
+        if not rows:
+            latest_seq = conn.execute("SELECT COALESCE(MAX(seq), 0) FROM personnel_changes").fetchone()[0]
+            if latest_seq < self.last_seq:
+                self.load()  # 日志序号回退：数据库已被整体替换
+            return
+        if rows[0][0] > self.last_seq + 1 or len(rows) > COLUMN_CACHE_PATCH_LIMIT:
+            self.load()
+            return
+        self.last_seq = rows[-1][0]
+        self._patch({row_id for _, row_id, table_name in rows if table_name == 'personnel'})
+
+    def _patch(self, row_ids):
+        """按 id 重新读取变化的行：仍存在的覆盖或追加，已不存在的标记删除"""
+        column_list = field_manager.statements.select_list(self.fields)
+        row_ids = list(row_ids)
+        found = set()
+        for start in range(0, len(row_ids), PAGE_SIZE):
+            chunk = row_ids[start:start + PAGE_SIZE]
+            rows = self.conn.execute(
+                f"SELECT p.id, {column_list} FROM personnel p "
+                f"WHERE p.id IN ({','.join(['?'] * len(chunk))}) AND p.\"{DELETED_COLUMN}\" IS NULL",
+                chunk
+            ).fetchall()
+            for row in rows:
+                found.add(row[0])
+                self._store(row[0], row[1:])
+        for row_id in row_ids:
+            if row_id not in found:
+                self._remove(row_id)
+        if self.deleted > max(1000, self.size // 4):
+            self._compact()
+
+    def _store(self, row_id, values):
+        pos = self.index.get(row_id)
+        if pos is None:
+            if self.size == len(self.ids):
+                self._grow(self.size * 2)
+            pos = self.index[row_id] = self.size
+            self.ids[pos] = row_id
+            self.alive[pos] = True
+            self.size += 1
+        for name, value in zip(self.fields, values):
+            self.columns[name].set(pos, value)
+
+    def _remove(self, row_id):
+        pos = self.index.pop(row_id, None)
+        if pos is not None:
+            self.alive[pos] = False
+            self.deleted += 1
+
+    def _grow(self, capacity):
+        for name in ('ids', 'alive'):
+            array = getattr(self, name)
+            grown = np.zeros(capacity, dtype=array.dtype)
+            grown[:len(array)] = array
+            setattr(self, name, grown)
+        for column in self.columns.values():
+            column.grow(capacity)
+
+    def _compact(self):
+        """去掉已删除的行（新增行追加在末尾，id 顺序不要求有序）"""
+        keep = np.flatnonzero(self.alive[:self.size])
+        size = len(keep)
+        self.ids[:size] = self.ids[keep]
+        self.alive[:size] = True
+        self.alive[size:] = False
+        for column in self.columns.values():
+            if isinstance(column, DictionaryColumn):
+                column.codes[:size] = column.codes[keep]
+            else:
+                column.data[:size] = column.data[keep]
+                column.data[size:] = None
+        self.size = size
+        self.deleted = 0
+        self.index = dict(zip(self.ids[:size].tolist(), range(size)))
+
+    # ---------- 查询 ----------
+    def _positions(self, filters=None):
+        """满足等值条件 {字段: 值} 的行位置"""
+        mask = self.alive[:self.size].copy()
+        for name, value in (filters or {}).items():
+            mask &= self.columns[name].equals(value, self.size)
+        return np.flatnonzero(mask)
+
+    def count(self, filters=None):
+        """满足等值条件的记录数"""
+        self.sync()
+        return len(self._positions(filters))
+
+    def group_count(self, field, filters=None, key=None):
+        """按字段取值分组计数，返回 [(取值, 行数), ...]，按取值排序
+
+        key 可把取值映射为分组值（如日期取年份），映射后相同的组合并。
+        """
+        self.sync()
+        counts = self.columns[field].counts(self._positions(filters))
+        if key is not None:
+            grouped = {}
+            for value, count in counts.items():
+                group = key(value)
+                grouped[group] = grouped.get(group, 0) + count
+            counts = grouped
+        return sorted(counts.items(), key=lambda item: sqlite_sort_key(item[0]))
+
+    def sorted_ids(self, order_by, filters=None):
+        """按 [(字段, 'ASC'|'DESC'), ...] 排序后的记录 id 数组，顺序与 fetch_page 一致
+
+        最后以 id 作为决胜键，方向随最后一个排序键。
+        """
+        self.sync()
+        positions = self._positions(filters)
+        descending = bool(order_by) and order_by[-1][1] == 'DESC'
+        ids = self.ids[positions]
+        positions = positions[np.argsort(-ids if descending else ids, kind='stable')]
+        for name, direction in reversed(order_by):
+            positions = self.columns[name].sort(positions, direction == 'DESC')
+        return self.ids[positions]
+
+    def record(self, row_id):
+        """一条记录的摘要字段 {字段: 值}，不存在时返回 None"""
+        self.sync()
+        pos = self.index.get(row_id)
+        if pos is None:
+            return None
+        return {name: column.get(pos) for name, column in self.columns.items()}
+
+    def first_record(self):
+        """id 最小的一条记录，表为空时返回 None"""
+        self.sync()
+        positions = self._positions()
+        if not len(positions):
+            return None
+        return self.record(int(self.ids[positions].min()))
+
+    def memory_usage(self):
+        """缓存占用的大致字节数"""
+        if self.columns is None:
+            return 0
+        return self.ids.nbytes + self.alive.nbytes + sys.getsizeof(self.index) + sum(
+            column.nbytes() for column in self.columns.values()
+        )
+
     def close(self):
-        """关闭数据库连接"""
-        if hasattr(self, 'conn') and self.conn:
+        if self.conn is not None:
             self.conn.close()
             self.conn = None
 
-# ======================= 修改 init_database 函数 =======================
-# ======================= 修改 init_database 函数 =======================
+
 def init_database():
-    """初始化数据库（使用全局 field_manager）"""
+    """初始化数据库（使用全局 field_manager，按需增量迁移）"""
     global field_manager  # 声明使用全局变量
-    
+
     # 确保field_manager已经初始化
     if field_manager is None:
         field_manager = FieldManager()  # 初始化全局字段管理器
-    
+
     # 首先获取数据库路径，确保在异常处理中可用
     db_path = get_db_path()
-    
+
     try:
         logger.info(f"初始化数据库路径: {db_path}")
-        
-        # 备份旧数据库（如果存在）
-        if os.path.exists(db_path):
-            backup_path = f"{db_path}.backup_{datetime.now().strftime('%Y%m%d_%H%M%S')}"
-            shutil.copy2(db_path, backup_path)
-            logger.info(f"已创建数据库备份: {backup_path}")
-        
-        # 重建数据库
-        with sqlite3.connect(db_path) as conn:
-            cursor = conn.cursor()
-            
-            # 获取当前字段配置
-            create_sql = field_manager.get_create_table_sql()
-            logger.debug(f"执行建表SQL: {create_sql}")
-            
-            cursor.execute("DROP TABLE IF EXISTS personnel")
-            cursor.execute(create_sql)
-            
-            # 新增代码：获取预期的字段列表和数据库现有字段
-            cursor.execute("PRAGMA table_info(personnel)")
-            db_columns = [col[1] for col in cursor.fetchall()]  # 获取数据库现有字段
-            expected_columns = set(field_manager.get_field_names())  # 获取配置字段
-            
-            # 修复字段验证逻辑
-            existing_columns = set(db_columns[1:]) if db_columns else set()  # 跳过id列
-            missing_columns = expected_columns - existing_columns
-            
-            if missing_columns:
-                logger.warning(f"发现缺失字段：{missing_columns}，尝试自动迁移...")
-                for col in missing_columns:
-                    cursor.execute(f'ALTER TABLE personnel ADD COLUMN "{col}" TEXT')
-                conn.commit()
-            
+        conn = DBManager(db_path).get_connection()
+        SchemaMigrator(conn, field_manager, db_path).migrate()
+        refresh_derived_columns(conn)
+        prune_change_journal(conn)
+
     except Exception as e:
         logger.critical(f"数据库初始化失败: {str(e)}")
         error_msg = (
@@ -531,45 +4154,15 @@ def init_database():
     
 def update_personnel(db_path, original_id, data):
     try:
-        with sqlite3.connect(db_path) as conn:
-            cursor = conn.cursor()
-            # 动态构建 SET 子句
-            set_fields = [f'"{k}" = ?' for k in data.keys()]
-            set_clause = ", ".join(set_fields)
-            # 参数顺序：新值 + 原始身份证号
-            params = list(data.values()) + [original_id]
-            # 执行更新
-            cursor.execute(
-                f"UPDATE personnel SET {set_clause} WHERE 身份证号 = ?",
-                params
-            )
-            conn.commit()  # 显式提交事务
-            return cursor.rowcount > 0
+        return PersonnelRepository(db_path).update(original_id, data) > 0
     except sqlite3.IntegrityError as e:
         # 处理唯一性冲突
         logger.error(f"唯一性冲突: {str(e)}")
         return False
 
 def get_all_personnel(db_path):
-    with sqlite3.connect(db_path) as conn:
-        cursor = conn.cursor()
-        cursor.execute("SELECT * FROM personnel")
-        return cursor.fetchall()
     try:
-        with sqlite3.connect(db_path, check_same_thread=False) as conn:
-            conn.row_factory = sqlite3.Row
-            cursor = conn.cursor()
-            cursor.execute("SELECT * FROM personnel")
-            raw_data = cursor.fetchall()
-            
-            # 补全字段
-            columns = ['id', '档案编号', '姓名', '身份证号', '身份', '籍贯','一级单位', '二级单位',
-                      '出生日期', '参加工作时间', '入党日期', '工作经历', '学历',
-                      '档案流转记录', '电子档案', '备注']
-            return [
-                {col: row[col] if col in row.keys() else "" for col in columns}
-                for row in raw_data
-            ]
+        return PersonnelRepository(db_path).fetch_rows()
     except Exception as e:
         logger.error(f"获取数据失败: {str(e)}")
         return []
@@ -583,24 +4176,12 @@ def add_personnel(db_path, data):
             if not data.get(field, '').strip():
                 raise ValueError(f"必填字段 '{field}' 不能为空")
         
-        # 验证身份证号格式
-        if '身份证号' in data and not validate_id_number(data['身份证号']):
-            raise ValueError("身份证号格式错误（需18位数字）")
-            
-        with sqlite3.connect(db_path) as conn:
-            cursor = conn.cursor()
-            # 使用字段管理器中的字段顺序
-            fields = field_manager.get_field_names()
-            values = [data.get(field, '') for field in fields]
-            
-            # 动态构建SQL
-            placeholders = ','.join(['?'] * len(fields))
-            query = f'''
-                INSERT INTO personnel ({",".join(fields)})
-                VALUES ({placeholders})
-            '''
-            cursor.execute(query, values)
-            conn.commit()
+        # 验证身份证号（格式、校验码、地区码、出生日期）；与出生日期字段不符时由录入界面确认
+        problem = id_number_problem(data['身份证号']) if '身份证号' in data else None
+        if problem:
+            raise ValueError(problem)
+            
+        PersonnelRepository(db_path).insert(data)
         logger.info(f"新增档案成功: {data.get('姓名', '')}（{data.get('身份证号', '')}）")
         return True
     except Exception as e:
@@ -608,53 +4189,264 @@ def add_personnel(db_path, data):
         QMessageBox.critical(None, "错误", f"新增失败: {str(e)}")  # 添加错误提示
         return False
      
-def import_from_excel(db_path, file_path):
-    # 获取所有字段名
-    all_columns = field_manager.get_field_names()
+class ImportReport:
+    """Excel 导入结果：总行数、新增/更新/未变化条数及被拒绝的行（Excel 行号、原因、原始数据）"""
+
+    def __init__(self, file_path, columns, mode='insert'):
+        self.file_path = file_path
+        self.columns = columns
+        self.mode = mode
+        self.total = 0
+        self.inserted = 0
+        self.updated = 0
+        self.unchanged = 0
+        self.rejected = []
+
+    @property
+    def written(self):
+        """实际写入数据库的条数"""
+        return self.inserted + self.updated
+
+    def reject(self, row_number, reason, record):
+        self.rejected.append((row_number, reason, record))
+
+    def reason_counts(self):
+        """按原因汇总拒绝条数"""
+        counts = {}
+        for _, reason, _ in self.rejected:
+            counts[reason] = counts.get(reason, 0) + 1
+        return counts
+
+    def summary(self):
+        text = f"共 {self.total} 行，新增 {self.inserted} 条"
+        if self.mode == 'upsert':
+            text += f"，更新 {self.updated} 条，未变化 {self.unchanged} 条"
+        if self.rejected:
+            text += f"，拒绝 {len(self.rejected)} 条：\n"
+            text += "\n".join(f"  {reason}: {count} 条" for reason, count in self.reason_counts().items())
+        return text
+
+    def save(self, path):
+        """将被拒绝的行连同原因写入 Excel，便于修正后重新导入"""
+        wb = Workbook(write_only=True)
+        ws = wb.create_sheet("拒绝记录")
+        ws.append(["Excel行号", "拒绝原因"] + self.columns)
+        for row_number, reason, record in self.rejected:
+            ws.append([row_number, reason] + [record.get(col, '') for col in self.columns])
+        wb.save(path)
+
+
+def import_from_excel(db_path, file_path, progress_callback=None, mode='insert'):
+    """批量导入 Excel，返回 ImportReport
+
+    先载入库中已有的唯一字段值（档案编号、身份证号等），在内存中完成必填校验、身份证号批量校验与判重，
+    合格行按 IMPORT_BATCH_SIZE 分批 executemany 写入。整个导入在一个事务内完成，
+    每批使用保存点：批内出现意外的约束冲突时回退该批并逐行写入以定位问题行。
+
+    mode='upsert' 时按身份证号匹配已有人员，使用 INSERT ... ON CONFLICT DO UPDATE
+    更新其档案；内容摘要与库中一致的行不产生任何写入。
+    """
+    upsert = mode == 'upsert'
+    # 当前字段配置的列清单与写入语句（随字段配置缓存，不必每次导入重新拼接）
+    statements = field_manager.statements
+    all_columns = list(statements.field_names)
     
     # 读取Excel时指定字段类型为字符串
-    df = pd.read_excel(file_path, dtype=str, keep_default_na=False)
+    df = pd.read_excel(file_path, dtype=str, keep_default_na=False, engine=EXCEL_READ_ENGINE)
     
     # 填充缺失列
     for col in all_columns:
         if col not in df.columns:
             df[col] = ''
-    
-    try:
-        with sqlite3.connect(db_path) as conn:
-            cursor = conn.cursor()
-            success_count = 0
-            error_count = 0
-            
-            # 转义字段名（防止SQL注入）
-            escaped_columns = [f'"{col}"' for col in all_columns]
-            placeholders = ', '.join(['?'] * len(all_columns))
-            
-            for idx, row in df.iterrows():
+
+    report = ImportReport(file_path, all_columns, mode)
+    report.total = len(df)
+    required_fields = statements.required_fields
+    unique_fields = statements.unique_fields
+    date_fields = statements.date_fields
+    pinyin_fields = statements.pinyin_fields
+    if upsert and UPSERT_KEY_FIELD not in unique_fields:
+        raise ValueError(f"更新导入要求“{UPSERT_KEY_FIELD}”为唯一字段")
+
+    # 拼音影子列与内容摘要随摘要字段一并写入；更新导入时摘要未变化的行不更新
+    detail_fields = statements.detail_fields
+    detail_query = statements.detail_upsert_sql(detail_fields) if detail_fields else None
+    insert_columns = statements.insert_columns
+    query = statements.upsert_sql if upsert else statements.insert_sql
+
+    db = DBManager(db_path)
+    conn = db.get_connection()
+
+    def count_written(is_update, n=1):
+        if is_update:
+            report.updated += n
+        else:
+            report.inserted += n
+
+    def detail_row(row_id, detail, is_update):
+        # 新增的人员明细全部为空时不建明细行；更新时需覆盖原有内容
+        if is_update or any(detail):
+            return (row_id,) + detail
+        return None
+
+    def write_details(rows):
+        rows = [row for row in rows if row]
+        if rows:
+            conn.executemany(detail_query, rows)
+            refresh_ids.update(row[0] for row in rows)
+
+    def flush(batch):
+        conn.execute("SAVEPOINT import_batch")
+        try:
+            max_id = conn.execute("SELECT COALESCE(MAX(id), 0) FROM personnel").fetchone()[0]
+            conn.executemany(query, [values for _, _, values, _, _ in batch])
+            if detail_query:
+                # 新增行的 id 按写入顺序递增，更新行按身份证号取原 id
+                new_ids = iter(row[0] for row in conn.execute(
+                    "SELECT id FROM personnel WHERE id > ? ORDER BY id", (max_id,)
+                ))
+                write_details([
+                    detail_row(row_ids[record[UPSERT_KEY_FIELD]] if is_update else next(new_ids),
+                               detail, is_update)
+                    for _, record, _, detail, is_update in batch
+                ])
+            # 整批（含明细）写入成功后才计数，回退后逐行写入时不会重复计入
+            updates = sum(1 for *_, is_update in batch if is_update)
+            count_written(True, updates)
+            count_written(False, len(batch) - updates)
+        except sqlite3.IntegrityError:
+            conn.execute("ROLLBACK TO import_batch")
+            for row_number, record, values, detail, is_update in batch:
+                conn.execute("SAVEPOINT import_row")
                 try:
-                    # 构建插入语句
-                    query = f'''
-                        INSERT INTO personnel ({",".join(escaped_columns)})
-                        VALUES ({placeholders})
-                    '''
-                    cursor.execute(query, tuple(str(row[col]) for col in all_columns))
-                    success_count += 1
+                    row_id = conn.execute(query, values).lastrowid
+                    if detail_query:
+                        write_details([detail_row(
+                            row_ids[record[UPSERT_KEY_FIELD]] if is_update else row_id, detail, is_update
+                        )])
+                    count_written(is_update)
                 except sqlite3.IntegrityError as e:
-                    # 唯一性冲突跳过记录
-                    error_count += 1
-                    logger.warning(f"唯一性冲突跳过记录 {idx+1}: {str(e)}")
-                except Exception as e:
-                    error_count += 1
-                    logger.error(f"导入记录 {idx+1} 失败: {str(e)}")
-            
+                    conn.execute("ROLLBACK TO import_row")
+                    report.reject(row_number, f"约束冲突（{str(e)}）", record)
+                conn.execute("RELEASE import_row")
+        conn.execute("RELEASE import_batch")
+
+    # 导入期间临时切换到 bulk 配置（大缓存、暂停自动检查点），结束后恢复连接原有的设置
+    with db.profile_scope('bulk', conn):
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            # 回收站中与导入数据唯一值相同的旧记录由导入的记录取代
+            for name in unique_fields:
+                conn.executemany(
+                    f'DELETE FROM personnel WHERE "{DELETED_COLUMN}" IS NOT NULL AND {quote_identifier(name)} = ?',
+                    [(value,) for value in df[name].unique().tolist() if value not in (None, '')]
+                )
+            # 库中已有的唯一值及其所属人员（身份证号），导入文件内部的重复也在此拦截
+            key_expr = quote_identifier(UPSERT_KEY_FIELD) if UPSERT_KEY_FIELD in all_columns else 'NULL'
+            owners = {
+                name: dict(conn.execute(f'SELECT {quote_identifier(name)}, {key_expr} FROM personnel'))
+                for name in unique_fields
+            }
+            stored_hashes = {}
+            row_ids = {}
+            if upsert:
+                for key, stored_hash, row_id in conn.execute(
+                    f'SELECT "{UPSERT_KEY_FIELD}", "{ROW_HASH_COLUMN}", id FROM personnel'
+                ):
+                    stored_hashes[key] = stored_hash
+                    row_ids[key] = row_id
+            processed_keys = set()
+            refresh_ids = set()  # 写入了明细的人员，导入结束后重建其全文索引行
+            # 逐行触发的全文索引同步在批量写入时代价很高（每条语句都会刷写 FTS5 缓冲），
+            # 导入期间暂时移除插入触发器，写入完成后对新增行一次性补建索引
+            fts_triggers = conn.execute(
+                "SELECT name, sql FROM sqlite_master WHERE type = 'trigger' AND name IN (?, ?)",
+                ('personnel_fts_ai', f'{DETAIL_TABLE}_fts_ai')
+            ).fetchall()
+            last_id = conn.execute("SELECT COALESCE(MAX(id), 0) FROM personnel").fetchone()[0]
+            for name, _ in fts_triggers:
+                conn.execute(f'DROP TRIGGER "{name}"')
+
+            # 身份证号整列批量校验（校验码、地区码、内嵌出生日期及与出生日期字段是否一致）
+            id_problems = None
+            if UPSERT_KEY_FIELD in all_columns:
+                id_problems = check_id_numbers(
+                    [value.strip().upper() for value in df[UPSERT_KEY_FIELD].tolist()],
+                    [normalize_date(value) for value in df['出生日期'].tolist()] if '出生日期' in date_fields else None
+                )
+
+            batch = []
+            for idx, row in enumerate(df[all_columns].values.tolist()):
+                row_number = idx + 2  # Excel 第1行为表头
+                record = dict(zip(all_columns, row))
+                missing = [name for name in required_fields if not str(record[name]).strip()]
+                if missing:
+                    report.reject(row_number, f"必填字段为空: {'、'.join(missing)}", record)
+                    continue
+                if id_problems is not None and id_problems[idx] and str(record[UPSERT_KEY_FIELD]).strip():
+                    report.reject(row_number, ID_PROBLEMS[int(id_problems[idx])], record)
+                    continue
+                key = record.get(UPSERT_KEY_FIELD)
+                is_update = upsert and key in stored_hashes
+                if upsert and key in processed_keys:
+                    report.reject(row_number, f"{UPSERT_KEY_FIELD}重复", record)
+                    continue
+                # 更新已有人员时，其自身原有的唯一值不算重复
+                duplicate = next((
+                    name for name in unique_fields
+                    if record[name] in owners[name] and not (is_update and owners[name][record[name]] == key)
+                ), None)
+                if duplicate:
+                    report.reject(row_number, f"{duplicate}重复", record)
+                    continue
+                for name in unique_fields:
+                    owners[name][record[name]] = key
+                processed_keys.add(key)
+
+                values = PersonnelRepository.prepare_values(record, date_fields, pinyin_fields, all_columns)
+                if is_update and stored_hashes[key] == values[ROW_HASH_COLUMN]:
+                    report.unchanged += 1
+                    continue
+                batch.append((
+                    row_number, record, tuple(values.get(col) for col in insert_columns),
+                    tuple(values.get(name) or None for name in detail_fields), is_update
+                ))
+                if len(batch) >= IMPORT_BATCH_SIZE:
+                    flush(batch)
+                    batch = []
+                if progress_callback and (idx + 1) % IMPORT_BATCH_SIZE == 0:
+                    progress_callback(idx + 1, report.total)
+            if batch:
+                flush(batch)
+
+            if fts_triggers:
+                fts_fields = [row[1] for row in conn.execute("PRAGMA table_info(personnel_fts)")]
+                fts_columns = ', '.join(f'"{name}"' for name in fts_fields)
+                source_columns = statements.select_list(fts_fields)
+                fill_sql = (
+                    f"INSERT INTO personnel_fts (rowid, {fts_columns}) "
+                    f"SELECT p.id, {source_columns} FROM personnel p {statements.detail_join}"
+                )
+                # AUTOINCREMENT 保证新记录的 id 均大于导入前的最大 id（更新的记录由更新触发器维护，
+                # 但更新时新建的明细行的插入触发器已移除，这些人员的索引行在此重写）
+                conn.execute(f"{fill_sql} WHERE p.id > ?", (last_id,))
+                stale_ids = [(row_id,) for row_id in refresh_ids if row_id <= last_id]
+                conn.executemany("DELETE FROM personnel_fts WHERE rowid = ?", stale_ids)
+                conn.executemany(f"{fill_sql} WHERE p.id = ?", stale_ids)
+                for _, sql in fts_triggers:
+                    conn.execute(sql)
             conn.commit()
-            
-            # 记录导入结果
-            logger.info(f"导入完成: 成功 {success_count} 条, 失败 {error_count} 条")
-            return success_count
-    except Exception as e:
-        logger.error(f"导入失败：{str(e)}")
-        raise
+        except Exception as e:
+            conn.rollback()
+            logger.error(f"导入失败：{str(e)}")
+            raise
+
+    # 记录导入结果
+    logger.info(
+        f"导入完成: 新增 {report.inserted} 条, 更新 {report.updated} 条, "
+        f"未变化 {report.unchanged} 条, 拒绝 {len(report.rejected)} 条"
+    )
+    return report
 
 def delete_personnel(db_path, ids):
     """增强版删除方法"""
@@ -662,21 +4454,13 @@ def delete_personnel(db_path, ids):
         if not ids:
             return False
             
-        with sqlite3.connect(db_path, timeout=10) as conn:
-            cursor = conn.cursor()
-            
-            # 构建安全查询
-            placeholders = ','.join(['?'] * len(ids))
-            query = f"DELETE FROM personnel WHERE 身份证号 IN ({placeholders})"
+        count = PersonnelRepository(db_path).delete(ids)
+        if count == 0:
+            logger.warning(f"未找到匹配记录: {ids}")
+            return False
             
-            cursor.execute(query, ids)
-            if cursor.rowcount == 0:
-                logger.warning(f"未找到匹配记录: {ids}")
-                return False
-                
-            conn.commit()
-            logger.info(f"删除成功: {cursor.rowcount}条记录")
-            return True
+        logger.info(f"删除成功: {count}条记录")
+        return True
     except sqlite3.OperationalError as e:
         error_msg = f"数据库操作失败: {str(e)}"
         if "locked" in str(e):
@@ -904,8 +4688,18 @@ class DynamicFormDialog(QDialog):
             if missing_fields:
                 raise ValueError(f"以下字段必填：{', '.join(missing_fields)}")
 
-            if '身份证号' in data and not validate_id_number(data['身份证号']):
-                raise ValueError("身份证号格式错误（需18位数字）")
+            if '身份证号' in data:
+                problem = id_number_problem(data['身份证号'])
+                if problem:
+                    raise ValueError(problem)
+                # 与出生日期不符时提醒确认（出生日期控件未修改时默认为当天）
+                if id_number_problem(data['身份证号'], data.get('出生日期')) and QMessageBox.question(
+                    self, "请确认",
+                    f"{ID_PROBLEMS[5]}：身份证号中为 {DuplicateDetector.birth_from_id(data['身份证号'])}，"
+                    f"出生日期填写为 {data.get('出生日期')}。\n仍要保存吗？",
+                    QMessageBox.Yes | QMessageBox.No
+                ) != QMessageBox.Yes:
+                    return False
 
             self._validated_data = data
             return True
@@ -972,6 +4766,7 @@ class StatsDialog(QDialog):
     def __init__(self, parent=None, db_path=None):
         super().__init__(parent)
         self.db_path = db_path
+        self.worker = None
         self.setWindowTitle("数据统计")
         self.setup_ui()
 
@@ -980,7 +4775,16 @@ class StatsDialog(QDialog):
         
         # 统计字段选择
         self.field_combo = QComboBox()
-        self.field_combo.addItems(["身份", "籍贯","一级单位", "二级单位", "学历", "出生年份"])
+        self.field_combo.addItems(["身份", "籍贯","一级单位", "二级单位", "学历"])
+        # 日期字段按年份分组，直接使用生成列 _y_<字段>（出生日期 -> 出生年份）
+        self.year_fields = {}
+        for name in field_manager.get_date_fields():
+            label = re.sub(r'(日期|时间)$', '', name) + "年份"
+            self.year_fields[label] = name
+            self.field_combo.addItem(label)
+        # 年龄、工龄、党龄按已建索引的周年数列分组
+        self.derived_fields = field_manager.get_derived_fields()
+        self.field_combo.addItems(list(self.derived_fields))
         
         # 统计类型
         self.type_combo = QComboBox()
@@ -989,11 +4793,11 @@ class StatsDialog(QDialog):
         # 条件过滤
         self.filter_label = QLabel("筛选条件:")
         self.filter_input = QLineEdit()
-        self.filter_input.setPlaceholderText("例如: 一级单位='办公室'")
+        self.filter_input.setPlaceholderText("例如: 一级单位='办公室'、出生日期=1970~1979 或 年龄>=50")
         
         # 按钮
-        btn_run = QPushButton("执行统计")
-        btn_run.clicked.connect(self.run_stats)
+        self.btn_run = QPushButton("执行统计")
+        self.btn_run.clicked.connect(self.run_stats)
         
         # 结果显示
         self.result_area = QTextEdit()
@@ -1005,49 +4809,210 @@ class StatsDialog(QDialog):
         layout.addWidget(self.type_combo)
         layout.addWidget(self.filter_label)
         layout.addWidget(self.filter_input)
-        layout.addWidget(btn_run)
+        layout.addWidget(self.btn_run)
         layout.addWidget(self.result_area)
         
         self.setLayout(layout)
         self.resize(500, 400)
 
     def run_stats(self):
-        try:
-            field = self.field_combo.currentText()
-            stat_type = self.type_combo.currentText()
-            condition = self.filter_input.text().strip()
-            
-            with sqlite3.connect(self.db_path) as conn:
-                cursor = conn.cursor()
-                
-                # 处理特殊字段
-                if field == "出生年份":
-                    field_expr = "strftime('%Y', 出生日期)"
-                else:
-                    field_expr = field
-                    
-                # 构建安全查询
-                where_clause = ""
-                params = []
-                if condition:
-                    if "=" in condition:
-                        col, val = condition.split("=", 1)
-                        where_clause = f"WHERE {col.strip()} = ?"
-                        params.append(val.strip())
-                
-                if stat_type == "计数":
-                    query = f"SELECT {field_expr}, COUNT(*) FROM personnel {where_clause} GROUP BY {field_expr}"
-                    cursor.execute(query, params)
-                    results = cursor.fetchall()
-                    
-                    output = f"{field}统计结果（总计{len(results)}类）:\n"
-                    for name, count in results:
-                        output += f"{name if name else '空值'}: {count}人\n"
-                
+        """在只读快照上后台执行统计，查询期间界面与其他写入不受影响"""
+        if self.worker and self.worker.isRunning():
+            return
+        field = self.field_combo.currentText()
+        stat_type = self.type_combo.currentText()
+        condition = self.filter_input.text().strip()
+        year_fields = self.year_fields
+        derived_fields = self.derived_fields
+
+        cache = getattr(self.parent(), 'column_cache', None)
+        if cache is not None and stat_type == "计数":
+            try:
+                output = self.count_from_cache(cache, field, condition)
+            except Exception as e:
+                logger.warning(f"列式缓存统计失败，改用数据库查询: {str(e)}")
+                output = None
+            if output is not None:
                 self.result_area.setText(output)
-                
-        except Exception as e:
-            QMessageBox.critical(self, "错误", f"统计失败: {str(e)}")
+                return
+
+        def job(repo, report):
+            # 处理特殊字段
+            if field in year_fields:
+                field_expr = f'p."_y_{year_fields[field]}"'
+            elif field in derived_fields:
+                field_expr = f'p."_n_{derived_fields[field]}"'
+            else:
+                field_expr = f'p."{field}"'
+
+            # 构建安全查询（仅接受已配置字段，分组/过滤字段上的索引可被使用）
+            where_clause = f'WHERE p."{DELETED_COLUMN}" IS NULL'
+            params = []
+            if condition:
+                match = FILTER_TERM_PATTERN.match(condition)
+                if match:
+                    col, op, val = (part.strip() for part in match.groups())
+                    if col in field_manager.get_date_fields():
+                        clause, params = repo._date_condition(col, op, val)
+                        where_clause += f" AND {clause}"
+                    elif col in derived_fields:
+                        clause, params = repo._derived_condition(col, op, val)
+                        where_clause += f" AND {clause}"
+                    elif op == '=':
+                        if col not in field_manager.get_summary_fields():
+                            raise ValueError(f"未知的筛选字段: {col}")
+                        where_clause += f' AND p."{col}" = ?'
+                        params.append(val.strip("'\""))
+
+            if stat_type == "计数":
+                query = f"SELECT {field_expr}, COUNT(*) FROM personnel p {where_clause} GROUP BY {field_expr}"
+                results = repo.query(query, params)
+
+                output = f"{field}统计结果（总计{len(results)}类）:\n"
+                for name, count in results:
+                    output += f"{name if name else '空值'}: {count}人\n"
+
+            return output
+
+        worker = self.worker = SnapshotWorker(self.db_path, job, self)
+        worker.succeeded.connect(self.result_area.setText)
+        worker.failed.connect(
+            lambda message: QMessageBox.critical(self, "错误", f"统计失败: {message}")
+        )
+        worker.finished.connect(lambda: self.btn_run.setEnabled(True))
+        self.btn_run.setEnabled(False)
+        worker.start()
+
+    def count_from_cache(self, cache, field, condition):
+        """无筛选或按摘要字段等值筛选时直接在列式缓存上分组计数，其余情况返回 None"""
+        cache.sync()
+        filters = {}
+        if condition:
+            match = FILTER_TERM_PATTERN.match(condition)
+            if match:
+                col, op, val = (part.strip() for part in match.groups())
+                if col in field_manager.get_date_fields() or col not in cache.fields:
+                    return None
+                if op == '=':
+                    filters[col] = val.strip("'\"")
+
+        key = None
+        if field in self.year_fields:
+            field = self.year_fields[field]
+            key = lambda value: int(value[:4]) if value and DATE_TEXT_PATTERN.match(value) else None
+        if field not in cache.fields:
+            return None
+        label = self.field_combo.currentText()
+        results = cache.group_count(field, filters, key)
+        output = f"{label}统计结果（总计{len(results)}类）:\n"
+        for name, count in results:
+            output += f"{name if name else '空值'}: {count}人\n"
+        return output
+
+    def done(self, result):
+        if self.worker and self.worker.isRunning():
+            self.worker.wait()
+        super().done(result)
+
+class QueryStatsDialog(QDialog):
+    """查询诊断：按语句形态汇总的执行统计、执行计划与最近的慢查询"""
+    COLUMNS = ["语句", "次数", "总耗时(ms)", "平均(ms)", "最大(ms)", "行数", "慢查询", "全表扫描"]
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.setWindowTitle("查询诊断")
+        self.setup_ui()
+        self.refresh()
+
+    def setup_ui(self):
+        layout = QVBoxLayout(self)
+
+        threshold_layout = QHBoxLayout()
+        threshold_layout.addWidget(QLabel("慢查询阈值:"))
+        self.threshold_spin = SmartSpinBox(1, 60000, " ms")
+        self.threshold_spin.setValue(query_profiler.threshold_ms)
+        self.threshold_spin.valueChanged.connect(self.change_threshold)
+        threshold_layout.addWidget(self.threshold_spin)
+        threshold_layout.addStretch()
+        layout.addLayout(threshold_layout)
+
+        self.table = QTableWidget(0, len(self.COLUMNS))
+        self.table.setHorizontalHeaderLabels(self.COLUMNS)
+        self.table.setEditTriggers(QAbstractItemView.NoEditTriggers)
+        self.table.setSelectionBehavior(QAbstractItemView.SelectRows)
+        self.table.setSelectionMode(QAbstractItemView.SingleSelection)
+        self.table.horizontalHeader().setSectionResizeMode(0, QHeaderView.Stretch)
+        self.table.itemSelectionChanged.connect(self.show_plan)
+        layout.addWidget(self.table, 3)
+
+        layout.addWidget(QLabel("执行计划:"))
+        self.plan_view = QTextEdit()
+        self.plan_view.setReadOnly(True)
+        layout.addWidget(self.plan_view, 1)
+
+        layout.addWidget(QLabel("最近的慢查询:"))
+        self.slow_view = QTextEdit()
+        self.slow_view.setReadOnly(True)
+        layout.addWidget(self.slow_view, 1)
+
+        btn_layout = QHBoxLayout()
+        for text, handler in (("刷新", self.refresh), ("清空", self.clear), ("导出JSON", self.export_json)):
+            button = QPushButton(text)
+            button.clicked.connect(handler)
+            btn_layout.addWidget(button)
+        layout.addLayout(btn_layout)
+        self.resize(1000, 700)
+
+    def refresh(self):
+        self.shapes, slow = query_profiler.summary()
+        self.table.setSortingEnabled(False)
+        self.table.setRowCount(len(self.shapes))
+        for row, stats in enumerate(self.shapes):
+            values = [stats['sql'], stats['count'], stats['total'], stats['avg'], stats['max'],
+                      stats['rows'], stats['slow'], "是" if stats['full_scan'] else ""]
+            for col, value in enumerate(values):
+                item = QTableWidgetItem()
+                item.setData(Qt.DisplayRole, value)
+                if col == 0:
+                    item.setData(Qt.UserRole, row)
+                    item.setToolTip(stats['sql'])
+                if stats['full_scan']:
+                    item.setForeground(QColor("#c62828"))
+                self.table.setItem(row, col, item)
+        self.table.setSortingEnabled(True)
+        self.plan_view.clear()
+        self.slow_view.setPlainText("\n\n".join(
+            f"[{entry['time']}] {entry['ms']}ms  {entry['sql']}\n{entry['plan'] or ''}"
+            for entry in reversed(slow)
+        ))
+
+    def show_plan(self):
+        items = self.table.selectedItems()
+        if not items:
+            return
+        stats = self.shapes[self.table.item(items[0].row(), 0).data(Qt.UserRole)]
+        self.plan_view.setPlainText(stats['plan'] or "（该语句没有执行计划）")
+
+    def change_threshold(self, value):
+        query_profiler.set_threshold(value)
+        QSettings("MyCompany", "ArchiveManager").setValue("slowQueryMs", value)
+
+    def clear(self):
+        query_profiler.reset()
+        self.refresh()
+
+    def export_json(self):
+        default_name = f"查询统计_{datetime.now().strftime('%Y%m%d_%H%M')}.json"
+        path, _ = QFileDialog.getSaveFileName(
+            self, "导出查询统计", os.path.join(os.path.expanduser("~"), default_name), "JSON文件 (*.json)"
+        )
+        if not path:
+            return
+        try:
+            query_profiler.dump(path)
+            QMessageBox.information(self, "成功", f"查询统计已导出到：\n{path}")
+        except OSError as e:
+            QMessageBox.critical(self, "错误", f"导出失败: {str(e)}")
 
 class SmartSpinBox(QSpinBox):
     def __init__(self, min_value, max_value, suffix="", parent=None):
@@ -1128,18 +5093,10 @@ class SimpleTemplateDialog(QDialog):
             if not ids:
                 return []
                 
-            db_path = get_db_path()
             logger.debug(f"从数据库获取人员数据，ID列表: {ids}")
-            
-            with sqlite3.connect(db_path) as conn:
-                conn.row_factory = sqlite3.Row
-                cursor = conn.cursor()
-                placeholders = ','.join(['?'] * len(ids))
-                query = f"SELECT * FROM personnel WHERE 身份证号 IN ({placeholders})"
-                cursor.execute(query, ids)
-                results = [dict(row) for row in cursor.fetchall()]
-                logger.debug(f"从数据库获取到 {len(results)} 条记录")
-                return results
+            results = PersonnelRepository().fetch_by_ids(ids)
+            logger.debug(f"从数据库获取到 {len(results)} 条记录")
+            return results
         except Exception as e:
             logger.error(f"数据库查询失败: {str(e)}")
             QMessageBox.critical(self, "数据库错误", f"查询失败: {str(e)}")
@@ -1449,9 +5406,9 @@ class SimpleTemplateDialog(QDialog):
                 # 第二列：带搜索的下拉框
                 combo = QComboBox()
                 combo.setEditable(True)
-                completer = QCompleter(field_manager.get_field_names())
+                completer = QCompleter(field_manager.get_template_field_names())
                 combo.setCompleter(completer)
-                combo.addItems([""] + field_manager.get_field_names())
+                combo.addItems([""] + field_manager.get_template_field_names())
                 
                 # 设置当前映射
                 if mappings and clean_field in mappings:
@@ -1502,18 +5459,8 @@ class SimpleTemplateDialog(QDialog):
 
     def get_example_data(self):
         """获取示例数据（增强健壮性）"""
-        try:
-            # 尝试获取人员数据
-            main_window = self.parent()
-            if hasattr(main_window, 'get_personnel_data'):
-                personnel_data = main_window.get_personnel_data([])
-                if personnel_data:
-                    return personnel_data[0]
-        except:
-            pass
-        
         # 默认示例数据
-        return {
+        example = {
             "姓名": "张三",
             "身份证号": "110101199003077654",
             "参加工作时间": "2010-08-01",
@@ -1522,6 +5469,20 @@ class SimpleTemplateDialog(QDialog):
             "一级单位": "办公室",
             "二级单位": "人事科"
         }
+        try:
+            # 摘要字段取自列式缓存中的第一条人员记录，不再查询数据库
+            cache = getattr(self.parent(), 'column_cache', None)
+            record = cache.first_record() if cache is not None else None
+            if record:
+                example.update({name: value for name, value in record.items() if value not in (None, '')})
+            today = datetime.now().date()
+            for label, source in field_manager.get_derived_fields().items():
+                years = years_since(example.get(source), today)
+                if years is not None:
+                    example[label] = str(years)
+        except Exception as e:
+            logger.warning(f"读取示例数据失败: {str(e)}")
+        return example
 
     def on_template_selected(self, index):
         """当用户选择模板时更新界面并记录选择"""
@@ -1566,7 +5527,7 @@ class SimpleTemplateDialog(QDialog):
     def auto_map_fields(self):
         """自动匹配相似字段"""
         template_fields = self.get_template_fields()
-        system_fields = field_manager.get_field_names()
+        system_fields = field_manager.get_template_field_names()
         
         for tpl_field in template_fields:
             clean_tpl = re.sub(r"[{}$]", "", tpl_field).strip()
@@ -1953,61 +5914,701 @@ class TemplateTypeComboBox(QComboBox):
         }
         
         try:
-            if not os.path.exists(config_path):
-                os.makedirs(os.path.dirname(config_path), exist_ok=True)
-                with open(config_path, 'w', encoding='utf-8') as f:
-                    json.dump(default_config, f, indent=2, ensure_ascii=False)
-            
-            with open(config_path, 'r', encoding='utf-8') as f:
-                self.categories = json.load(f)
-            self.refresh()
+            if not os.path.exists(config_path):
+                os.makedirs(os.path.dirname(config_path), exist_ok=True)
+                with open(config_path, 'w', encoding='utf-8') as f:
+                    json.dump(default_config, f, indent=2, ensure_ascii=False)
+            
+            with open(config_path, 'r', encoding='utf-8') as f:
+                self.categories = json.load(f)
+            self.refresh()
+        except Exception as e:
+            logger.error(f"加载模板配置失败: {str(e)}")
+            self.categories = default_config  # 使用默认配置
+
+    def refresh(self):
+        """刷新模板列表"""
+        self.clear()
+        for cat, props in self.categories.items():
+            self.addItem(QIcon(props['icon']), cat)
+            for tpl in props['templates']:
+                self.addItem(f"    {tpl['name']}", tpl['config'])
+
+class FieldMappingTable(QTableWidget):
+    """增强型字段映射表"""
+    def __init__(self):
+        super().__init__(0, 3)
+        self.setHorizontalHeaderLabels(["模板字段", "映射字段", "示例值"])
+        self.setDragDropMode(QAbstractItemView.DropOnly)
+        self.setup_validation()
+
+    def setup_validation(self):
+        """设置字段验证规则"""
+        delegate = FieldMappingDelegate()
+        self.setItemDelegateForColumn(1, delegate)
+
+    def dropEvent(self, event):
+        """处理字段拖放"""
+        source = event.source()
+        if isinstance(source, FieldListWidget):
+            item = source.currentItem()
+            row = self.rowCount()
+            self.insertRow(row)
+            self.setItem(row, 0, QTableWidgetItem(item.text()))
+            combo = QComboBox()
+            combo.addItems(field_manager.get_template_field_names())
+            self.setCellWidget(row, 1, combo)
+            self.setItem(row, 2, QTableWidgetItem("示例值"))
+
+class FieldMappingDelegate(QStyledItemDelegate):
+    """字段映射验证委托"""
+    def createEditor(self, parent, option, index):
+        editor = QComboBox(parent)
+        editor.addItems([""] + field_manager.get_template_field_names())
+        return editor
+
+
+# ======================= 修改 ArchiveManager 类 =======================
+class AttachmentDialog(QDialog):
+    """人员的电子档案附件：缩略图浏览、添加、打开、另存与删除"""
+
+    def __init__(self, parent=None, person_id=None, title="", db_path=None):
+        super().__init__(parent)
+        self.person_id = person_id
+        self.db_path = db_path or get_db_path()
+        self.store = AttachmentStore(self.db_path)
+        self.thumbnail_worker = None
+        self.setWindowTitle(f"电子档案 - {title}" if title else "电子档案")
+        self.resize(760, 520)
+        self.init_ui()
+        self.load_attachments()
+
+    def init_ui(self):
+        layout = QVBoxLayout(self)
+        self.list_widget = QListWidget()
+        self.list_widget.setViewMode(QListWidget.IconMode)
+        self.list_widget.setIconSize(QSize(*ATTACHMENT_THUMBNAIL_SIZE))
+        self.list_widget.setResizeMode(QListWidget.Adjust)
+        self.list_widget.setSelectionMode(QAbstractItemView.ExtendedSelection)
+        self.list_widget.setWordWrap(True)
+        self.list_widget.itemDoubleClicked.connect(lambda _: self.open_selected())
+        layout.addWidget(self.list_widget)
+
+        btn_layout = QHBoxLayout()
+        for text, handler in (
+            ("添加文件", self.add_files),
+            ("收录字段中的文件", self.adopt_linked_files),
+            ("打开", self.open_selected),
+            ("另存为", self.save_selected),
+            ("删除", self.remove_selected),
+        ):
+            button = QPushButton(text)
+            button.clicked.connect(handler)
+            btn_layout.addWidget(button)
+        layout.addLayout(btn_layout)
+
+    def load_attachments(self):
+        """列出附件，先显示通用图标，缩略图在后台生成后逐个替换"""
+        self.stop_thumbnails()
+        self.list_widget.clear()
+        self.items = {}
+        placeholder = self.style().standardIcon(QStyle.SP_FileIcon)
+        for attachment in self.store.attachments(self.person_id):
+            item = QListWidgetItem(
+                placeholder, f"{attachment['file_name']}\n{attachment['size'] / 1024:.0f} KB"
+            )
+            item.setData(Qt.UserRole, attachment)
+            item.setToolTip(f"{attachment['file_name']}\n添加时间: {attachment['added_at']}")
+            self.list_widget.addItem(item)
+            self.items.setdefault(attachment['sha256'], []).append(item)
+        if self.items:
+            self.thumbnail_worker = ThumbnailWorker(self.store, list(self.items), self)
+            self.thumbnail_worker.ready.connect(self.on_thumbnail_ready)
+            self.thumbnail_worker.start()
+
+    def on_thumbnail_ready(self, digest, path):
+        if not path:
+            return
+        icon = QIcon(path)
+        for item in self.items.get(digest, []):
+            item.setIcon(icon)
+
+    def stop_thumbnails(self):
+        if self.thumbnail_worker and self.thumbnail_worker.isRunning():
+            self.thumbnail_worker.stop()
+            self.thumbnail_worker.wait()
+        self.thumbnail_worker = None
+
+    def selected_attachments(self):
+        return [item.data(Qt.UserRole) for item in self.list_widget.selectedItems()]
+
+    def add_paths(self, paths):
+        """逐个写入附件库，文件较大时显示进度"""
+        progress = QProgressDialog("正在添加附件...", "取消", 0, len(paths), self)
+        progress.setWindowModality(Qt.WindowModal)
+        progress.setMinimumDuration(500)
+        failed = []
+        for index, path in enumerate(paths):
+            if progress.wasCanceled():
+                break
+            progress.setValue(index)
+            QApplication.processEvents()
+            try:
+                self.store.add(self.person_id, path)
+            except OSError as e:
+                logger.error(f"添加附件失败: {str(e)}")
+                failed.append(f"{os.path.basename(path)}: {str(e)}")
+        progress.close()
+        self.load_attachments()
+        if failed:
+            QMessageBox.warning(self, "部分文件未添加", "\n".join(failed))
+
+    def add_files(self):
+        paths, _ = QFileDialog.getOpenFileNames(
+            self, "选择电子档案文件", "", "档案文件 (*.pdf *.jpg *.jpeg *.png *.tif *.tiff *.bmp);;所有文件 (*)"
+        )
+        if paths:
+            self.add_paths(paths)
+
+    def adopt_linked_files(self):
+        """将“电子档案”字段中记录的本地文件路径（分号或换行分隔）收录到附件库"""
+        record = PersonnelRepository(self.db_path).fetch_record(self.person_id) or {}
+        value = record.get('电子档案') or ''
+        paths = [part.strip().strip('"') for part in re.split(r'[;\n；]', value) if part.strip()]
+        existing = [path for path in paths if os.path.isfile(path)]
+        if not existing:
+            QMessageBox.information(self, "提示", "“电子档案”字段中没有可收录的本地文件")
+            return
+        self.add_paths(existing)
+
+    def open_selected(self):
+        """导出到临时目录后用系统默认程序打开"""
+        for attachment in self.selected_attachments()[:5]:
+            try:
+                temp_dir = tempfile.mkdtemp(prefix="attachment_")
+                path = self.store.export(attachment['sha256'], os.path.join(temp_dir, attachment['file_name']))
+                QDesktopServices.openUrl(QUrl.fromLocalFile(path))
+            except (OSError, ValueError) as e:
+                QMessageBox.critical(self, "错误", f"打开失败: {str(e)}")
+
+    def save_selected(self):
+        attachments = self.selected_attachments()
+        if not attachments:
+            return
+        if len(attachments) == 1:
+            dest, _ = QFileDialog.getSaveFileName(self, "另存为", attachments[0]['file_name'])
+            targets = [(attachments[0], dest)] if dest else []
+        else:
+            folder = QFileDialog.getExistingDirectory(self, "选择保存目录")
+            targets = [(a, os.path.join(folder, a['file_name'])) for a in attachments] if folder else []
+        try:
+            for attachment, dest in targets:
+                self.store.export(attachment['sha256'], dest)
+        except (OSError, ValueError) as e:
+            QMessageBox.critical(self, "错误", f"保存失败: {str(e)}")
+
+    def remove_selected(self):
+        attachments = self.selected_attachments()
+        if not attachments:
+            return
+        reply = QMessageBox.question(
+            self, "确认删除", f"确定删除选中的 {len(attachments)} 个附件吗？",
+            QMessageBox.Yes | QMessageBox.No
+        )
+        if reply != QMessageBox.Yes:
+            return
+        self.stop_thumbnails()
+        for attachment in attachments:
+            self.store.remove(attachment['id'])
+        self.load_attachments()
+
+    def done(self, result):
+        self.stop_thumbnails()
+        super().done(result)
+
+class RecycleBinDialog(QDialog):
+    """回收站：列出已删除的人员，可恢复或彻底删除"""
+    COLUMNS = ('姓名', '身份证号', '一级单位', '二级单位')
+
+    def __init__(self, parent=None, db_path=None):
+        super().__init__(parent)
+        self.repo = PersonnelRepository(db_path)
+        self.columns = [name for name in self.COLUMNS if name in field_manager.get_summary_fields()]
+        self.setWindowTitle("回收站")
+        self.setup_ui()
+        self.load_records()
+
+    def setup_ui(self):
+        layout = QVBoxLayout(self)
+        layout.addWidget(QLabel(f"删除的记录保留 {RECYCLE_RETENTION_DAYS} 天，过期后自动彻底删除"))
+        self.table = QTableWidget(0, len(self.columns) + 1)
+        self.table.setHorizontalHeaderLabels(["删除时间"] + self.columns)
+        self.table.setEditTriggers(QAbstractItemView.NoEditTriggers)
+        self.table.setSelectionBehavior(QAbstractItemView.SelectRows)
+        self.table.setSelectionMode(QAbstractItemView.ExtendedSelection)
+        layout.addWidget(self.table)
+
+        btn_layout = QHBoxLayout()
+        for text, handler in (("恢复", self.restore_selected), ("彻底删除", self.purge_selected),
+                              ("清空回收站", self.purge_all)):
+            button = QPushButton(text)
+            button.clicked.connect(handler)
+            btn_layout.addWidget(button)
+        layout.addLayout(btn_layout)
+        self.resize(800, 500)
+
+    def load_records(self):
+        records = self.repo.fetch_deleted(self.columns)
+        self.table.setRowCount(len(records))
+        for row, (row_id, deleted_at, *values) in enumerate(records):
+            for col, value in enumerate([deleted_at] + values):
+                item = QTableWidgetItem("" if value is None else str(value))
+                if col == 0:
+                    item.setData(Qt.UserRole, row_id)
+                self.table.setItem(row, col, item)
+        self.table.resizeColumnsToContents()
+
+    def selected_ids(self):
+        rows = sorted({index.row() for index in self.table.selectedIndexes()})
+        return [self.table.item(row, 0).data(Qt.UserRole) for row in rows]
+
+    def restore_selected(self):
+        row_ids = self.selected_ids()
+        if not row_ids:
+            QMessageBox.warning(self, "警告", "请先选择要恢复的记录")
+            return
+        count = self.repo.restore(row_ids)
+        self.load_records()
+        QMessageBox.information(self, "成功", f"已恢复 {count} 条记录")
+
+    def purge_selected(self):
+        row_ids = self.selected_ids()
+        if not row_ids:
+            QMessageBox.warning(self, "警告", "请先选择要彻底删除的记录")
+            return
+        self._purge(row_ids, f"确定彻底删除这 {len(row_ids)} 条记录吗？此操作无法撤销。")
+
+    def purge_all(self):
+        if self.table.rowCount():
+            self._purge(None, "确定清空回收站吗？此操作无法撤销。")
+
+    def _purge(self, row_ids, message):
+        if QMessageBox.question(self, "确认", message, QMessageBox.Yes | QMessageBox.No) != QMessageBox.Yes:
+            return
+        count = self.repo.purge(row_ids)
+        self.load_records()
+        QMessageBox.information(self, "成功", f"已彻底删除 {count} 条记录")
+
+class DuplicateDialog(QDialog):
+    """疑似重复人员：后台检测后列出合并建议，可保留其中一条合并另一条，或标记为不是重复"""
+    COLUMNS = ("得分", "依据", "人员A", "人员B")
+    SUMMARY = ('姓名', '身份证号', '档案编号', '出生日期', '一级单位', '二级单位')
+
+    def __init__(self, parent=None, db_path=None):
+        super().__init__(parent)
+        self.db_path = db_path
+        self.repo = PersonnelRepository(db_path)
+        self.worker = None
+        self.results = []
+        self.setWindowTitle("查重")
+        self.setup_ui()
+
+    def setup_ui(self):
+        layout = QVBoxLayout(self)
+        top = QHBoxLayout()
+        self.status_label = QLabel("按姓名+出生日期、姓名+单位、身份证号相差一位查找疑似重复人员")
+        top.addWidget(self.status_label, 1)
+        self.btn_run = QPushButton("开始检测")
+        self.btn_run.clicked.connect(self.run_detection)
+        top.addWidget(self.btn_run)
+        layout.addLayout(top)
+        self.progress = QProgressBar()
+        self.progress.setRange(0, 100)
+        layout.addWidget(self.progress)
+
+        self.table = QTableWidget(0, len(self.COLUMNS))
+        self.table.setHorizontalHeaderLabels(self.COLUMNS)
+        self.table.setEditTriggers(QAbstractItemView.NoEditTriggers)
+        self.table.setSelectionBehavior(QAbstractItemView.SelectRows)
+        self.table.setSelectionMode(QAbstractItemView.SingleSelection)
+        self.table.setWordWrap(True)
+        layout.addWidget(self.table)
+
+        btn_layout = QHBoxLayout()
+        for text, handler in (("保留A，合并B", lambda: self.merge_selected(keep_first=True)),
+                              ("保留B，合并A", lambda: self.merge_selected(keep_first=False)),
+                              ("不是重复", self.dismiss_selected)):
+            button = QPushButton(text)
+            button.clicked.connect(handler)
+            btn_layout.addWidget(button)
+        layout.addLayout(btn_layout)
+        self.resize(1000, 600)
+
+    def run_detection(self):
+        if self.worker and self.worker.isRunning():
+            return
+        worker = self.worker = SnapshotWorker(self.db_path, DuplicateDetector().run, self)
+        worker.progress.connect(
+            lambda done, total: self.progress.setValue(int(done * 100 / total) if total else 100)
+        )
+        worker.succeeded.connect(self.show_results)
+        worker.failed.connect(lambda message: QMessageBox.critical(self, "错误", f"查重失败: {message}"))
+        worker.finished.connect(lambda: self.btn_run.setEnabled(True))
+        self.btn_run.setEnabled(False)
+        self.status_label.setText("正在检测...")
+        worker.start()
+
+    def show_results(self, results):
+        self.results = results
+        self.progress.setValue(100)
+        self.status_label.setText(f"共 {len(results)} 条合并建议" if results else "未发现疑似重复的人员")
+        self.table.setRowCount(len(results))
+        for row, (score, reasons, first, second) in enumerate(results):
+            for col, text in enumerate((str(score), "、".join(reasons), self.describe(first), self.describe(second))):
+                self.table.setItem(row, col, QTableWidgetItem(text))
+        self.table.resizeColumnsToContents()
+        self.table.resizeRowsToContents()
+
+    def describe(self, record):
+        return "\n".join(f"{name}: {record[name]}" for name in self.SUMMARY if record.get(name))
+
+    def selected_result(self):
+        row = self.table.currentRow()
+        if row < 0 or row >= len(self.results):
+            QMessageBox.warning(self, "警告", "请先选择一条合并建议")
+            return None
+        return row, self.results[row]
+
+    def remove_results(self, row_ids):
+        """移除涉及已合并（删除）记录的建议"""
+        self.show_results([
+            result for result in self.results
+            if result[2]['id'] not in row_ids and result[3]['id'] not in row_ids
+        ])
+
+    def merge_selected(self, keep_first):
+        selected = self.selected_result()
+        if selected is None:
+            return
+        _, (_, _, first, second) = selected
+        keep, drop = (first, second) if keep_first else (second, first)
+        if QMessageBox.question(
+            self, "确认合并",
+            f"保留 {keep.get('姓名', '')}（{keep.get('身份证号', '')}），"
+            f"将 {drop.get('姓名', '')}（{drop.get('身份证号', '')}）的信息补入后移入回收站？",
+            QMessageBox.Yes | QMessageBox.No
+        ) != QMessageBox.Yes:
+            return
+        try:
+            filled = self.repo.merge(keep['id'], drop['id'])
+        except (ValueError, sqlite3.Error) as e:
+            QMessageBox.critical(self, "错误", f"合并失败: {str(e)}")
+            return
+        self.remove_results({drop['id']})
+        QMessageBox.information(
+            self, "成功",
+            f"已合并，补齐字段：{'、'.join(filled)}" if filled else "已合并，被合并的记录已移入回收站"
+        )
+
+    def dismiss_selected(self):
+        selected = self.selected_result()
+        if selected is None:
+            return
+        row, (_, _, first, second) = selected
+        self.repo.dismiss_duplicate(first['id'], second['id'])
+        self.show_results(self.results[:row] + self.results[row + 1:])
+
+    def done(self, result):
+        if self.worker and self.worker.isRunning():
+            self.worker.cancel()
+            self.worker.wait()
+        super().done(result)
+
+class DataQualityDialog(QDialog):
+    """数据质量：后台校验全部身份证号，按问题汇总并列出问题记录，可导出 Excel"""
+    COLUMNS = ("问题", "姓名", "身份证号", "出生日期")
+
+    def __init__(self, parent=None, db_path=None):
+        super().__init__(parent)
+        self.db_path = db_path
+        self.worker = None
+        self.problems = []
+        self.setWindowTitle("数据质量")
+        self.setup_ui()
+
+    def setup_ui(self):
+        layout = QVBoxLayout(self)
+        top = QHBoxLayout()
+        self.status_label = QLabel("校验全部身份证号的格式、校验码、地区码及与出生日期是否一致")
+        top.addWidget(self.status_label, 1)
+        self.btn_run = QPushButton("开始检查")
+        self.btn_run.clicked.connect(self.run_check)
+        top.addWidget(self.btn_run)
+        self.btn_export = QPushButton("导出")
+        self.btn_export.clicked.connect(self.export_problems)
+        self.btn_export.setEnabled(False)
+        top.addWidget(self.btn_export)
+        layout.addLayout(top)
+        self.progress = QProgressBar()
+        self.progress.setRange(0, 100)
+        layout.addWidget(self.progress)
+        self.table = QTableWidget(0, len(self.COLUMNS))
+        self.table.setHorizontalHeaderLabels(self.COLUMNS)
+        self.table.setEditTriggers(QAbstractItemView.NoEditTriggers)
+        self.table.setSelectionBehavior(QAbstractItemView.SelectRows)
+        layout.addWidget(self.table)
+        self.resize(800, 500)
+
+    def run_check(self):
+        if self.worker and self.worker.isRunning():
+            return
+        worker = self.worker = SnapshotWorker(self.db_path, audit_id_numbers, self)
+        worker.progress.connect(
+            lambda done, total: self.progress.setValue(int(done * 100 / total) if total else 100)
+        )
+        worker.succeeded.connect(self.show_results)
+        worker.failed.connect(lambda message: QMessageBox.critical(self, "错误", f"检查失败: {message}"))
+        worker.finished.connect(lambda: self.btn_run.setEnabled(True))
+        self.btn_run.setEnabled(False)
+        self.status_label.setText("正在检查...")
+        worker.start()
+
+    def show_results(self, result):
+        total, self.problems = result
+        self.progress.setValue(100)
+        counts = {}
+        for code, *_ in self.problems:
+            counts[code] = counts.get(code, 0) + 1
+        text = f"共检查 {total} 条记录，发现 {len(self.problems)} 条问题"
+        if counts:
+            text += "：" + "，".join(f"{ID_PROBLEMS[code]} {count} 条" for code, count in sorted(counts.items()))
+        self.status_label.setText(text)
+        self.table.setRowCount(len(self.problems))
+        for row, (code, _, *values) in enumerate(self.problems):
+            for col, value in enumerate([ID_PROBLEMS[code]] + values):
+                self.table.setItem(row, col, QTableWidgetItem(str(value)))
+        self.table.resizeColumnsToContents()
+        self.btn_export.setEnabled(bool(self.problems))
+
+    def export_problems(self):
+        path, _ = QFileDialog.getSaveFileName(
+            self, "导出问题记录",
+            os.path.join(os.path.expanduser("~"), "Desktop", f"数据质量_{datetime.now().strftime('%Y%m%d_%H%M')}.xlsx"),
+            "Excel文件 (*.xlsx)"
+        )
+        if not path:
+            return
+        try:
+            wb = Workbook(write_only=True)
+            ws = wb.create_sheet("问题记录")
+            ws.append(list(self.COLUMNS))
+            for code, _, *values in self.problems:
+                ws.append([ID_PROBLEMS[code]] + values)
+            wb.save(path)
+            QMessageBox.information(self, "成功", f"已导出到：\n{path}")
         except Exception as e:
-            logger.error(f"加载模板配置失败: {str(e)}")
-            self.categories = default_config  # 使用默认配置
+            QMessageBox.critical(self, "错误", f"导出失败: {str(e)}")
 
-    def refresh(self):
-        """刷新模板列表"""
-        self.clear()
-        for cat, props in self.categories.items():
-            self.addItem(QIcon(props['icon']), cat)
-            for tpl in props['templates']:
-                self.addItem(f"    {tpl['name']}", tpl['config'])
+    def done(self, result):
+        if self.worker and self.worker.isRunning():
+            self.worker.cancel()
+            self.worker.wait()
+        super().done(result)
 
-class FieldMappingTable(QTableWidget):
-    """增强型字段映射表"""
-    def __init__(self):
-        super().__init__(0, 3)
-        self.setHorizontalHeaderLabels(["模板字段", "映射字段", "示例值"])
-        self.setDragDropMode(QAbstractItemView.DropOnly)
-        self.setup_validation()
+class MassEditDialog(QDialog):
+    """批量修改：对选中人员或当前检索结果一次设置/替换若干字段，可撤销最近的批量修改
 
-    def setup_validation(self):
-        """设置字段验证规则"""
-        delegate = FieldMappingDelegate()
-        self.setItemDelegateForColumn(1, delegate)
+    每次执行或撤销后发出 applied(记录 id 列表, 变更日志起始序号, 结束序号)，由主窗口原位刷新表格。
+    """
+    applied = pyqtSignal(list, int, int)
 
-    def dropEvent(self, event):
-        """处理字段拖放"""
-        source = event.source()
-        if isinstance(source, FieldListWidget):
-            item = source.currentItem()
-            row = self.rowCount()
-            self.insertRow(row)
-            self.setItem(row, 0, QTableWidgetItem(item.text()))
-            combo = QComboBox()
-            combo.addItems(field_manager.get_field_names())
-            self.setCellWidget(row, 1, combo)
-            self.setItem(row, 2, QTableWidgetItem("示例值"))
+    def __init__(self, parent=None, db_path=None, ids=None, keyword=None):
+        super().__init__(parent)
+        self.repo = PersonnelRepository(db_path)
+        self.ids = ids or []
+        self.keyword = keyword
+        self.fields = field_manager.get_mass_editable_fields()
+        self.setWindowTitle("批量修改")
+        self.setup_ui()
+        self.add_change_row()
+        self.load_history()
 
-class FieldMappingDelegate(QStyledItemDelegate):
-    """字段映射验证委托"""
-    def createEditor(self, parent, option, index):
-        editor = QComboBox(parent)
-        editor.addItems([""] + field_manager.get_field_names())
-        return editor
+    def setup_ui(self):
+        layout = QVBoxLayout(self)
 
+        scope_group = QGroupBox("修改范围")
+        scope_layout = QHBoxLayout(scope_group)
+        self.scope_selected = QRadioButton(f"选中的 {len(self.ids)} 人")
+        self.scope_search = QRadioButton(
+            f"当前检索结果（{self.keyword}）" if self.keyword else "全部记录"
+        )
+        self.scope_selected.setEnabled(bool(self.ids))
+        (self.scope_selected if self.ids else self.scope_search).setChecked(True)
+        self.scope_selected.toggled.connect(self.clear_preview)
+        scope_layout.addWidget(self.scope_selected)
+        scope_layout.addWidget(self.scope_search)
+        scope_layout.addStretch()
+        layout.addWidget(scope_group)
+
+        self.change_table = QTableWidget(0, 4)
+        self.change_table.setHorizontalHeaderLabels(["字段", "操作", "查找文本", "新值"])
+        self.change_table.horizontalHeader().setStretchLastSection(True)
+        layout.addWidget(self.change_table)
+
+        btn_layout = QHBoxLayout()
+        btn_add = QPushButton("添加一项")
+        btn_add.clicked.connect(self.add_change_row)
+        btn_remove = QPushButton("删除一项")
+        btn_remove.clicked.connect(self.remove_change_row)
+        btn_preview = QPushButton("预览")
+        btn_preview.clicked.connect(self.preview)
+        self.btn_apply = QPushButton("执行修改")
+        self.btn_apply.clicked.connect(self.run_mass_edit)
+        self.preview_label = QLabel("")
+        btn_layout.addWidget(btn_add)
+        btn_layout.addWidget(btn_remove)
+        btn_layout.addWidget(self.preview_label, 1)
+        btn_layout.addWidget(btn_preview)
+        btn_layout.addWidget(self.btn_apply)
+        layout.addLayout(btn_layout)
+
+        history_group = QGroupBox(f"最近的批量修改（保留 {MASS_EDIT_HISTORY} 批）")
+        history_layout = QVBoxLayout(history_group)
+        self.history_table = QTableWidget(0, 4)
+        self.history_table.setHorizontalHeaderLabels(["时间", "说明", "人数", "状态"])
+        self.history_table.setEditTriggers(QAbstractItemView.NoEditTriggers)
+        self.history_table.setSelectionBehavior(QAbstractItemView.SelectRows)
+        self.history_table.setSelectionMode(QAbstractItemView.SingleSelection)
+        history_layout.addWidget(self.history_table)
+        btn_undo = QPushButton("撤销所选")
+        btn_undo.clicked.connect(self.undo_selected)
+        history_layout.addWidget(btn_undo, 0, Qt.AlignRight)
+        layout.addWidget(history_group)
+        self.resize(900, 600)
+
+    # ---------- 修改项 ----------
+    def add_change_row(self):
+        row = self.change_table.rowCount()
+        self.change_table.insertRow(row)
+        field_combo = QComboBox()
+        field_combo.addItems(self.fields)
+        op_combo = QComboBox()
+        for op, label in MASS_EDIT_OPERATIONS.items():
+            op_combo.addItem(label, op)
+        find_edit = QLineEdit()
+        find_edit.setEnabled(False)
+        op_combo.currentIndexChanged.connect(
+            lambda _, combo=op_combo, edit=find_edit: edit.setEnabled(combo.currentData() == 'replace')
+        )
+        for widget in (field_combo, op_combo):
+            widget.currentIndexChanged.connect(self.clear_preview)
+        self.change_table.setCellWidget(row, 0, field_combo)
+        self.change_table.setCellWidget(row, 1, op_combo)
+        self.change_table.setCellWidget(row, 2, find_edit)
+        self.change_table.setCellWidget(row, 3, QLineEdit())
+
+    def remove_change_row(self):
+        row = self.change_table.currentRow()
+        self.change_table.removeRow(row if row >= 0 else self.change_table.rowCount() - 1)
+        self.clear_preview()
+
+    def collect_changes(self):
+        """[(字段, 'set', 新值) | (字段, 'replace', 查找文本, 替换为)]"""
+        changes = []
+        for row in range(self.change_table.rowCount()):
+            field = self.change_table.cellWidget(row, 0).currentText()
+            op = self.change_table.cellWidget(row, 1).currentData()
+            find = self.change_table.cellWidget(row, 2).text()
+            value = self.change_table.cellWidget(row, 3).text().strip()
+            changes.append((field, op, find, value) if op == 'replace' else (field, op, value))
+        return changes
+
+    def describe(self, changes):
+        parts = []
+        for field, op, *args in changes:
+            if op == 'replace':
+                parts.append(f"{field}中的“{args[0]}”替换为“{args[1]}”")
+            else:
+                parts.append(f"{field}设为“{args[0]}”")
+        scope = f"选中的 {len(self.ids)} 人" if self.scope_selected.isChecked() else (self.keyword or "全部记录")
+        return f"{'；'.join(parts)}（{scope}）"
+
+    def scope(self):
+        if self.scope_selected.isChecked():
+            return {'ids': self.ids}
+        return {'keyword': self.keyword}
+
+    def clear_preview(self):
+        self.preview_label.setText("")
+
+    def preview(self):
+        try:
+            count = self.repo.count_mass_update(self.collect_changes(), **self.scope())
+            self.preview_label.setText(f"将修改 {count} 条记录")
+            return count
+        except ValueError as e:
+            QMessageBox.warning(self, "警告", str(e))
+            return None
+
+    def run_mass_edit(self):
+        changes = self.collect_changes()
+        count = self.preview()
+        if count is None:
+            return
+        if not count:
+            QMessageBox.information(self, "提示", "没有需要修改的记录")
+            return
+        description = self.describe(changes)
+        if QMessageBox.question(
+            self, "确认批量修改", f"{description}\n\n将修改 {count} 条记录，可在下方撤销。是否继续？",
+            QMessageBox.Yes | QMessageBox.No
+        ) != QMessageBox.Yes:
+            return
+        try:
+            result = self.repo.mass_update(changes, description, **self.scope())
+        except (ValueError, sqlite3.Error) as e:
+            logger.error(f"批量修改失败: {str(e)}")
+            QMessageBox.critical(self, "错误", f"批量修改失败: {str(e)}")
+            return
+        if result:
+            _, row_ids, (first_seq, last_seq) = result
+            self.applied.emit(row_ids, first_seq, last_seq)
+            self.preview_label.setText(f"已修改 {len(row_ids)} 条记录")
+        self.load_history()
+
+    # ---------- 撤销 ----------
+    def load_history(self):
+        self.history = self.repo.mass_edit_history()
+        self.history_table.setRowCount(len(self.history))
+        for row, (_, created_at, description, row_count, undone_at) in enumerate(self.history):
+            status = f"已于 {undone_at} 撤销" if undone_at else ""
+            for col, value in enumerate([created_at, description, row_count, status]):
+                self.history_table.setItem(row, col, QTableWidgetItem(str(value)))
+        self.history_table.resizeColumnsToContents()
+
+    def undo_selected(self):
+        row = self.history_table.currentRow()
+        if row < 0:
+            QMessageBox.warning(self, "警告", "请先选择要撤销的批量修改")
+            return
+        edit_id, _, description, row_count, _ = self.history[row]
+        if QMessageBox.question(
+            self, "确认撤销", f"撤销“{description}”，恢复 {row_count} 条记录修改前的值？",
+            QMessageBox.Yes | QMessageBox.No
+        ) != QMessageBox.Yes:
+            return
+        try:
+            row_ids, skipped, (first_seq, last_seq) = self.repo.undo_mass_edit(edit_id)
+        except (ValueError, sqlite3.Error) as e:
+            QMessageBox.critical(self, "错误", f"撤销失败: {str(e)}")
+            return
+        self.applied.emit(row_ids, first_seq, last_seq)
+        message = f"已恢复 {len(row_ids)} 条记录"
+        if skipped:
+            message += f"，{skipped} 条在批量修改后又被修改或已彻底删除，未恢复"
+        QMessageBox.information(self, "成功", message)
+        self.load_history()
 
-# ======================= 修改 ArchiveManager 类 =======================
 class ArchiveManager(QMainWindow):
     def __init__(self):
         super().__init__()
@@ -2028,6 +6629,25 @@ class ArchiveManager(QMainWindow):
             # 在初始化UI之前初始化数据库
             init_database()
             self.db_path = get_db_path()
+
+            # 数据变更（包括其他程序实例的写入）通过变更日志增量刷新表格
+            self.change_monitor = ChangeMonitor(self.db_path, self)
+            self.change_monitor.rows_changed.connect(self.apply_changes)
+            self.change_monitor.reload_required.connect(self.reload_page_query)
+            # 字段配置（fields.json）变化后就地迁移表结构并刷新表格，无需重启
+            self.field_watcher = FieldConfigWatcher(field_manager.config_path(), self)
+            self.field_watcher.changed.connect(self.apply_field_config)
+            # 空闲时分步清理回收站过期记录并回收空闲页
+            self.compactor = Compactor(self.db_path, self)
+            # 跨日后滚动更新年龄、工龄、党龄（启动时已在 init_database 中更新）
+            self.rollover_timer = QTimer(self)
+            self.rollover_timer.timeout.connect(self.roll_derived_columns)
+            self.rollover_timer.start(DERIVED_ROLLOVER_INTERVAL)
+            # 摘要字段的列式缓存（首次使用时载入），用于无索引字段的排序、统计与示例数据
+            settings = QSettings("MyCompany", "ArchiveManager")
+            self.column_cache = (
+                ColumnarCache(self.db_path) if settings.value("columnCache", True, type=bool) else None
+            )
             
             # 先恢复状态（会调用init_ui）
             self.restore_state()  # ✅ 关键修改：先恢复状态再加载数据
@@ -2127,7 +6747,7 @@ class ArchiveManager(QMainWindow):
         
         search_input_layout = QHBoxLayout()
         self.search_input = QLineEdit()
-        self.search_input.setPlaceholderText("输入关键字（姓名、身份证号、单位，空格分隔）")
+        self.search_input.setPlaceholderText("输入关键字（姓名、身份证号、单位或拼音，空格分隔；支持 字段=值、出生日期=1970~1979、年龄>=50）")
         # 设置搜索框本身的样式表
         self.search_input.setStyleSheet("""
             QLineEdit {
@@ -2177,8 +6797,9 @@ class ArchiveManager(QMainWindow):
 
         # 数据表格
         self.table = QTableWidget()
-        self.table.setColumnCount(len(field_manager.fields) + 1)
-        headers = ["选择"] + field_manager.get_field_names()
+        grid_fields = field_manager.get_summary_fields()  # 明细字段不在主表格中显示
+        self.table.setColumnCount(len(grid_fields) + 1)
+        headers = ["选择"] + grid_fields
         self.table.setHorizontalHeaderLabels(headers)
         
         # 增大表格字体
@@ -2201,6 +6822,7 @@ class ArchiveManager(QMainWindow):
         
         self.table.setContextMenuPolicy(Qt.CustomContextMenu)
         self.table.customContextMenuRequested.connect(self.show_context_menu)
+        self.table.verticalScrollBar().valueChanged.connect(self.on_table_scrolled)
         
         main_layout.addWidget(self.table, 1)
 
@@ -2222,6 +6844,11 @@ class ArchiveManager(QMainWindow):
         self.sort_btn = self.create_button("排序", "#sortBtn", self.open_sort_dialog)
         self.field_mgr_btn = self.create_button("字段管理", "#fieldMgrBtn", self.open_field_manager)
         self.backup_btn = self.create_button("备份", "#backupBtn", self.backup_database)
+        self.restore_btn = self.create_button("恢复", "#restoreBtn", self.restore_database)
+        self.recycle_btn = self.create_button("回收站", "#recycleBtn", self.open_recycle_bin)
+        self.duplicate_btn = self.create_button("查重", "#duplicateBtn", self.open_duplicates)
+        self.quality_btn = self.create_button("数据质量", "#qualityBtn", self.open_data_quality)
+        self.mass_edit_btn = self.create_button("批量修改", "#massEditBtn", self.open_mass_edit)
         
         btn_layout.addWidget(self.add_btn)
         btn_layout.addWidget(self.delete_btn)
@@ -2233,6 +6860,11 @@ class ArchiveManager(QMainWindow):
         btn_layout.addWidget(self.advanced_template_btn)
         btn_layout.addWidget(self.field_mgr_btn)
         btn_layout.addWidget(self.backup_btn)
+        btn_layout.addWidget(self.restore_btn)
+        btn_layout.addWidget(self.recycle_btn)
+        btn_layout.addWidget(self.duplicate_btn)
+        btn_layout.addWidget(self.quality_btn)
+        btn_layout.addWidget(self.mass_edit_btn)
         
         main_layout.addWidget(btn_group)
         self.last_sorted = ""  # 确保属性存在
@@ -2240,6 +6872,11 @@ class ArchiveManager(QMainWindow):
 
         self.load_data()
         
+        query_stats_action = QAction("查询诊断", self)
+        query_stats_action.setShortcut("Ctrl+Shift+Q")
+        query_stats_action.triggered.connect(self.open_query_stats)
+        self.addAction(query_stats_action)
+
         self.status_bar = self.statusBar()
         self.status_bar.showMessage("就绪", 5000)
 
@@ -2337,6 +6974,31 @@ class ArchiveManager(QMainWindow):
                 color: white;
                 font-size: 20px; /* +++ 增大按钮字体 +++ */
             }
+            #restoreBtn {
+                background-color: #795548;
+                color: white;
+                font-size: 20px; /* +++ 增大按钮字体 +++ */
+            }
+            #recycleBtn {
+                background-color: #8D6E63;
+                color: white;
+                font-size: 20px; /* +++ 增大按钮字体 +++ */
+            }
+            #duplicateBtn {
+                background-color: #5C6BC0;
+                color: white;
+                font-size: 20px; /* +++ 增大按钮字体 +++ */
+            }
+            #qualityBtn {
+                background-color: #26A69A;
+                color: white;
+                font-size: 20px; /* +++ 增大按钮字体 +++ */
+            }
+            #massEditBtn {
+                background-color: #8D6E63;
+                color: white;
+                font-size: 20px; /* +++ 增大按钮字体 +++ */
+            }
             #searchBtn {
                 background-color: #03A9F4;
                 color: white;
@@ -2487,9 +7149,9 @@ class ArchiveManager(QMainWindow):
         if hasattr(self, 'advanced_template_dialog') and self.advanced_template_dialog:
             self.advanced_template_dialog.restore_template_state()
         
-    def restore_selection_state(self):
-        """恢复选中行状态（必须在数据加载后调用）"""
-        if not hasattr(self, 'table') or self.table.rowCount() == 0:
+    def restore_selection_state(self, start_row=0):
+        """恢复选中行状态（必须在数据加载后调用，start_row 起为新加载的行）"""
+        if not hasattr(self, 'table') or self.table.rowCount() <= start_row:
             return
             
         try:
@@ -2511,7 +7173,8 @@ class ArchiveManager(QMainWindow):
                 return
                 
             # 遍历表格行，恢复选中状态
-            for row in range(self.table.rowCount()):
+            selected_ids = set(selected_ids)
+            for row in range(start_row, self.table.rowCount()):
                 item = self.table.item(row, id_column)
                 if item and item.text() in selected_ids:
                     chk_widget = self.table.cellWidget(row, 0)
@@ -2533,77 +7196,30 @@ class ArchiveManager(QMainWindow):
                 logger.warning("数据库文件不存在，尝试重新初始化")
                 # +++ 修复：添加全局声明 +++
                 global field_manager
-                init_database(field_manager)  # ✅ 添加 field_manager 参数
+                init_database()
                     
-            with sqlite3.connect(self.db_path) as conn:
-                conn.row_factory = sqlite3.Row
-                cursor = conn.cursor()
-                
-                # 获取当前字段配置
-                fields = field_manager.get_field_names()
-                # 构建字段列表，使用反引号包裹字段名
-                field_list = ', '.join([f'`{field}`' for field in fields])
-                
-                # 构建基础查询
-                query = f"SELECT {field_list} FROM personnel"
-                
-                # 安全添加排序条件
-                if order_by and isinstance(order_by, str):
-                    # 验证并安全处理排序字段
-                    valid_fields = []
-                    for field in order_by.split(','):
-                        field = field.strip()
-                        # 处理DESC后缀
-                        sort_direction = ""
-                        if " DESC" in field:
-                            field = field.replace(" DESC", "")
-                            sort_direction = " DESC"
-                        elif " ASC" in field:
-                            field = field.replace(" ASC", "")
-                            sort_direction = " ASC"
-                        
-                        if field in fields:
-                            valid_fields.append(f"`{field}`{sort_direction}")
+            # 获取当前字段配置（主表格只加载摘要字段，明细字段在打开记录时读取）
+            fields = field_manager.get_summary_fields()
+            
+            # 安全添加排序条件
+            valid_fields = []
+            if order_by and isinstance(order_by, str):
+                # 验证并安全处理排序字段
+                for field in order_by.split(','):
+                    field = field.strip()
+                    # 处理DESC后缀
+                    sort_direction = "ASC"
+                    if " DESC" in field:
+                        field = field.replace(" DESC", "")
+                        sort_direction = "DESC"
+                    elif " ASC" in field:
+                        field = field.replace(" ASC", "")
                     
-                    if valid_fields:
-                        query += " ORDER BY " + ", ".join(valid_fields)
-                
-                logger.debug(f"执行查询: {query}")
-                cursor.execute(query)
-                rows = cursor.fetchall()
-                
-            # 更新表格 - 关键修复
-            self.table.setRowCount(0)
-            self.table.setColumnCount(len(fields) + 1)  # +1 用于复选框列
-            headers = ["选择"] + fields
-            self.table.setHorizontalHeaderLabels(headers)
-            
-            # 设置复选框列宽度
-            self.table.setColumnWidth(0, 50)
-            
-            # 填充数据
-            for row_idx, row_data in enumerate(rows):
-                self.table.insertRow(row_idx)
-                
-                # 添加复选框到第0列 - 关键修复
-                chk_widget = QWidget()
-                chk_layout = QHBoxLayout(chk_widget)
-                chk_layout.setAlignment(Qt.AlignCenter)
-                chk_layout.setContentsMargins(0, 0, 0, 0)
-                checkbox = QCheckBox()
-                chk_layout.addWidget(checkbox)
-                self.table.setCellWidget(row_idx, 0, chk_widget)
-                
-                # 填充数据列 - 关键修复（从第1列开始）
-                for col_idx, value in enumerate(row_data):
-                    item = QTableWidgetItem(str(value))
-                    self.table.setItem(row_idx, col_idx + 1, item)  # +1 跳过复选框列
+                    if field in fields or field in field_manager.get_derived_fields():
+                        valid_fields.append((field, sort_direction))
             
-            # 自动调整列宽
-            self.table.resizeColumnsToContents()
-            
-            # 在数据加载完成后恢复选中状态
-            self.restore_selection_state()
+            # 只加载第一页，其余页在表格滚动到底部时按需读取
+            self.start_paging(fields, order_by=valid_fields)
             
         except Exception as e:
             logger.error(f"加载数据失败: {traceback.format_exc()}")
@@ -2613,6 +7229,170 @@ class ArchiveManager(QMainWindow):
                 "请检查数据库文件是否完整"
             )
 
+    def start_paging(self, fields, keyword=None, order_by=None):
+        """按新的检索/排序条件重置表格并加载第一页"""
+        # 每行首列为记录 id（存于第1列单元格的 UserRole，不显示），用于增量刷新定位
+        self.page_query = {'columns': ['id'] + fields, 'keyword': keyword, 'order_by': order_by}
+        self.page_cursor = None
+        self.page_exhausted = False
+        # 按无索引的字段排序时，每页查询都要在 SQLite 中整表排序；改为在列式缓存中排序一次，
+        # 之后按 id 分段读取各页
+        self.page_order = None
+        if keyword is None and self.use_cache_order(order_by):
+            self.page_order = self.column_cache.sorted_ids(order_by)
+            self.page_offset = 0
+        self.populate_table(fields, [])
+        self.fetch_next_page()
+        self.table.resizeColumnsToContents()
+
+    def fetch_next_page(self):
+        """追加下一页数据（键集游标接续上一页末行）"""
+        if getattr(self, 'page_exhausted', True):
+            return
+        start_row = self.table.rowCount()
+        if self.page_order is not None:
+            page_ids = self.page_order[self.page_offset:self.page_offset + PAGE_SIZE].tolist()
+            self.page_offset += len(page_ids)
+            rows, cursor = PersonnelRepository(self.db_path).fetch_page(
+                row_ids=page_ids or [0], limit=len(page_ids) or 1, **self.page_query
+            )
+            self.page_exhausted = self.page_offset >= len(self.page_order)
+            # 期间有行被删除时本页不足一整页，沿用上一页的游标作为已加载范围
+            if cursor is not None or self.page_exhausted:
+                self.page_cursor = None if self.page_exhausted else cursor
+        else:
+            rows, self.page_cursor = PersonnelRepository(self.db_path).fetch_page(
+                after=self.page_cursor, **self.page_query
+            )
+            self.page_exhausted = self.page_cursor is None
+        self.append_rows(rows)
+        self.restore_selection_state(start_row)
+
+    def roll_derived_columns(self):
+        """定时检查是否已跨日，需要时滚动更新周年数（变化的行经变更日志刷新表格）"""
+        try:
+            refresh_derived_columns(DBManager(self.db_path).get_connection())
+        except sqlite3.OperationalError as e:
+            logger.warning(f"周年数更新失败，稍后重试: {str(e)}")
+
+    def use_cache_order(self, order_by):
+        """首个排序字段没有可用索引（非唯一、非索引首列、非日期字段）时在列式缓存中排序"""
+        if not order_by or self.column_cache is None:
+            return False
+        field = order_by[0][0]
+        unique_fields = {spec['name'] for spec in field_manager.get_column_specs() if spec.get('unique')}
+        return not (
+            field_manager.is_indexed(field)
+            or field in unique_fields
+            or field in field_manager.get_date_fields()
+            or field in field_manager.get_derived_fields()
+        )
+
+    def on_table_scrolled(self, value):
+        """滚动接近底部时加载下一页"""
+        scroll_bar = self.table.verticalScrollBar()
+        if value >= scroll_bar.maximum() - 10 and not getattr(self, 'page_exhausted', True):
+            try:
+                self.fetch_next_page()
+            except Exception as e:
+                self.page_exhausted = True
+                logger.error(f"加载下一页失败: {str(e)}")
+
+    def reload_page_query(self):
+        """按当前检索/排序条件整表重新加载"""
+        if getattr(self, 'page_query', None):
+            columns = self.page_query['columns'][1:]
+            self.start_paging(columns, self.page_query['keyword'], self.page_query['order_by'])
+        else:
+            self.load_data()
+
+    def apply_changes(self, changes):
+        """按变更日志增量更新表格，changes 为 {记录id: 'I'|'U'|'D'}
+
+        删除或不再满足检索条件的行移除；修改的行原位刷新；新增的行插入表格顶部。
+        排序键位于尚未加载的页中的行不在此处理，滚动到相应位置时随分页读入。
+        """
+        if not getattr(self, 'page_query', None):
+            return
+        positions = self.grid_positions()
+        visible = {}
+        live_ids = [row_id for row_id, op in changes.items() if op != 'D']
+        if live_ids:
+            rows, _ = PersonnelRepository(self.db_path).fetch_page(
+                row_ids=live_ids, limit=len(live_ids),
+                until=None if self.page_exhausted else self.page_cursor,
+                **self.page_query
+            )
+            visible = {row[0]: row for row in rows}
+
+        removed = [positions[row_id] for row_id in changes
+                   if row_id in positions and row_id not in visible]
+        for row in sorted(removed, reverse=True):
+            self.table.removeRow(row)
+        if removed:
+            positions = self.grid_positions()
+        for row_id, row_data in visible.items():
+            if row_id in positions:
+                self.update_grid_row(positions[row_id], row_data)
+        for row_id, row_data in visible.items():
+            if row_id not in positions:
+                self.insert_grid_row(0, row_data)
+        logger.debug(f"增量刷新 {len(changes)} 条记录")
+
+    def grid_positions(self):
+        """表格中已加载记录的 {记录id: 行号}"""
+        positions = {}
+        for row in range(self.table.rowCount()):
+            item = self.table.item(row, 1)
+            if item is not None:
+                positions[item.data(Qt.UserRole)] = row
+        return positions
+
+    def populate_table(self, fields, rows):
+        """用查询结果填充表格（第0列为复选框）"""
+        # 更新表格 - 关键修复
+        self.table.setRowCount(0)
+        self.table.setColumnCount(len(fields) + 1)  # +1 用于复选框列
+        headers = ["选择"] + fields
+        self.table.setHorizontalHeaderLabels(headers)
+        
+        # 设置复选框列宽度
+        self.table.setColumnWidth(0, 50)
+        
+        self.append_rows(rows)
+        
+        # 自动调整列宽
+        self.table.resizeColumnsToContents()
+
+    def append_rows(self, rows):
+        """在表格末尾追加数据行（每行首个值为记录 id）"""
+        for row_data in rows:
+            self.insert_grid_row(self.table.rowCount(), row_data)
+
+    def insert_grid_row(self, row_idx, row_data):
+        """在指定位置插入一行"""
+        self.table.insertRow(row_idx)
+        
+        # 添加复选框到第0列 - 关键修复
+        chk_widget = QWidget()
+        chk_layout = QHBoxLayout(chk_widget)
+        chk_layout.setAlignment(Qt.AlignCenter)
+        chk_layout.setContentsMargins(0, 0, 0, 0)
+        checkbox = QCheckBox()
+        chk_layout.addWidget(checkbox)
+        self.table.setCellWidget(row_idx, 0, chk_widget)
+        
+        self.update_grid_row(row_idx, row_data)
+
+    def update_grid_row(self, row_idx, row_data):
+        """填充数据列 - 关键修复（从第1列开始），记录 id 存于第1列的 UserRole"""
+        row_id, values = row_data[0], row_data[1:]
+        for col_idx, value in enumerate(values):
+            item = QTableWidgetItem(str(value))
+            self.table.setItem(row_idx, col_idx + 1, item)  # +1 跳过复选框列
+        first = self.table.item(row_idx, 1)
+        if first is not None:
+            first.setData(Qt.UserRole, row_id)
 
     def get_personnel_data(self, ids=None):
         """根据身份证号列表获取人员数据"""
@@ -2620,13 +7400,7 @@ class ArchiveManager(QMainWindow):
             if not ids or not isinstance(ids, list):
                 return []
             
-            with sqlite3.connect(self.db_path) as conn:
-                conn.row_factory = sqlite3.Row
-                cursor = conn.cursor()
-                placeholders = ','.join(['?'] * len(ids))
-                query = f"SELECT * FROM personnel WHERE 身份证号 IN ({placeholders})"
-                cursor.execute(query, ids)
-                return [dict(row) for row in cursor.fetchall()]
+            return PersonnelRepository(self.db_path).fetch_by_ids(ids)
         except Exception as e:
             logger.error(f"获取人员数据失败: {str(e)}")
             return []
@@ -2664,11 +7438,13 @@ class ArchiveManager(QMainWindow):
             # 只保留删除和导出功能
             delete_action = QAction("删除", self)
             export_action = QAction("导出选中", self)
+            attachment_action = QAction("电子档案", self)
             
             delete_action.triggered.connect(lambda checked, r=row: self.delete_selected_row(r))
             export_action.triggered.connect(self.export_selected)
+            attachment_action.triggered.connect(lambda checked, r=row: self.open_attachments(r))
             
-            menu.addActions([delete_action, export_action])
+            menu.addActions([delete_action, export_action, attachment_action])
             menu.exec_(self.table.mapToGlobal(pos))
         except Exception as e:
             logger.error(f"右键菜单错误: {str(e)}")
@@ -2677,6 +7453,26 @@ class ArchiveManager(QMainWindow):
         """导出当前选中行"""
         self.export_to_excel()        
 
+    def open_attachments(self, row):
+        """打开某行人员的电子档案附件"""
+        try:
+            record = self.load_row_record(row)
+            dialog = AttachmentDialog(
+                self, self.table.item(row, 1).data(Qt.UserRole), record.get('姓名', ''), self.db_path
+            )
+            dialog.exec_()
+        except Exception as e:
+            logger.error(f"打开电子档案失败: {str(e)}")
+            QMessageBox.critical(self, "错误", f"打开电子档案失败: {str(e)}")
+
+    def load_row_record(self, row):
+        """读取表格某行对应的完整记录（明细字段按需从数据库读取）"""
+        item = self.table.item(row, 1)
+        record = PersonnelRepository(self.db_path).fetch_record(item.data(Qt.UserRole)) if item else None
+        if record is None:
+            raise ValueError("记录不存在或已被删除")
+        return {name: value if value is not None else "" for name, value in record.items()}
+
     def edit_selected_row(self, row):
         """修复编辑行逻辑 - 添加安全检查和简化逻辑"""
         try:
@@ -2685,14 +7481,8 @@ class ArchiveManager(QMainWindow):
                 QMessageBox.warning(self, "警告", "请选择有效的行！")
                 return
                 
-            # 收集行数据 - 简化逻辑
-            row_data = {}
-            field_names = field_manager.get_field_names()
-            
-            for col_idx, field_name in enumerate(field_names):
-                # 注意：第0列是复选框，所以数据列从1开始
-                item = self.table.item(row, col_idx + 1)
-                row_data[field_name] = item.text() if item else ""
+            # 从数据库读取完整记录（含主表格未加载的明细字段）
+            row_data = self.load_row_record(row)
                 
             # 创建编辑对话框 - 使用安全方式
             dialog = DynamicFormDialog(self, mode='edit', row_data=row_data)
@@ -2700,8 +7490,8 @@ class ArchiveManager(QMainWindow):
             
             # 安全显示对话框
             if dialog.exec_() == QDialog.Accepted:
-                # 使用延迟刷新避免竞争条件
-                QTimer.singleShot(100, self.load_data)
+                # 表格由变更日志增量刷新
+                self.change_monitor.check_now()
         except Exception as e:
             logger.error(f"编辑行数据失败: {str(e)}")
             QMessageBox.critical(self, "错误", f"打开编辑界面失败: {str(e)}")
@@ -2740,7 +7530,7 @@ class ArchiveManager(QMainWindow):
             if confirm == QMessageBox.Yes:
                 if delete_personnel(self.db_path, [id_number]):
                     self.table.removeRow(row)
-                    QMessageBox.information(self, "成功", "删除成功！")
+                    QMessageBox.information(self, "成功", "已移入回收站，可在回收站中恢复")
                 else:
                     QMessageBox.warning(self, "错误", "数据库删除失败")
         except Exception as e:
@@ -2821,7 +7611,7 @@ class ArchiveManager(QMainWindow):
                     # 倒序删除表格行
                     for row in sorted(selected_rows, reverse=True):
                         self.table.removeRow(row)
-                    QMessageBox.information(self, "成功", "删除成功！")
+                    QMessageBox.information(self, "成功", "已移入回收站，可在回收站中恢复")
                 else:
                     QMessageBox.warning(self, "错误", "数据库删除失败")
         except Exception as e:
@@ -2837,16 +7627,81 @@ class ArchiveManager(QMainWindow):
     def open_field_manager(self):
         try:
             dialog = FieldManagerDialog(self)
-            if dialog.exec_() == QDialog.Accepted:
-                QMessageBox.information(
-                    self, "提示", 
-                    "字段配置已保存！\n程序将退出，请重新启动以应用变更。"
-                )
-                sys.exit(0)  # 强制退出，确保数据库重建
+            if dialog.exec_() == QDialog.Accepted and self.apply_field_config():
+                QMessageBox.information(self, "成功", "字段配置已保存并应用！")
         except Exception as e:
             logger.error(f"打开字段管理失败: {str(e)}")
             QMessageBox.critical(self, "错误", f"配置错误: {str(e)}")
 
+    def apply_field_config(self):
+        """重新读取 fields.json 并就地应用，配置有变化且应用成功时返回 True
+
+        增量迁移表结构（新增列、删除列均不重建表）、作废按字段配置缓存的语句与列式缓存，
+        再按新的摘要字段重新投影表格。配置无效（如文件正在写入）时保持当前配置；
+        迁移失败时恢复原配置，下次启动时再按 fields.json 迁移。
+        """
+        previous = field_manager.fields
+        try:
+            if not field_manager.reload():
+                return False
+        except (OSError, ValueError) as e:
+            logger.warning(f"字段配置无效，保持当前配置: {str(e)}")
+            return False
+
+        started = time.perf_counter()
+        QApplication.setOverrideCursor(Qt.WaitCursor)
+        try:
+            conn = DBManager(self.db_path).get_connection()
+            SchemaMigrator(conn, field_manager, self.db_path).migrate()
+            refresh_derived_columns(conn)
+        except Exception as e:
+            field_manager.fields = previous
+            logger.error(f"应用字段配置失败: {traceback.format_exc()}")
+            QMessageBox.critical(self, "错误", f"应用字段配置失败，已恢复原配置: {str(e)}")
+            return False
+        finally:
+            QApplication.restoreOverrideCursor()
+        logger.info(f"字段配置已应用，用时 {time.perf_counter() - started:.2f} 秒")
+
+        if self.column_cache is not None:
+            self.column_cache.invalidate()
+        self.reproject_grid()
+        return True
+
+    def reproject_grid(self):
+        """按新的摘要字段重新投影表格：已加载的行按 id 重新读取，保留已加载范围与勾选状态
+
+        排序字段已被删除时键集游标失效，按剩余的排序条件重新分页。
+        """
+        query = getattr(self, 'page_query', None)
+        if not query:
+            self.load_data()
+            return
+        fields = field_manager.get_summary_fields()
+        sortable = set(fields) | set(field_manager.get_derived_fields())
+        order_by = list(query['order_by'] or [])
+        if any(field not in sortable for field, _ in order_by):
+            if self.last_sorted not in sortable:
+                self.last_sorted = ""
+            self.start_paging(fields, query['keyword'], [item for item in order_by if item[0] in sortable])
+            return
+
+        query['columns'] = ['id'] + fields
+        self.table.setColumnCount(len(fields) + 1)
+        self.table.setHorizontalHeaderLabels(["选择"] + fields)
+        positions = self.grid_positions()
+        row_ids = list(positions)
+        repo = PersonnelRepository(self.db_path)
+        for start in range(0, len(row_ids), PAGE_SIZE):
+            chunk = row_ids[start:start + PAGE_SIZE]
+            rows, _ = repo.fetch_page(row_ids=chunk, limit=len(chunk), **query)
+            for row_data in rows:
+                self.update_grid_row(positions.pop(row_data[0]), row_data)
+        # 不再满足检索条件的行（如检索条件引用的字段已删除）移除
+        for row in sorted(positions.values(), reverse=True):
+            self.table.removeRow(row)
+        self.table.resizeColumnsToContents()
+
     def open_simple_template(self):
         """打开简单套打对话框（增强版）"""
         try:
@@ -2880,45 +7735,8 @@ class ArchiveManager(QMainWindow):
             return
             
         try:
-            with sqlite3.connect(self.db_path) as conn:
-                cursor = conn.cursor()
-                
-                # 构建动态查询条件
-                conditions = []
-                params = []
-                
-                # 拆分搜索词
-                search_terms = keyword.split()
-                
-                for term in search_terms:
-                    # 检查是否是身份证号部分（数字）
-                    if term.isdigit():
-                        conditions.append("身份证号 LIKE ?")
-                        params.append(f"%{term}%")
-                    else:
-                        # 可能是姓名或单位
-                        conditions.append("(姓名 LIKE ? OR 一级单位 LIKE ? OR 二级单位 LIKE ?)")
-                        params.extend([f"%{term}%", f"%{term}%", f"%{term}%"])
-                
-                where_clause = " AND ".join(conditions)
-                query = f'''
-                    SELECT 档案编号, 姓名, 身份证号, 身份, 籍贯,一级单位, 二级单位, 
-                    出生日期, 参加工作时间, 入党日期, 工作经历, 学历, 
-                    档案流转记录, 电子档案, 备注 
-                    FROM personnel 
-                    WHERE {where_clause}
-                '''
-                
-                cursor.execute(query, params)
-                rows = cursor.fetchall()
-                
-            self.table.setRowCount(0)
-            for row_data in rows:
-                row = self.table.rowCount()
-                self.table.insertRow(row)
-                for col, value in enumerate(row_data):
-                    item = QTableWidgetItem(str(value))
-                    self.table.setItem(row, col, item)
+            fields = field_manager.get_summary_fields()
+            self.start_paging(fields, keyword=keyword)
         except Exception as e:
             logger.error(f"搜索失败: {str(e)}")
             QMessageBox.critical(self, "错误", f"搜索失败: {str(e)}")
@@ -2938,27 +7756,50 @@ class ArchiveManager(QMainWindow):
             if not file_path:
                 return
                 
+            # 选择导入方式：仅新增，或按身份证号更新已有人员
+            mode_labels = list(IMPORT_MODES.values())
+            label, ok = QInputDialog.getItem(self, "导入方式", "请选择导入方式：", mode_labels, 0, False)
+            if not ok:
+                return
+            mode = list(IMPORT_MODES)[mode_labels.index(label)]
+                
             # 创建进度对话框
             progress = QProgressDialog("导入数据中...", "取消", 0, 100, self)
             progress.setWindowTitle("导入进度")
             progress.setWindowModality(Qt.WindowModal)
-            progress.setValue(10)
+            progress.setCancelButton(None)  # 单事务导入，中途不可取消
+            progress.setValue(0)
             QApplication.processEvents()
+
+            def update_progress(done, total):
+                progress.setValue(int(done * 100 / max(total, 1)))
+                QApplication.processEvents()
             
             # 执行导入
-            count = import_from_excel(self.db_path, file_path)
+            report = import_from_excel(self.db_path, file_path, update_progress, mode)
             
             progress.setValue(100)
             progress.close()
-            
-            if count > 0:
-                QMessageBox.information(
-                    self, "成功", 
-                    f"成功导入 {count} 条记录\n"
-                    f"重复记录已自动跳过"
+
+            if report.rejected:
+                reply = QMessageBox.question(
+                    self, "导入结果",
+                    f"{report.summary()}\n\n是否保存被拒绝的记录以便修正后重新导入？",
+                    QMessageBox.Yes | QMessageBox.No
                 )
-                self.load_data()  # 刷新表格显示
-            else:
+                if reply == QMessageBox.Yes:
+                    base, _ = os.path.splitext(file_path)
+                    save_path, _ = QFileDialog.getSaveFileName(
+                        self, "保存拒绝记录", f"{base}_拒绝记录.xlsx", "Excel文件 (*.xlsx)"
+                    )
+                    if save_path:
+                        report.save(save_path)
+            
+            if report.written > 0 or report.unchanged > 0:
+                if not report.rejected:
+                    QMessageBox.information(self, "成功", report.summary())
+                self.change_monitor.check_now()  # 刷新表格显示
+            elif not report.rejected:
                 # 使用警告而不是错误，用户可以关闭
                 QMessageBox.warning(
                     self, "警告", 
@@ -2978,25 +7819,16 @@ class ArchiveManager(QMainWindow):
             logger.error(f"导入失败: {traceback.format_exc()}")
 
     def export_to_excel(self):
-        """增强版导出方法，支持导出选中行"""
+        """增强版导出方法，支持导出选中行（后台线程执行）"""
+        if getattr(self, 'export_worker', None) and self.export_worker.isRunning():
+            QMessageBox.information(self, "提示", "导出正在进行中")
+            return False
         try:
             # 获取选中行的身份证号
             selected_ids = self.get_selected_personnel_ids()
-            
-            # 构建查询条件
-            condition = ""
-            params = []
-            if selected_ids:
-                placeholders = ','.join(['?'] * len(selected_ids))
-                condition = f" WHERE 身份证号 IN ({placeholders})"
-                params = selected_ids
                 
-            # 获取所有字段名
-            fields = field_manager.get_field_names()
-            field_list = ', '.join([f'"{field}"' for field in fields])
-            
-            # 构建查询
-            query = f"SELECT {field_list} FROM personnel{condition}"
+            # 获取所有字段名（末尾附带年龄、工龄、党龄，重新导入时忽略）
+            fields = field_manager.get_template_field_names()
             
             # 创建临时文件路径
             desktop = os.path.join(os.path.expanduser("~"), "Desktop")
@@ -3009,37 +7841,60 @@ class ArchiveManager(QMainWindow):
             if not save_path:
                 return
                 
-            # 添加进度提示
+            # 在只读快照上后台导出：按页读取并以只写模式流式写入，内存占用与记录数无关，
+            # 导出期间的编辑与导入互不阻塞，文件内容对应导出开始时刻的数据
+            def job(repo, report):
+                ids = selected_ids or None
+                total = repo.count(ids=ids)
+                wb = Workbook(write_only=True)
+                ws = wb.create_sheet("Sheet1")
+                ws.append(fields)
+                exported = 0
+                for rows in repo.iter_pages(fields, ids=ids):
+                    for row in rows:
+                        ws.append(list(row))
+                    exported += len(rows)
+                    report(exported, total)
+                wb.save(save_path)
+                return exported
+
             progress = QProgressDialog("导出数据中...", "取消", 0, 100, self)
             progress.setWindowTitle("导出进度")
             progress.setWindowModality(Qt.WindowModal)
-            progress.setValue(30)
-            QApplication.processEvents()
-            
-            # 执行导出
-            with sqlite3.connect(self.db_path) as conn:
-                df = pd.read_sql_query(query, conn, params=params)
-                df.to_excel(save_path, index=False, engine="openpyxl")
-                
-            progress.setValue(100)
-            progress.close()
-            
-            QMessageBox.information(
-                self, "成功", 
-                f"文件已保存到：\n{save_path}\n"
-                f"共导出 {len(df)} 条记录"
+            progress.setMinimumDuration(500)
+            progress.setAutoClose(False)
+            progress.setAutoReset(False)
+
+            worker = self.export_worker = SnapshotWorker(self.db_path, job, self)
+            progress.canceled.connect(worker.cancel)
+            worker.progress.connect(
+                lambda done, total: progress.setValue(int(done * 100 / total) if total else 100)
+            )
+            worker.succeeded.connect(
+                lambda exported: QMessageBox.information(
+                    self, "成功",
+                    f"文件已保存到：\n{save_path}\n"
+                    f"共导出 {exported} 条记录"
+                )
+            )
+            worker.failed.connect(
+                lambda message: QMessageBox.critical(
+                    self, "错误",
+                    f"导出失败: {message}\n"
+                    "建议操作:\n"
+                    "1. 关闭已打开的Excel文件\n"
+                    "2. 检查磁盘空间"
+                )
             )
+            worker.finished.connect(progress.close)
+            worker.finished.connect(lambda: setattr(self, 'export_worker', None))
+            worker.finished.connect(worker.deleteLater)
+            worker.start()
             return True
-            
+
         except Exception as e:
             logger.error(f"导出失败: {traceback.format_exc()}")
-            QMessageBox.critical(
-                self, "错误", 
-                f"导出失败: {str(e)}\n"
-                "建议操作:\n"
-                "1. 关闭已打开的Excel文件\n"
-                "2. 检查磁盘空间"
-            )
+            QMessageBox.critical(self, "错误", f"导出失败: {str(e)}")
             return False
 
     # 在 ArchiveManager 类中添加以下方法
@@ -3080,12 +7935,64 @@ class ArchiveManager(QMainWindow):
         )
         if reply == QMessageBox.Save:
             self.save_current_state()  # 保存当前状态
+            self.stop_backup()
             event.accept()
         elif reply == QMessageBox.Discard:
+            self.stop_backup()
             event.accept()
         else:
             event.ignore()
 
+    def restore_database(self):
+        """从备份快照恢复数据库（恢复前自动为当前数据创建快照）"""
+        if getattr(self, 'backup_worker', None) and self.backup_worker.isRunning():
+            QMessageBox.information(self, "提示", "备份正在进行中，请稍后再恢复")
+            return
+        try:
+            store = BackupStore()
+            entries = store.snapshots()
+            if not entries:
+                QMessageBox.information(self, "提示", "没有可用的备份")
+                return
+            labels = [
+                f"{entry['created'].replace('T', ' ')}（{entry['stored_size'] / 1024 / 1024:.1f} MB）"
+                for entry in entries
+            ]
+            label, ok = QInputDialog.getItem(self, "恢复数据库", "选择要恢复的备份：", labels, 0, False)
+            if not ok:
+                return
+            entry = entries[labels.index(label)]
+            reply = QMessageBox.question(
+                self, "确认恢复",
+                f"将数据库恢复到 {label} 的状态，当前数据会先自动备份。是否继续？",
+                QMessageBox.Yes | QMessageBox.No
+            )
+            if reply != QMessageBox.Yes:
+                return
+
+            QApplication.setOverrideCursor(Qt.WaitCursor)
+            try:
+                store.snapshot(self.db_path, reason='restore')
+                store.restore(entry['file'], self.db_path)
+                init_database()  # 备份中的表结构可能与当前字段配置不同
+            finally:
+                QApplication.restoreOverrideCursor()
+            if self.column_cache is not None:
+                self.column_cache.invalidate()
+            self.change_monitor.check_now()
+            QMessageBox.information(self, "成功", "数据库已恢复")
+        except Exception as e:
+            logger.error(f"恢复失败: {traceback.format_exc()}")
+            QMessageBox.critical(self, "错误", f"恢复失败：{str(e)}")
+
+    def stop_backup(self):
+        """退出前取消尚未完成的备份与导出并等待工作线程结束"""
+        for name in ('backup_worker', 'export_worker'):
+            worker = getattr(self, name, None)
+            if worker and worker.isRunning():
+                worker.cancel()
+                worker.wait()
+
     
 
     def on_header_clicked(self, column):
@@ -3148,7 +8055,7 @@ class ArchiveManager(QMainWindow):
         try:
             dialog = DynamicFormDialog(self, mode='add')
             if dialog.exec_() == QDialog.Accepted:
-                self.load_data()
+                self.change_monitor.check_now()
         except Exception as e:
             logger.error(f"打开新增对话框失败: {str(e)}")
             QMessageBox.critical(self, "错误", f"无法打开新增界面: {str(e)}")
@@ -3158,7 +8065,7 @@ class ArchiveManager(QMainWindow):
     def open_import_dialog(self):
         dialog = ImportDialog(self, db_path=self.db_path)
         if dialog.exec_() == QDialog.Accepted:
-            self.load_data()
+            self.change_monitor.check_now()
 
     def open_stats_dialog(self):
         """打开统计对话框"""
@@ -3169,6 +8076,60 @@ class ArchiveManager(QMainWindow):
             logger.error(f"打开统计对话框失败: {str(e)}")
             QMessageBox.critical(self, "错误", f"无法打开统计界面: {str(e)}")
 
+    def open_recycle_bin(self):
+        """打开回收站（恢复的记录经变更日志自动出现在表格中）"""
+        try:
+            dialog = RecycleBinDialog(self, db_path=self.db_path)
+            dialog.exec_()
+            self.change_monitor.check_now()
+        except Exception as e:
+            logger.error(f"打开回收站失败: {str(e)}")
+            QMessageBox.critical(self, "错误", f"无法打开回收站: {str(e)}")
+
+    def open_duplicates(self):
+        """打开查重窗口（合并的结果经变更日志自动刷新表格）"""
+        try:
+            dialog = DuplicateDialog(self, db_path=self.db_path)
+            dialog.exec_()
+            self.change_monitor.check_now()
+        except Exception as e:
+            logger.error(f"打开查重窗口失败: {str(e)}")
+            QMessageBox.critical(self, "错误", f"无法打开查重窗口: {str(e)}")
+
+    def open_mass_edit(self):
+        """打开批量修改窗口（范围为勾选的人员或当前检索结果）"""
+        try:
+            query = getattr(self, 'page_query', None) or {}
+            dialog = MassEditDialog(
+                self, db_path=self.db_path, ids=self.get_selected_personnel_ids(), keyword=query.get('keyword')
+            )
+            dialog.applied.connect(self.patch_mass_edit)
+            dialog.exec_()
+        except Exception as e:
+            logger.error(f"打开批量修改窗口失败: {str(e)}")
+            QMessageBox.critical(self, "错误", f"无法打开批量修改窗口: {str(e)}")
+
+    def patch_mass_edit(self, row_ids, first_seq, last_seq):
+        """批量修改（或撤销）后原位刷新表格中已加载的行，该段变更日志不再触发整表重新加载"""
+        self.change_monitor.skip(first_seq, last_seq)
+        positions = self.grid_positions()
+        loaded = [row_id for row_id in row_ids if row_id in positions]
+        for start in range(0, len(loaded), PAGE_SIZE):
+            self.apply_changes({row_id: 'U' for row_id in loaded[start:start + PAGE_SIZE]})
+
+    def open_data_quality(self):
+        """打开数据质量检查窗口"""
+        try:
+            DataQualityDialog(self, db_path=self.db_path).exec_()
+        except Exception as e:
+            logger.error(f"打开数据质量窗口失败: {str(e)}")
+            QMessageBox.critical(self, "错误", f"无法打开数据质量窗口: {str(e)}")
+
+    def open_query_stats(self):
+        """打开查询诊断窗口（Ctrl+Shift+Q）"""
+        dialog = QueryStatsDialog(self)
+        dialog.exec_()
+
     def quick_print(self, template_name, ids):
         """快速打印已配置的模板"""
         try:
@@ -3186,15 +8147,7 @@ class ArchiveManager(QMainWindow):
             config = templates[template_name]
             
             # 获取人员数据
-            with sqlite3.connect(self.db_path) as conn:
-                conn.row_factory = sqlite3.Row
-                cursor = conn.cursor()
-                placeholders = ','.join(['?'] * len(ids))
-                cursor.execute(
-                    f"SELECT * FROM personnel WHERE 身份证号 IN ({placeholders})", 
-                    ids
-                )
-                data_list = [dict(row) for row in cursor.fetchall()]
+            data_list = PersonnelRepository(self.db_path).fetch_by_ids(ids)
                 
             if not data_list:
                 QMessageBox.warning(self, "警告", "没有可打印的数据！")
@@ -3239,34 +8192,49 @@ class ArchiveManager(QMainWindow):
             if not selected_items:
                 return
                 
-            row = selected_items[0].row()
-            row_data = {}
-            
-            for col_idx, field in enumerate(field_manager.fields):
-                item = self.table.item(row, col_idx + 1)  # +1跳过复选框列
-                row_data[field['name']] = item.text() if item else ""
-                
+            row_data = self.load_row_record(selected_items[0].row())
             dialog = DynamicFormDialog(self, mode='edit', row_data=row_data)  # 确保self作为parent传入
             if dialog.exec_() == QDialog.Accepted:
-                self.load_data()
+                self.change_monitor.check_now()
         except Exception as e:
             logger.error(f"编辑行数据失败: {str(e)}")
             QMessageBox.critical(self, "错误", f"打开编辑界面失败: {str(e)}")
         
     def backup_database(self):
-        backup_dir = os.path.join(os.path.expanduser("~/Documents/人事档案系统"), "backups")
-        os.makedirs(backup_dir, exist_ok=True)  # ✅ 确保目录存在
-        
+        """在后台线程执行在线备份，显示进度并可取消"""
+        if getattr(self, 'backup_worker', None) and self.backup_worker.isRunning():
+            QMessageBox.information(self, "提示", "备份正在进行中")
+            return
         try:
-            timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-            backup_path = os.path.join(backup_dir, f"archive_backup_{timestamp}.db")
-            shutil.copy2(self.db_path, backup_path)
-            QMessageBox.information(self, "成功", f"数据库已备份到：\n{backup_path}")
+            store = BackupStore()  # ✅ 确保目录存在
         except PermissionError:
             QMessageBox.critical(self, "权限错误", "无法写入备份目录，请以管理员身份运行程序")
-        except Exception as e:
-            logger.error(f"备份失败: {str(e)}")
-            QMessageBox.critical(self, "错误", f"备份失败：{str(e)}")   
+            return
+
+        progress = QProgressDialog("正在备份数据库...", "取消", 0, 100, self)
+        progress.setWindowTitle("数据库备份")
+        progress.setMinimumDuration(500)
+        progress.setAutoClose(False)
+        progress.setAutoReset(False)
+
+        worker = self.backup_worker = BackupWorker(self.db_path, store, parent=self)
+        progress.canceled.connect(worker.cancel)
+        worker.progress.connect(
+            lambda copied, total: progress.setValue(int(copied * 100 / total) if total else 100)
+        )
+        worker.succeeded.connect(
+            lambda path: QMessageBox.information(
+                self, "成功",
+                f"数据库已备份到：\n{path}" if path else "数据库自上次备份后没有变化，无需重复备份"
+            )
+        )
+        worker.failed.connect(
+            lambda message: QMessageBox.critical(self, "错误", f"备份失败：{message}")
+        )
+        worker.finished.connect(progress.close)
+        worker.finished.connect(lambda: setattr(self, 'backup_worker', None))
+        worker.finished.connect(worker.deleteLater)
+        worker.start()
     
     # 修改 open_sort_dialog 方法
     def open_sort_dialog(self):
@@ -3430,8 +8398,8 @@ class SortDialog(QDialog):
     def __init__(self, parent=None):
         super().__init__(parent)
         self.setWindowTitle("排序设置")
-        # 获取所有字段名
-        self.fields = field_manager.get_field_names()
+        # 可排序的字段（明细字段不参与排序，周年数字段可排序）
+        self.fields = field_manager.get_summary_fields() + list(field_manager.get_derived_fields())
         self.setup_ui()
 
     def setup_ui(self):
@@ -3871,11 +8839,13 @@ class TemplateDesigner(QDialog):
         self.label_mode_components_initialized = False  # 新增标志位
         if parent:
             parent.init_chinese_font()
+            if hasattr(parent, 'change_monitor'):
+                parent.change_monitor.rows_changed.connect(self.on_personnel_changed)
         # ============== 2. 字段管理器验证 ==============
         try:
             if not hasattr(field_manager, 'get_field_names'):
                 raise RuntimeError("字段管理器未初始化")
-            self.fields = field_manager.get_field_names()
+            self.fields = field_manager.get_template_field_names()
         except Exception as e:
             QMessageBox.critical(None, "致命错误", f"字段配置加载失败: {str(e)}")
             sys.exit(1)
@@ -3979,6 +8949,11 @@ class TemplateDesigner(QDialog):
             logger.error(f"UI初始化失败: {traceback.format_exc()}")
             raise RuntimeError(f"界面创建失败: {str(e)}")
         # ================================================
+    def on_personnel_changed(self, changes):
+        """人员数据变化：记录集按需分页读取，只需丢弃缓存的记录数"""
+        if isinstance(self.personnel_data, PersonnelRecords):
+            self.personnel_data.invalidate()
+
     def refresh_personnel_data(self):
         """刷新人员数据"""
         self.selected_ids = self.parent().get_selected_personnel_ids()
@@ -4017,7 +8992,7 @@ class TemplateDesigner(QDialog):
         
         # 确保使用self.fields而不是直接访问field_manager
         if not hasattr(self, 'fields') or not self.fields:
-            self.fields = field_manager.get_field_names()  # 重新获取字段列表
+            self.fields = field_manager.get_template_field_names()  # 重新获取字段列表
         
         scroll = QScrollArea()
         content = QWidget()
@@ -4685,17 +9660,9 @@ class TemplateDesigner(QDialog):
                 
             logger.debug(f"正在加载人员数据，IDs: {self.selected_ids}")
             
-            with sqlite3.connect(self.db_path) as conn:
-                conn.row_factory = sqlite3.Row
-                cursor = conn.cursor()
-                placeholders = ','.join(['?'] * len(self.selected_ids))
-                query = f"""
-                    SELECT * FROM personnel 
-                    WHERE 身份证号 IN ({placeholders})
-                    ORDER BY 姓名
-                """
-                cursor.execute(query, self.selected_ids)
-                self.personnel_data = [dict(row) for row in cursor.fetchall()]
+            self.personnel_data = PersonnelRepository(self.db_path).fetch_by_ids(
+                self.selected_ids, order_by='姓名'
+            )
                 
             logger.info(f"成功加载 {len(self.personnel_data)} 条人员数据")
             
@@ -4792,6 +9759,113 @@ class TemplateDesigner(QDialog):
         
 
 
+# --------------------------- 性能基准 ---------------------------
+def _benchmark_rows(count, seed=20240101):
+    """按当前字段配置生成基准测试用的档案数据（身份证号合法、唯一字段不重复）"""
+    import random
+    rng = random.Random(seed)
+    weights = [7, 9, 10, 5, 8, 4, 2, 1, 6, 3, 7, 9, 10, 5, 8, 4, 2]
+    surnames = '王李张刘陈杨黄赵吴周徐孙马朱胡郭何高林罗'
+    given = '伟芳娜敏静丽强磊军洋勇艳杰娟涛明超秀霞平刚'
+    date_fields = set(field_manager.get_date_fields())
+    unique_fields = {f['name'] for f in field_manager.fields if f.get('unique', False)}
+    first_birth = datetime(1960, 1, 1).toordinal()
+    rows = []
+    for i in range(count):
+        row = {}
+        birth = datetime.fromordinal(first_birth + i // 1000)
+        for name in field_manager.get_field_names():
+            if name == '身份证号':
+                body = f"110101{birth.strftime('%Y%m%d')}{i % 1000:03d}"
+                checksum = '10X98765432'[sum(int(c) * w for c, w in zip(body, weights)) % 11]
+                row[name] = body + checksum
+            elif name == '出生日期':
+                row[name] = birth.strftime('%Y-%m-%d')  # 与身份证号中的出生日期一致
+            elif name in date_fields:
+                row[name] = f"{rng.randint(1950, 2023)}-{rng.randint(1, 12):02d}-{rng.randint(1, 28):02d}"
+            elif name in unique_fields:
+                row[name] = f"{i:08d}"
+            elif name == '姓名':
+                row[name] = rng.choice(surnames) + ''.join(rng.sample(given, rng.randint(1, 2)))
+            else:
+                row[name] = f"{name}{rng.randint(1, 50)}"
+        rows.append(row)
+    return rows
+
+def benchmark_profiles(row_count=20000, single_count=300, profiles=None):
+    """比较各性能配置的耗时，返回 {配置名: {操作: 秒}}
+
+    每个配置使用独立的临时数据库（结构由 SchemaMigrator 按当前字段配置建立），
+    依次测量：逐条提交写入（对应界面新增）、单事务批量写入（对应导入）、
+    按字段排序的分页遍历（对应导出）与关键字计数（对应检索）。
+    """
+    global field_manager
+    if field_manager is None:
+        field_manager = FieldManager()
+    profiles = profiles or list(PERFORMANCE_PROFILES)
+    rows = _benchmark_rows(row_count + single_count)
+    fields = field_manager.get_field_names()
+    sort_field = (field_manager.get_date_fields() or fields)[0]
+    keyword = rows[0].get('姓名') or rows[0][fields[0]]
+    results = {}
+    work_dir = tempfile.mkdtemp(prefix="profile_bench_")
+    try:
+        for name in profiles:
+            db_path = os.path.join(work_dir, f"{name}.db")
+            db = DBManager(db_path)
+            db.set_profile(name)
+            repo = PersonnelRepository(db_path)
+            SchemaMigrator(repo.conn, field_manager, db_path).migrate()
+            timings = results[name] = {}
+
+            start = time.perf_counter()
+            for row in rows[row_count:]:
+                repo.insert(row)
+            timings['逐条提交'] = time.perf_counter() - start
+
+            # 只计 personnel 表本身的写入（明细字段另表存放，不在此计时）
+            prepared = [PersonnelRepository.split_detail(PersonnelRepository.prepare_values(row))[0]
+                        for row in rows[:row_count]]
+            columns = ', '.join(f'"{col}"' for col in prepared[0])
+            placeholders = ', '.join(['?'] * len(prepared[0]))
+            start = time.perf_counter()
+            with repo.conn as conn:
+                conn.executemany(
+                    f"INSERT INTO personnel ({columns}) VALUES ({placeholders})",
+                    [list(values.values()) for values in prepared]
+                )
+            timings['批量写入'] = time.perf_counter() - start
+
+            start = time.perf_counter()
+            for _ in repo.iter_pages(fields, order_by=[(sort_field, 'DESC')]):
+                pass
+            timings['排序遍历'] = time.perf_counter() - start
+
+            start = time.perf_counter()
+            for _ in range(20):
+                repo.count(keyword)
+            timings['检索计数'] = time.perf_counter() - start
+
+            db.close()
+            with DBManager._lock:
+                DBManager._instances.pop(db_path, None)
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+    return results
+
+def print_benchmark(results):
+    """以表格形式输出 benchmark_profiles 的结果（括号内为相对首个配置的加速比）"""
+    names = list(results)
+    operations = list(results[names[0]])
+    print("操作".ljust(10) + "".join(name.rjust(20) for name in names))
+    for op in operations:
+        base = results[names[0]][op]
+        cells = [
+            f"{results[name][op]:.3f}s ({base / results[name][op]:.1f}x)".rjust(20)
+            for name in names
+        ]
+        print(op.ljust(10) + "".join(cells))
+
 def main():
     # 1. 检查依赖
     if not check_dependencies():
@@ -4815,6 +9889,12 @@ def main():
 # --------------------------- 运行入口 ---------------------------
 # ======================= 主程序入口 =======================
 if __name__ == "__main__":
+    # 性能配置基准：python main1.py --benchmark-profiles [行数]
+    if "--benchmark-profiles" in sys.argv:
+        args = sys.argv[sys.argv.index("--benchmark-profiles") + 1:]
+        print_benchmark(benchmark_profiles(int(args[0]) if args else 20000))
+        sys.exit(0)
+
     app = QApplication(sys.argv)
     app.setStyle("Fusion")  # 使用Fusion风格确保跨平台一致性
     
@@ -0,0 +1,46 @@
+import json
+import os
+import sys
+
+os.environ.setdefault('QT_QPA_PLATFORM', 'offscreen')
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pytest
+from PyQt5.QtWidgets import QApplication
+
+import main1
+
+
+@pytest.fixture(scope='session', autouse=True)
+def qt_app():
+    return QApplication.instance() or QApplication([])
+
+
+@pytest.fixture
+def archive_home(tmp_path, monkeypatch):
+    """每个用例使用独立的用户目录（数据库、fields.json 均位于其下），返回数据库路径"""
+    monkeypatch.setenv('HOME', str(tmp_path))
+    main1.field_manager = main1.FieldManager()
+    db_path = main1.get_db_path()
+    yield db_path
+    main1.DBManager(db_path).close()
+
+
+def migrate(db_path):
+    """按当前全局字段配置迁移数据库"""
+    conn = main1.DBManager(db_path).get_connection()
+    return main1.SchemaMigrator(conn, main1.field_manager, db_path).migrate()
+
+
+def write_fields(fields):
+    """写入 fields.json 并按新配置重新创建全局字段管理器"""
+    with open(main1.field_manager.config_path(), 'w', encoding='utf-8') as f:
+        json.dump({'fields': fields}, f, ensure_ascii=False)
+    main1.field_manager = main1.FieldManager()
+
+
+def make_id(body):
+    """为 17 位本体补上校验码"""
+    weights = [7, 9, 10, 5, 8, 4, 2, 1, 6, 3, 7, 9, 10, 5, 8, 4, 2]
+    total = sum(int(digit) * weight for digit, weight in zip(body, weights))
+    return body + '10X98765432'[total % 11]
@@ -0,0 +1,32 @@
+import os
+
+import main1
+from conftest import make_id, migrate
+
+
+def test_compactor_collects_unreferenced_attachments(archive_home, tmp_path):
+    migrate(archive_home)
+    main1.add_personnel(archive_home, {
+        '档案编号': 'A001', '姓名': '张三', '身份证号': make_id('11010119900307765'), '出生日期': '1990-03-07',
+    })
+    store = main1.AttachmentStore(archive_home)
+    kept, dropped = tmp_path / 'kept.txt', tmp_path / 'dropped.txt'
+    kept.write_text('保留的扫描件')
+    dropped.write_text('已删除的扫描件')
+    store.add(1, str(kept))
+    orphan, _ = store.put(str(dropped))  # 文件已入库但没有人员引用
+
+    compactor = main1.Compactor(archive_home, idle_seconds=0)
+    try:
+        compactor.run_until_done()
+    finally:
+        compactor.close()
+
+    referenced = store.attachments(1)[0]['sha256']
+    assert os.path.exists(store.blob_path(referenced))
+    assert not os.path.exists(store.blob_path(orphan))
+    assert os.path.exists(os.path.join(store.root, 'trash', orphan))  # 保留期内只移入 trash/
+
+    os.utime(os.path.join(store.root, 'trash', orphan), (0, 0))
+    store.collect_garbage()
+    assert not os.path.exists(os.path.join(store.root, 'trash', orphan))
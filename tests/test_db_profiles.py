@@ -0,0 +1,16 @@
+import main1
+
+PRAGMAS = ('synchronous', 'cache_size', 'wal_autocheckpoint')
+
+
+def test_bulk_scope_keeps_sync_and_restores_connection_settings(archive_home):
+    db = main1.DBManager(archive_home)
+    conn = db.get_connection()
+    conn.execute("PRAGMA cache_size=-12345")
+    before = {pragma: conn.execute(f"PRAGMA {pragma}").fetchone()[0] for pragma in PRAGMAS}
+
+    with db.profile_scope('bulk', conn):
+        assert conn.execute("PRAGMA synchronous").fetchone()[0] == 1  # NORMAL
+        assert conn.execute("PRAGMA wal_autocheckpoint").fetchone()[0] == 0
+
+    assert {pragma: conn.execute(f"PRAGMA {pragma}").fetchone()[0] for pragma in PRAGMAS} == before
@@ -0,0 +1,20 @@
+import main1
+from conftest import make_id, migrate
+
+
+def test_same_name_birth_and_unit_is_suggested(archive_home):
+    migrate(archive_home)
+    common = {'姓名': '李明', '出生日期': '1985-06-01', '一级单位': '财政局', '二级单位': '预算科'}
+    main1.add_personnel(archive_home, dict(common, 档案编号='A001', 身份证号=make_id('11010119850601123')))
+    main1.add_personnel(archive_home, dict(common, 档案编号='B007', 身份证号=make_id('11010519850601456')))
+    main1.add_personnel(archive_home, {
+        '档案编号': 'C001', '姓名': '李明', '出生日期': '1985-06-01', '一级单位': '财政局', '二级单位': '国库科',
+        '身份证号': make_id('11010819850601789'),
+    })
+
+    results = main1.DuplicateDetector().run(main1.PersonnelRepository(archive_home), lambda done, total: None)
+
+    assert [(first['档案编号'], second['档案编号']) for _, _, first, second in results] == [('A001', 'B007')]
+    score, reasons, _, _ = results[0]
+    assert score == main1.DUPLICATE_MIN_SCORE
+    assert reasons == ["姓名相同", "出生日期相同", "单位相同"]
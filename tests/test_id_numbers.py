@@ -0,0 +1,91 @@
+import random
+import re
+from datetime import date
+
+import pytest
+
+import main1
+from conftest import make_id
+
+TODAY = date(2026, 1, 1)
+
+
+def scalar_problem(id_number, birth_date=''):
+    """逐个号码按 ID_PROBLEMS 的规则判定（对照实现）"""
+    if not re.fullmatch(r'\d{17}[\dXx]', id_number):
+        return 1
+    if not main1.validate_id_number(id_number):
+        return 2
+    if id_number[:2] not in main1.ID_PROVINCE_CODES:
+        return 3
+    try:
+        born = date(int(id_number[6:10]), int(id_number[10:12]), int(id_number[12:14]))
+    except ValueError:
+        return 4
+    if born.year < 1900 or born > TODAY:
+        return 4
+    if re.fullmatch(r'\d{4}-\d{2}-\d{2}', birth_date) and birth_date != born.isoformat():
+        if not (birth_date.endswith('-01') and birth_date[:7] == born.isoformat()[:7]):
+            return 5
+    return 0
+
+
+def _wrong_check_digit(id_number):
+    return id_number[:17] + ('1' if id_number[17] == '0' else '0')
+
+
+def _x_check_digit_id():
+    for sequence in range(1000):
+        id_number = make_id(f'11010119900307{sequence:03d}')
+        if id_number.endswith('X'):
+            return id_number
+    raise AssertionError("未找到校验码为 X 的号码")
+
+
+@pytest.mark.parametrize('id_number, birth_date, expected', [
+    (make_id('11010119900307765'), '', 0),
+    (make_id('11010119900307765'), '1990-03-07', 0),
+    (make_id('11010119900307765'), '1990-03-01', 0),  # 只填了年月
+    (_wrong_check_digit(make_id('11010119900307765')), '', 2),
+    (_x_check_digit_id(), '', 0),
+    (_x_check_digit_id().lower(), '', 0),
+    (_wrong_check_digit(_x_check_digit_id()), '', 2),
+    (make_id('99010119900307765'), '', 3),
+    (make_id('11010119900230765'), '', 4),  # 2 月 30 日
+    (make_id('11010119000229765'), '', 4),  # 1900 年不是闰年
+    (make_id('11010120000229765'), '', 0),
+    (make_id('11010118991231765'), '', 4),
+    (make_id('11010120270101765'), '', 4),  # 晚于今天
+    (make_id('11010119900307765'), '1991-03-07', 5),
+    (make_id('11010119900307765'), '1990-03-08', 5),
+    ('1101011990030776', '', 1),
+    ('11010119900307765A', '', 1),
+])
+def test_check_id_numbers_cases(id_number, birth_date, expected):
+    assert scalar_problem(id_number, birth_date) == expected
+    assert main1.check_id_numbers([id_number], [birth_date], today=TODAY).tolist() == [expected]
+
+
+def test_check_id_numbers_matches_scalar_rule():
+    rng = random.Random(23)
+    id_numbers, birth_dates = [], []
+    for _ in range(5000):
+        region = rng.choice(['11', '44', '65', '83', '00', '19', '99'])
+        year, month, day = rng.randint(1890, 2030), rng.randint(0, 13), rng.randint(0, 32)
+        body = f"{region}0101{year:04d}{month:02d}{day:02d}{rng.randint(0, 999):03d}"
+        id_number = make_id(body) if rng.random() < 0.8 else body + rng.choice('0123456789Xx')
+        if rng.random() < 0.05:
+            id_number = id_number[:rng.randint(0, 17)]
+        id_numbers.append(id_number)
+        birth_dates.append(rng.choice([
+            '', f"{year:04d}-{month:02d}-{day:02d}", f"{year:04d}-{month:02d}-01",
+            f"{rng.randint(1900, 2025):04d}-{rng.randint(1, 12):02d}-{rng.randint(1, 28):02d}", '未知',
+        ]))
+
+    expected = [scalar_problem(id_number, birth) for id_number, birth in zip(id_numbers, birth_dates)]
+    assert main1.check_id_numbers(id_numbers, birth_dates, today=TODAY).tolist() == expected
+    assert main1.id_checksum_mask(id_numbers).tolist() == [
+        bool(re.fullmatch(r'\d{17}[\dXx]', id_number)) and main1.validate_id_number(id_number)
+        for id_number in id_numbers
+    ]
+    assert set(expected) == {0, 1, 2, 3, 4, 5}
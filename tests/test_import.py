@@ -0,0 +1,101 @@
+import pandas as pd
+
+import main1
+from conftest import make_id, migrate
+
+
+def _person(number, id_body, name, **values):
+    record = {'档案编号': number, '姓名': name, '身份证号': make_id(id_body), '出生日期': id_body[6:10] + '-' +
+              id_body[10:12] + '-' + id_body[12:14]}
+    record.update(values)
+    return record
+
+
+def _write_excel(tmp_path, records, name='import.xlsx'):
+    path = tmp_path / name
+    pd.DataFrame(records).to_excel(path, index=False)
+    return str(path)
+
+
+def test_failed_detail_write_does_not_double_count(archive_home, tmp_path):
+    migrate(archive_home)
+    conn = main1.DBManager(archive_home).get_connection()
+    conn.execute(
+        f"CREATE TRIGGER reject_detail BEFORE INSERT ON {main1.DETAIL_TABLE} "
+        f"WHEN new.工作经历 = '无效' BEGIN SELECT RAISE(ABORT, '明细写入失败'); END"
+    )
+    conn.commit()
+    path = _write_excel(tmp_path, [
+        _person('A001', '11010119900307765', '张三', 工作经历='科员'),
+        _person('A002', '11010519491231002', '李四', 工作经历='无效'),
+        _person('A003', '44052419800101001', '王五', 工作经历='科长'),
+    ])
+
+    report = main1.import_from_excel(archive_home, path)
+
+    assert (report.inserted, report.written, len(report.rejected)) == (2, 2, 1)
+    assert report.rejected[0][0] == 3
+    assert conn.execute("SELECT 档案编号 FROM personnel ORDER BY id").fetchall() == [('A001',), ('A003',)]
+
+
+
+def _journal_seq(conn):
+    return conn.execute("SELECT COALESCE(MAX(seq), 0) FROM personnel_changes").fetchone()[0]
+
+
+def test_upsert_updates_existing_person_by_id_number(archive_home, tmp_path):
+    migrate(archive_home)
+    original = _person('A001', '11010119900307765', '张三', 学历='本科', 工作经历='科员')
+    main1.import_from_excel(archive_home, _write_excel(tmp_path, [original], 'first.xlsx'))
+    conn = main1.DBManager(archive_home).get_connection()
+    person_id = conn.execute("SELECT id FROM personnel").fetchone()[0]
+
+    changed = dict(original, 学历='硕士', 工作经历='副科长')
+    added = _person('A002', '11010519491231002', '李四')
+    report = main1.import_from_excel(
+        archive_home, _write_excel(tmp_path, [changed, added], 'second.xlsx'), mode='upsert'
+    )
+
+    assert (report.updated, report.inserted, report.unchanged, report.rejected) == (1, 1, 0, [])
+    assert conn.execute(
+        f"SELECT p.学历, d.工作经历 FROM personnel p JOIN {main1.DETAIL_TABLE} d ON d.id = p.id "
+        f"WHERE p.身份证号 = ?", (original['身份证号'],)
+    ).fetchone() == ('硕士', '副科长')
+    assert conn.execute("SELECT id FROM personnel WHERE 身份证号 = ?", (original['身份证号'],)).fetchone()[0] == person_id
+    assert conn.execute("SELECT COUNT(*) FROM personnel").fetchone()[0] == 2
+
+
+def test_upsert_skips_rows_with_unchanged_content(archive_home, tmp_path):
+    migrate(archive_home)
+    records = [
+        _person('A001', '11010119900307765', '张三', 工作经历='科员'),
+        _person('A002', '11010519491231002', '李四'),
+    ]
+    path = _write_excel(tmp_path, records)
+    main1.import_from_excel(archive_home, path)
+    conn = main1.DBManager(archive_home).get_connection()
+    seq = _journal_seq(conn)
+
+    report = main1.import_from_excel(archive_home, path, mode='upsert')
+
+    assert (report.unchanged, report.written, report.rejected) == (2, 0, [])
+    assert _journal_seq(conn) == seq  # 未变化的行不产生任何写入
+
+
+def test_upsert_rejects_duplicate_keys_within_one_file(archive_home, tmp_path):
+    migrate(archive_home)
+    existing = _person('A001', '11010119900307765', '张三', 学历='本科')
+    main1.import_from_excel(archive_home, _write_excel(tmp_path, [existing], 'first.xlsx'))
+
+    fresh = _person('A002', '11010519491231002', '李四')
+    report = main1.import_from_excel(archive_home, _write_excel(tmp_path, [
+        dict(existing, 学历='硕士'),
+        dict(existing, 学历='博士'),
+        fresh,
+        dict(fresh, 档案编号='A003'),
+    ], 'second.xlsx'), mode='upsert')
+
+    assert (report.updated, report.inserted) == (1, 1)
+    assert [(row_number, reason) for row_number, reason, _ in report.rejected] == [(3, '身份证号重复'), (5, '身份证号重复')]
+    conn = main1.DBManager(archive_home).get_connection()
+    assert conn.execute("SELECT 档案编号, 学历 FROM personnel ORDER BY id").fetchall() == [('A001', '硕士'), ('A002', '')]
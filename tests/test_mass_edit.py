@@ -0,0 +1,49 @@
+import sqlite3
+
+import main1
+from conftest import migrate
+
+
+def _insert_rows(db_path, count):
+    rows = main1._benchmark_rows(count, 7)
+    prepared = [
+        main1.PersonnelRepository.split_detail(main1.PersonnelRepository.prepare_values(row))[0] for row in rows
+    ]
+    columns = list(prepared[0])
+    conn = main1.DBManager(db_path).get_connection()
+    with conn:
+        conn.executemany(
+            f"INSERT INTO personnel ({', '.join(map(main1.quote_identifier, columns))}) "
+            f"VALUES ({', '.join('?' * len(columns))})",
+            [tuple(values[name] for name in columns) for values in prepared]
+        )
+    return rows
+
+
+def test_mass_update_selection_beyond_variable_limit(archive_home):
+    migrate(archive_home)
+    rows = _insert_rows(archive_home, 1500)
+    repo = main1.PersonnelRepository(archive_home)
+    # SQLite 3.32 之前参数个数上限默认为 999
+    repo.conn.setlimit(sqlite3.SQLITE_LIMIT_VARIABLE_NUMBER, 999)
+    selected = [row['身份证号'] for row in rows]
+
+    assert repo.count_mass_update([('学历', 'set', '博士')], ids=selected) == len(rows)
+    _, row_ids, _ = repo.mass_update([('学历', 'set', '博士')], '全部设为博士', ids=selected)
+    assert len(row_ids) == len(rows)
+
+
+def test_undo_clears_row_digest(archive_home):
+    migrate(archive_home)
+    rows = _insert_rows(archive_home, 3)
+    repo = main1.PersonnelRepository(archive_home)
+    conn = repo.conn
+    edit_id, row_ids, _ = repo.mass_update([('学历', 'set', '博士')], '设为博士', ids=[rows[0]['身份证号']])
+    # 批量修改后又修改了其他字段，修改前的摘要已不再对应记录内容
+    repo.update(rows[0]['身份证号'], {'籍贯': '另一个籍贯'})
+
+    restored, skipped, _ = repo.undo_mass_edit(edit_id)
+    assert (restored, skipped) == (row_ids, 0)
+    assert conn.execute(
+        f'SELECT 学历, 籍贯, "{main1.ROW_HASH_COLUMN}" FROM personnel WHERE id = ?', (row_ids[0],)
+    ).fetchone() == (rows[0]['学历'], '另一个籍贯', None)
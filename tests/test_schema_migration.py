@@ -0,0 +1,63 @@
+import copy
+
+import main1
+from conftest import make_id, migrate, write_fields
+
+
+def _fields():
+    return copy.deepcopy(main1.field_manager.fields)
+
+
+def _add_person(db_path, **values):
+    data = {'档案编号': 'A001', '姓名': '张三', '身份证号': make_id('11010119900307765'), '出生日期': '1990-03-07'}
+    data.update(values)
+    main1.add_personnel(db_path, data)
+
+
+def _search(db_path, keyword):
+    conn = main1.DBManager(db_path).get_connection()
+    return [row[0] for row in conn.execute(
+        "SELECT rowid FROM personnel_fts WHERE personnel_fts MATCH ?", (f'"{keyword}"',)
+    )]
+
+
+def test_toggle_unique_rebuilds_table_with_detail_fulltext(archive_home):
+    migrate(archive_home)
+    _add_person(archive_home, 工作经历='县委办公室科员')
+
+    fields = _fields()
+    for field in fields:
+        if field['name'] == '档案编号':
+            field['unique'] = not field.get('unique')
+    write_fields(fields)
+    assert migrate(archive_home)
+
+    conn = main1.DBManager(archive_home).get_connection()
+    assert conn.execute("SELECT 姓名 FROM personnel").fetchall() == [('张三',)]
+    assert _search(archive_home, '办公室') == [1]
+    conn.execute(f"UPDATE {main1.DETAIL_TABLE} SET 工作经历 = '乡镇党委书记' WHERE id = 1")
+    assert _search(archive_home, '党委书记') == [1]
+
+
+def test_released_detail_field_is_dropped_and_not_copied_again(archive_home):
+    migrate(archive_home)
+    _add_person(archive_home, 工作经历='旧经历')
+
+    fields = _fields()
+    for field in fields:
+        if field['name'] == '工作经历':
+            field.pop('detail', None)
+    write_fields(fields)
+    migrate(archive_home)
+
+    conn = main1.DBManager(archive_home).get_connection()
+    detail_columns = [row[1] for row in conn.execute(f"PRAGMA table_info({main1.DETAIL_TABLE})")]
+    assert '工作经历' not in detail_columns
+    assert conn.execute("SELECT 工作经历 FROM personnel").fetchall() == [('旧经历',)]
+
+    conn.execute("UPDATE personnel SET 工作经历 = '新经历'")
+    conn.commit()
+    write_fields(fields + [{'name': '政治面貌', 'type': 'TEXT'}])
+    migrate(archive_home)
+    assert conn.execute("SELECT 工作经历 FROM personnel").fetchall() == [('新经历',)]
+    assert _search(archive_home, '新经历') == [1]